@@ -1,7 +1,7 @@
 import logging
 import sys
 from io import StringIO
-from typing import Dict, Tuple, Callable, TextIO
+from typing import Dict, Tuple, Callable, TextIO, List
 
 from alive_progress import alive_it, alive_bar
 
@@ -21,7 +21,7 @@ from lmdb_storage.lookup_tables import CompressedPath
 from lmdb_storage.object_serialization import construct_tree_object
 from lmdb_storage.operations.types import Transformation
 from lmdb_storage.operations.util import ByRoot
-from lmdb_storage.tree_iteration import zip_trees_dfs, zip_dfs, DiffType, dfs
+from lmdb_storage.tree_iteration import zip_trees_dfs, DiffType, dfs_at, zip_dfs_at
 from lmdb_storage.tree_object import ObjectID, StoredObject, TreeObject, MaybeObjectID, ObjectType
 from lmdb_storage.tree_structure import Objects
 from resolve_uuid import resolve_remote_uuid
@@ -32,19 +32,14 @@ def reuse_already_existing_files(backup_set: BackupSet, hoard: HoardContents, ou
     moves_and_copies = MovesAndCopies(hoard)
     for repo in backup_set.backups.values():
         repo_root = hoard.env.roots(write=False)[repo.uuid]
-        mounted_at_trailing_slash = repo.mounted_at.as_posix_folder()
 
         with hoard.env.objects(write=False) as objects:
             desired_tree_objs = mklist_from_tree(objects, repo_root.desired)
 
             with alive_bar(title="Computing reassignments") as bar:
-                for hoard_path, diff_type, current_id, desired_id, _ in zip_dfs(
-                        objects, '', repo_root.current, repo_root.desired, drilldown_same=False):
+                for hoard_path, diff_type, current_id, desired_id, _ in zip_dfs_at(
+                        objects, repo.mounted_at._rem, repo_root.current, repo_root.desired, drilldown_same=False):
                     bar()
-                    if not hoard_path.startswith(mounted_at_trailing_slash):
-                        # fixme optimize this to simply not iterate
-                        continue
-
                     if diff_type == DiffType.RIGHT_MISSING:
                         current_obj = objects[current_id]
                         if current_obj.object_type == ObjectType.TREE:
@@ -70,10 +65,13 @@ def reuse_already_existing_files(backup_set: BackupSet, hoard: HoardContents, ou
                         out.write(f"REASSIGN [{repo.name}] {hoard_path} to {destination_path.as_posix()}\n")
                         desired_tree_objs[destination_path.as_posix()] = current_obj
 
-        with hoard.env.objects(write=True) as objects:
-            new_desired_root = objects.mktree_from_tuples(
-                sorted(desired_tree_objs.items()), alive_it=alive_it) \
-                if len(desired_tree_objs) > 0 else None
+        def write_desired() -> MaybeObjectID:
+            with hoard.env.objects(write=True) as objects:
+                return objects.mktree_from_tuples(
+                    sorted(desired_tree_objs.items()), alive_it=alive_it) \
+                    if len(desired_tree_objs) > 0 else None
+
+        new_desired_root = hoard.env.with_map_growth(write_desired)
 
         hoard.env.roots(write=True)[repo.uuid].desired = new_desired_root
     assert not HoardDeferredOperations(hoard).have_deferred_ops()
@@ -81,18 +79,26 @@ def reuse_already_existing_files(backup_set: BackupSet, hoard: HoardContents, ou
 
 def assign_non_assigned_files(
         hoard: HoardContents, backup_set: BackupSet, available_only: bool, added_cnt, added_size, out: TextIO):
+    # queued after reading, as queueing writes in its own transactions
+    for repo_uuid, hoard_file, file_obj in _find_non_assigned_files(
+            hoard, backup_set, available_only, added_cnt, added_size, out):
+        add_to_desired_tree(hoard, repo_uuid, hoard_file, file_obj)
+
+
+def _find_non_assigned_files(
+        hoard: HoardContents, backup_set: BackupSet, available_only: bool, added_cnt, added_size,
+        out: TextIO) -> List[Tuple[str, str, FileObject]]:
+    to_backup: List[Tuple[str, str, FileObject]] = []
     hoard_root = hoard.env.roots(write=False)["HOARD"]
     with alive_bar(title="Assigning non-assigned files") as bar:
         with hoard.env.objects(write=False) as objects:
-            for path, object_type, obj_id, file_obj, _ in dfs(objects, "", hoard_root.desired):
+            for path, object_type, obj_id, file_obj, _ in dfs_at(
+                    objects, backup_set.mounted_at._rem, hoard_root.desired):
                 bar()
 
                 if object_type == ObjectType.TREE:
                     continue
 
-                if not path.startswith(backup_set.mounted_at.as_posix_folder()):
-                    continue  # fixme this could be done faster if we don't iterate over all files
-
                 file_obj: FileObject
                 hoard_file = FastPosixPath(path)
 
@@ -108,8 +114,7 @@ def assign_non_assigned_files(
 
                 logging.info(f"Backing up {hoard_file} to {[r.uuid for r in new_repos_to_backup_to]}")
                 for repo in new_repos_to_backup_to:
-                    add_to_desired_tree(
-                        hoard, repo.uuid, hoard_file.simple, file_obj)
+                    to_backup.append((repo.uuid, hoard_file.simple, file_obj))
                     out.write(f"BACKUP [{repo.name}]{hoard_file.simple}\n")
 
                 for repo in new_repos_to_backup_to:
@@ -122,8 +127,9 @@ def assign_non_assigned_files(
                         out.write(
                             f"Error: Backup {repo.name} free space is projected to become "
                             f"{format_percent(projected)} < {format_percent(MIN_REPO_PERC_FREE)}%!\n)")
-                        return
+                        return to_backup
     # out.write("SUCCESS!\n")  #fixme enable
+    return to_backup
 
 
 class HoardCommandBackups:
@@ -331,12 +337,15 @@ class HoardCommandBackups:
 
                         repo_root = hoard.env.roots(write=False)[remote.uuid]
                         out.write(f"Unassigning from {remote.name} [{safe_hex(repo_root.desired)[:6]}]:\n")
-                        with hoard.env.objects(write=True) as objects:
 
-                            new_root_id = SelectOnlyExisting(objects).execute(ByRoot(
-                                ["acceptable", "actual"],
-                                {"acceptable": repo_root.current, "actual": repo_root.desired}.items()))
+                        def select_only_existing() -> MaybeObjectID:
+                            with hoard.env.objects(write=True) as objects:
+                                return SelectOnlyExisting(objects).execute(ByRoot(
+                                    ["acceptable", "actual"],
+                                    {"acceptable": repo_root.current, "actual": repo_root.desired}.items()))
 
+                        new_root_id = hoard.env.with_map_growth(select_only_existing)
+                        with hoard.env.objects(write=False) as objects:
                             for file_path, (new_id, old_id), _ in \
                                     zip_trees_dfs(objects, "", [new_root_id, repo_root.desired], False):
                                 assert old_id is not None, f"Can't happen when filtering, {file_path}!"
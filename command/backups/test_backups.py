@@ -8,6 +8,7 @@ from command.command_repo import RepoCommand
 from command.test_repo_command import pretty_file_writer
 from config import CaveType
 from dragon import TotalCommand
+from lmdb_storage.object_store import BACKUP_ROTATION
 
 
 async def init_complex_hoard(tmpdir: str):
@@ -94,6 +95,7 @@ class TestBackups(IsolatedAsyncioTestCase):
         populate_repotypes(self.tmpdir.name)
 
     def tearDown(self):
+        BACKUP_ROTATION.wait()
         self.tmpdir.cleanup()
 
     async def test_get_to_steady_state(self):
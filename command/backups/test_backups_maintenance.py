@@ -7,6 +7,7 @@ from unittest import IsolatedAsyncioTestCase
 from command.test_hoard_command import dump_file_list
 from dragon import TotalCommand
 from lmdb_storage.test_performance_with_fake_data import populate_index, vocabulary_short
+from lmdb_storage.object_store import BACKUP_ROTATION
 
 
 def populate_random_data(tmp_path: str):
@@ -54,6 +55,7 @@ class TestBackupMaintenance(IsolatedAsyncioTestCase):
         self.tmpdir = tempfile.TemporaryDirectory()
 
     def tearDown(self):
+        BACKUP_ROTATION.wait()
         self.tmpdir.cleanup()
 
     async def test_file_structure_is_as_expected(self):
@@ -24,12 +24,14 @@ from gui.hoard_explorer import start_hoard_explorer_gui
 from hashing import fast_hash
 from lmdb_storage.file_object import FileObject
 from lmdb_storage.lookup_tables_paths import fast_compressed_path_dfs
+from lmdb_storage.parallel_walk import walk_subtrees
 from lmdb_storage.tree_iteration import dfs
-from lmdb_storage.tree_object import ObjectType, MaybeObjectID
+from lmdb_storage.tree_object import ObjectType, MaybeObjectID, TreeObject
 from lmdb_storage.tree_operations import get_child, remove_child
 from lmdb_storage.tree_structure import ObjectID, add_object, Objects
 from resolve_uuid import resolve_remote_uuid
 from util import group_to_dict, run_in_separate_loop, safe_hex, format_size
+from varint import encode
 
 
 def path_in_local(hoard_file: str, mounted_at: str) -> str:
@@ -489,14 +491,17 @@ class HoardCommand(object):
 def move_paths(
         hoard: HoardContents, from_path: FastPosixPath, to_path: FastPosixPath, root_id: ObjectID | None, rname: str,
         rtype: str, out: TextIO, dump_changes: bool = False):
-    with hoard.env.objects(write=True) as objects:
-        # get and remove old subpath
-        old_subpath_id = get_child(objects, from_path._rem, root_id)
-        new_root_id = remove_child(objects, from_path._rem, root_id)
+    def move() -> Tuple[MaybeObjectID, MaybeObjectID]:
+        with hoard.env.objects(write=True) as objects:
+            # get and remove old subpath
+            old_subpath_id = get_child(objects, from_path._rem, root_id)
+            moved_root_id = remove_child(objects, from_path._rem, root_id)
 
-        # graft into the new subpath
-        new_root_id = add_object(objects, new_root_id, to_path._rem, old_subpath_id)
+            # graft into the new subpath
+            return old_subpath_id, add_object(objects, moved_root_id, to_path._rem, old_subpath_id)
 
+    old_subpath_id, new_root_id = hoard.env.with_map_growth(move)
+    with hoard.env.objects(write=False) as objects:
         if new_root_id != root_id:
             out.write(f"{rname}.{rtype}: {safe_hex(root_id)[:6]} => {safe_hex(new_root_id)[:6]}\n")
 
@@ -513,35 +518,40 @@ def move_paths(
 type Hashes = Dict[str, List[Tuple[str, FileObject, bytearray, MaybeObjectID]]] | None
 
 
-class CachedObjectReader:
-    def __init__(self, objects: Objects):
-        self.objects = objects
-        self.cache = dict()
-        assert self.objects.txn is not None, "Use with an opened transaction only."
-
-    def __getitem__(self, obj_id):
-        if obj_id not in self.cache:
-            self.cache[obj_id] = self.objects[obj_id]
-        return self.cache[obj_id]
-
-
 def read_all_current_hashes(hoard: HoardContents) -> Hashes:
     roots = hoard.env.roots(write=False)
-
-    hashes: Hashes = dict()
     roots_per_uuid = dict((remote.uuid, roots[remote.uuid].current) for remote in hoard.hoard_config.remotes.all())
 
+    subtrees: List[Tuple[str, ObjectID, bytearray, ObjectID]] = []
+    with hoard.env.objects(write=False) as objects:
+        for uuid, root_id in roots_per_uuid.items():
+            root_obj = objects[root_id] if root_id is not None else None
+            if isinstance(root_obj, TreeObject):
+                subtrees.extend(
+                    (uuid, root_id, bytearray(encode(child_idx)), child_id)
+                    for child_idx, (_, child_id) in enumerate(root_obj.children))
+
+    hashes: Hashes = dict()
     with alive_bar(title="Reading all hashes") as bar:
-        with hoard.env.objects(write=False) as objects:
-            for uuid, root_id in roots_per_uuid.items():
-                for path, obj_type, obj_id, obj, _ in fast_compressed_path_dfs(
-                        CachedObjectReader(objects), bytearray(), root_id):
-                    bar()
-                    if obj_type == ObjectType.TREE:
-                        continue
-                    obj: FileObject
-                    if obj.fasthash not in hashes:
-                        hashes[obj.fasthash] = [(uuid, obj, path.copy(), root_id)]
-                    else:
-                        hashes[obj.fasthash].append((uuid, obj, path.copy(), root_id))
+        for partial_hashes in walk_subtrees(hoard.env, subtrees, _read_hashes_in_subtrees):
+            bar(sum(len(files) for files in partial_hashes.values()))
+            for fasthash, files in partial_hashes.items():
+                if fasthash not in hashes:
+                    hashes[fasthash] = files
+                else:
+                    hashes[fasthash].extend(files)
+    return hashes
+
+
+def _read_hashes_in_subtrees(objects: Objects, subtrees: List[Tuple[str, ObjectID, bytearray, ObjectID]]) -> Hashes:
+    hashes: Hashes = dict()
+    for uuid, root_id, subtree_path, subtree_id in subtrees:
+        for path, obj_type, obj_id, obj, _ in fast_compressed_path_dfs(objects, subtree_path, subtree_id):
+            if obj_type == ObjectType.TREE:
+                continue
+            obj: FileObject
+            if obj.fasthash not in hashes:
+                hashes[obj.fasthash] = [(uuid, obj, path.copy(), root_id)]
+            else:
+                hashes[obj.fasthash].append((uuid, obj, path.copy(), root_id))
     return hashes
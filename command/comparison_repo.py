@@ -18,7 +18,7 @@ from contents.repo_props import RepoFileStatus, FileDesc
 from hashing import fast_hash_async
 from lmdb_storage.file_object import BlobObject, FileObject
 from lmdb_storage.tree_iteration import zip_dfs
-from lmdb_storage.tree_object import TreeObject
+from lmdb_storage.tree_object import TreeObject, ObjectID
 from task_logging import TaskLogger, PythonLoggingTaskLogger
 from util import group_to_dict, process_async, run_in_separate_loop
 
@@ -402,8 +402,11 @@ class FilesystemState:
 
             all_files_sorted = [(filepath, fileobj) for filepath, fileobj in index.items()]
 
-            with self.contents.objects as objects:
-                self.state_root_id = objects.mktree_from_tuples(all_files_sorted, alive_it)
+            def write_state() -> ObjectID:
+                with self.contents.objects as objects:
+                    return objects.mktree_from_tuples(all_files_sorted, alive_it)
+
+            self.state_root_id = self.contents.env.with_map_growth(write_state)
 
 
 async def compute_difference_between_contents_and_filesystem(
@@ -11,7 +11,7 @@ from contents.hoard_props import HoardFileStatus, HoardFileProps
 from contents.repo_props import FileDesc
 from lmdb_storage.file_object import FileObject
 from lmdb_storage.lookup_tables import LookupTable
-from lmdb_storage.lookup_tables_paths import decode_bytes_to_object_id, compute_path_lookup_table, digest_path
+from lmdb_storage.lookup_tables_paths import decode_bytes_to_object_id, digest_path
 from lmdb_storage.tree_object import ObjectID
 from util import format_percent, format_size
 
@@ -69,27 +69,26 @@ class Presence:
     @cached_property
     def _current(self):
         roots = self.hoard_contents.env.roots(write=False)
-        with self.hoard_contents.env.objects(write=False) as objects:
-            return dict(
-                (remote.uuid, LookupTable[ObjectID](
-                    compute_path_lookup_table(objects, roots[remote.uuid].current), decode_bytes_to_object_id))
-                for remote in self.hoard_contents.hoard_config.remotes.all())
+        lookup_tables = self.hoard_contents.env.lookup_tables()
+        return dict(
+            (remote.uuid, LookupTable[ObjectID](
+                lookup_tables.path_to_obj_id(roots[remote.uuid].current), decode_bytes_to_object_id))
+            for remote in self.hoard_contents.hoard_config.remotes.all())
 
     @cached_property
     def _desired(self):
         roots = self.hoard_contents.env.roots(write=False)
-        with self.hoard_contents.env.objects(write=False) as objects:
-            return dict(
-                (remote.uuid, LookupTable[ObjectID](
-                    compute_path_lookup_table(objects, roots[remote.uuid].desired), decode_bytes_to_object_id))
-                for remote in self.hoard_contents.hoard_config.remotes.all())
+        lookup_tables = self.hoard_contents.env.lookup_tables()
+        return dict(
+            (remote.uuid, LookupTable[ObjectID](
+                lookup_tables.path_to_obj_id(roots[remote.uuid].desired), decode_bytes_to_object_id))
+            for remote in self.hoard_contents.hoard_config.remotes.all())
 
     @cached_property
     def _hoard(self):
         roots = self.hoard_contents.env.roots(write=False)
-        with self.hoard_contents.env.objects(write=False) as objects:
-            return LookupTable[ObjectID](
-                compute_path_lookup_table(objects, roots["HOARD"].desired), decode_bytes_to_object_id)
+        return LookupTable[ObjectID](
+            self.hoard_contents.env.lookup_tables().path_to_obj_id(roots["HOARD"].desired), decode_bytes_to_object_id)
 
     def in_current(self, hoard_file: FastPosixPath, file_obj: FileObject) -> Iterable[str]:
         assert isinstance(file_obj, FileObject)
@@ -1,3 +1,4 @@
+import asyncio
 import dataclasses
 import logging
 import sys
@@ -105,9 +106,15 @@ def augment_statuses(config, hoard, show_empty, statuses):
     return available_states, statuses_sorted
 
 
+async def warm_up_hoard_stats(hoard_contents: HoardContents, task_logger: TaskLogger):
+    """Warms up the stats of the hoard in a worker thread, as it walks all changed trees."""
+    task_logger.info("Warming up stats of changed contents...")
+    await asyncio.get_event_loop().run_in_executor(None, hoard_contents.fsobjects.warm_up_stats)
+
+
 async def execute_pull(
         hoard: Hoard, hoard_contents: HoardContents, preferences: PullPreferences, ignore_epoch: bool,
-        out: TextIO, task_logger: TaskLogger):
+        out: TextIO, task_logger: TaskLogger, warm_up_stats: bool = True):
     config = hoard.config()
     uuid = preferences.local_uuid
     pathing = HoardPathing(config, hoard.paths())
@@ -179,6 +186,9 @@ async def execute_pull(
         task_logger.info(f"Marking as done {uuid}")  # fixme this is probably not needed as changes are atomic
         hoard_contents.config.mark_up_to_date(uuid, current_contents.config.updated)
 
+    if warm_up_stats:
+        await warm_up_hoard_stats(hoard_contents, task_logger)
+
     out.write(f"Sync'ed {config.remotes[uuid].name} to hoard!\n")
 
 
@@ -545,7 +555,7 @@ class HoardCommandContents:
         config = self.hoard.config()
         with self.hoard.open_contents(create_missing=False) as hoard:
             statuses: Dict[str, Dict[str, Dict[str, Any]]] = hoard.fsobjects.status_by_uuid(
-                FastPosixPath(path) if path else None, extended=True)
+                FastPosixPath(path) if path else None, extended=True, parallel=True)
             available_states, statuses_sorted = augment_statuses(config, hoard, show_empty, statuses)
 
             all_stats = ["total", *(s for s in (
@@ -673,7 +683,7 @@ class HoardCommandContents:
 
     async def pull(
             self, remote: Optional[str] = None, all: bool = False, ignore_epoch: bool = False,
-            force_fetch_local_missing: bool = False, assume_current: bool = False):
+            force_fetch_local_missing: bool = False, assume_current: bool = False, warm_up_stats: bool = True):
         logging.info("Loading config")
         config = self.hoard.config()
 
@@ -709,7 +719,10 @@ class HoardCommandContents:
 
                     preferences = init_pull_preferences(remote_obj, assume_current, force_fetch_local_missing)
                     await execute_pull(self.hoard, hoard_contents, preferences, ignore_epoch, out,
-                                       PythonLoggingTaskLogger())
+                                       PythonLoggingTaskLogger(), warm_up_stats=False)
+
+                if warm_up_stats:
+                    await warm_up_hoard_stats(hoard_contents, PythonLoggingTaskLogger())
 
             out.write("DONE")
             return out.getvalue()
@@ -794,11 +807,15 @@ async def execute_get(
     assert path_in_hoard.is_absolute()
 
     old_desired_id = hoard.env.roots(False)[repo_uuid].desired
-    with hoard.env.objects(write=True) as objects:
-        path_in_tree = path_in_hoard._rem
-        hoard_root = hoard.env.roots(False)["HOARD"]
-        new_desired_id = graft_in_tree(objects, old_desired_id, path_in_tree, hoard_root.desired)
+    path_in_tree = path_in_hoard._rem
+    hoard_root = hoard.env.roots(False)["HOARD"]
 
+    def graft() -> MaybeObjectID:
+        with hoard.env.objects(write=True) as objects:
+            return graft_in_tree(objects, old_desired_id, path_in_tree, hoard_root.desired)
+
+    new_desired_id = hoard.env.with_map_growth(graft)
+    with hoard.env.objects(write=False) as objects:
         considered = dump_changed_files_info(objects, path_in_tree, old_desired_id, new_desired_id, out)
 
     hoard.env.roots(True)[repo_uuid].desired = new_desired_id
@@ -841,8 +858,11 @@ async def execute_drop(
 
     old_desired_id = hoard.env.roots(write=False)[repo_uuid].desired
 
-    with hoard.env.objects(write=True) as objects:
-        new_desired_id = add_object(objects, old_desired_id, path_in_hoard._rem, None)
+    def drop() -> MaybeObjectID:
+        with hoard.env.objects(write=True) as objects:
+            return add_object(objects, old_desired_id, path_in_hoard._rem, None)
+
+    new_desired_id = hoard.env.with_map_growth(drop)
 
     if new_desired_id == old_desired_id:
         logging.warning(f"Dropping {path_in_hoard} did not change the root.")
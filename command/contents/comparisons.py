@@ -4,6 +4,7 @@ import logging
 from config import HoardConfig
 from contents.hoard import HoardContents
 from contents.repo import RepoContents
+from lmdb_storage.object_store import InconsistentObjectStorage
 from lmdb_storage.tree_object import MaybeObjectID
 from lmdb_storage.tree_structure import add_object
 
@@ -21,18 +22,19 @@ def copy_local_staging_data_to_hoard(hoard: HoardContents, local: RepoContents,
     try:
         # ensures we have the same tree
         hoard.env.copy_trees_from(local.env, [staging_root_id])
-    except AssertionError as error:
+    except (AssertionError, InconsistentObjectStorage) as error:
         logging.error(f"Failed while trying to copy from {config.remotes[local.uuid].name}[{local.uuid}]")
         logging.error(error)
         raise error
 
-    with hoard.env.objects(write=True) as objects:
-        abs_staging_root_id = add_object(
-            objects, None,
-            path=config.remotes[local.uuid].mounted_at._rem,
-            obj_id=staging_root_id)
+    def add_staging() -> MaybeObjectID:
+        with hoard.env.objects(write=True) as objects:
+            return add_object(
+                objects, None,
+                path=config.remotes[local.uuid].mounted_at._rem,
+                obj_id=staging_root_id)
 
-    return abs_staging_root_id
+    return hoard.env.with_map_growth(add_staging)
 
 def commit_local_staging(hoard: HoardContents, local: RepoContents, abs_staging_root_id: MaybeObjectID):
     hoard.env.roots(write=True)[local.uuid].staging = abs_staging_root_id
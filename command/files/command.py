@@ -4,7 +4,7 @@ from typing import Optional, List, Dict
 
 from alive_progress import alive_bar
 
-from command.contents.command import dump_remotes
+from command.contents.command import dump_remotes, warm_up_hoard_stats
 from command.files.file_operations import _fetch_files_in_repo, _cleanup_files_in_repo
 from command.hoard import Hoard
 from command.pathing import HoardPathing
@@ -65,7 +65,7 @@ class HoardCommandFiles:
                 out.write("DONE")
                 return out.getvalue()
 
-    async def push(self, repo: Optional[str] = None, all: bool = False):
+    async def push(self, repo: Optional[str] = None, all: bool = False, warm_up_stats: bool = True):
         config = self.hoard.config()
         if all:
             if repo is not None:
@@ -79,13 +79,16 @@ class HoardCommandFiles:
         logging.info(f"Loading hoard contents...")
 
         with StringIO() as out:
-            await execute_files_push(config, self.hoard, repo_uuids, out, PythonLoggingTaskLogger())
+            await execute_files_push(
+                config, self.hoard, repo_uuids, out, PythonLoggingTaskLogger(), warm_up_stats=warm_up_stats)
 
             out.write("DONE")
             return out.getvalue()
 
 
-async def execute_files_push(config: HoardConfig, hoard: Hoard, repo_uuids: List[str], out: StringIO, task_logger: TaskLogger):
+async def execute_files_push(
+        config: HoardConfig, hoard: Hoard, repo_uuids: List[str], out: StringIO, task_logger: TaskLogger,
+        warm_up_stats: bool = True):
     pathing = HoardPathing(config, hoard.paths())
     with hoard.open_contents(False).writeable() as hoard_contents:
         out.write(f"Before push:\n")
@@ -118,3 +121,6 @@ async def execute_files_push(config: HoardConfig, hoard: Hoard, repo_uuids: List
 
         out.write(f"After:\n")
         dump_remotes(config, hoard_contents, out)
+
+        if warm_up_stats:
+            await warm_up_hoard_stats(hoard_contents, task_logger)
@@ -6,7 +6,7 @@ from typing import Iterable, List, Tuple
 from contents.hoard import HoardContents, MovesAndCopies, HACK_create_from_hoard_props
 from contents.hoard_props import HoardFileProps
 from lmdb_storage.file_object import FileObject
-from lmdb_storage.tree_iteration import zip_dfs, DiffType
+from lmdb_storage.tree_iteration import zip_dfs, DiffType, TreePath
 from lmdb_storage.tree_object import ObjectType, StoredObject
 
 type FileOp = GetFile | CopyFile | CleanupFile | MoveFile | RetainFile
@@ -74,7 +74,7 @@ def get_pending_operations(
 
     with hoard.env.objects(write=False) as objects:
         for hoard_path, diff_type, current_obj_id, desired_obj_id, _ in zip_dfs(
-                objects, '', repo_root.current, repo_root.desired, drilldown_same=False):
+                objects, TreePath.root(), repo_root.current, repo_root.desired, drilldown_same=False):
 
             if diff_type == DiffType.LEFT_MISSING or diff_type == DiffType.DIFFERENT:
                 desired_obj: StoredObject = objects[desired_obj_id]
@@ -82,7 +82,7 @@ def get_pending_operations(
                     continue
                 desired_obj: FileObject
 
-                yield FileOpType.FETCH, FastPosixPath(hoard_path), desired_obj
+                yield FileOpType.FETCH, hoard_path.as_fast_path(), desired_obj
             elif diff_type == DiffType.RIGHT_MISSING:
                 current_obj: StoredObject = objects[current_obj_id]
                 if current_obj.object_type == ObjectType.TREE:
@@ -91,8 +91,8 @@ def get_pending_operations(
 
                 moves_and_copies_loc = dict(moves_and_copies.whereis_needed(current_obj.file_id))
                 if len(moves_and_copies_loc) > 0:
-                    yield FileOpType.RETAIN, FastPosixPath(hoard_path), current_obj
+                    yield FileOpType.RETAIN, hoard_path.as_fast_path(), current_obj
                 else:
-                    yield FileOpType.CLEANUP, FastPosixPath(hoard_path), current_obj
+                    yield FileOpType.CLEANUP, hoard_path.as_fast_path(), current_obj
             elif diff_type != DiffType.SAME:
                 raise ValueError(f"File {hoard_path} has unrecognized diff type {diff_type}")
@@ -9,6 +9,7 @@ from command.test_hoard_command import populate_repotypes, init_complex_hoard, d
 from command.test_repo_command import pretty_file_writer
 from config import CaveType
 from dragon import TotalCommand
+from lmdb_storage.object_store import BACKUP_ROTATION
 
 
 def populate(tmpdir: str):
@@ -22,6 +23,7 @@ class TestFileChangingFlows(IsolatedAsyncioTestCase):
         populate_repotypes(self.tmpdir.name)
 
     def tearDown(self):
+        BACKUP_ROTATION.wait()
         self.tmpdir.cleanup()
 
     async def test_adding_full_then_adding_partial(self):
@@ -11,15 +11,19 @@ from command.command_repo import RepoCommand
 from command.fast_path import FastPosixPath
 from command.test_repo_command import populate, write_contents, pretty_file_writer
 from config import CaveType
-from contents.hoard import HoardContents
+from contents.hoard import HoardContents, MovesAndCopies
 from contents.hoard_props import HoardFileProps
+from contents.hoard_tree_walking import composite_from_roots
+from contents.recursive_stats_calc import SizeCountPresenceStatsCalculator, QueryStatsCalculator, \
+    SizeCountPresenceStats, QueryStats, calculate_in_parallel, drilldown, ExtendedStatsCalculator
 from dragon import TotalCommand
+from lmdb_storage.cached_calcs import AppCachedCalculator, Calculator
 from lmdb_storage.file_object import BlobObject, FileObject
 from lmdb_storage.operations.fast_association import FastAssociation
 from lmdb_storage.operations.generator import TreeGenerator
 from lmdb_storage.operations.util import ByRoot
 from lmdb_storage.tree_object import StoredObject, ObjectType, TreeObject, MaybeObjectID
-from lmdb_storage.tree_structure import Objects
+from lmdb_storage.tree_structure import Objects, add_object
 from resolve_uuid import resolve_remote_uuid
 
 
@@ -148,6 +152,123 @@ class TestHoardCommand(IsolatedAsyncioTestCase):
             for f, prop in HoardFilesIterator.DEPRECATED_all(hoard_contents) if isinstance(prop, HoardFileProps))
         self.assertEqual(sorted(files_exp), sorted(files))
 
+    async def test_stats_are_warmed_up_after_pull(self):
+        pfw = pretty_file_writer(self.tmpdir.name)
+        for i in range(150):
+            pfw(f"repo/many/file-{i}.txt", f"contents-{i}")
+
+        cave_cmd = TotalCommand(path=join(self.tmpdir.name, "repo")).cave
+        cave_cmd.init()
+        await cave_cmd.refresh(show_details=False)
+
+        hoard_cmd = TotalCommand(path=join(self.tmpdir.name, "hoard")).hoard
+        await hoard_cmd.init()
+        hoard_cmd.add_remote(remote_path=join(self.tmpdir.name, "repo"), name="repo-in-local", mount_point="/")
+
+        def stored_root_stats(hoard_contents: HoardContents) -> Tuple[bytes | None, bytes | None]:
+            root_node_id = composite_from_roots(hoard_contents)
+            return (
+                hoard_contents.stats_cache.get(
+                    SizeCountPresenceStatsCalculator(hoard_contents).stat_cache_key + root_node_id.hashed),
+                hoard_contents.stats_cache.get(
+                    QueryStatsCalculator(hoard_contents).stat_cache_key + root_node_id.hashed))
+
+        await hoard_cmd.contents.pull("repo-in-local", warm_up_stats=False)
+        with hoard_cmd.hoard.open_contents(False) as hoard_contents:
+            self.assertEqual((None, None), stored_root_stats(hoard_contents))
+
+        await hoard_cmd.contents.pull("repo-in-local", ignore_epoch=True)
+        with hoard_cmd.hoard.open_contents(False) as hoard_contents:
+            size_count_stats, query_stats = stored_root_stats(hoard_contents)
+            self.assertIsNotNone(size_count_stats)
+            self.assertIsNotNone(query_stats)
+
+    async def test_parallel_stats_match_serial(self):
+        pfw = pretty_file_writer(self.tmpdir.name)
+        for i in range(240):
+            pfw(f"repo/folder-{i % 2}/file-{i}.txt", f"contents-{i % 150}")
+
+        cave_cmd = TotalCommand(path=join(self.tmpdir.name, "repo")).cave
+        cave_cmd.init()
+        await cave_cmd.refresh(show_details=False)
+
+        hoard_cmd = TotalCommand(path=join(self.tmpdir.name, "hoard")).hoard
+        await hoard_cmd.init()
+        hoard_cmd.add_remote(remote_path=join(self.tmpdir.name, "repo"), name="repo-in-local", mount_point="/")
+        await hoard_cmd.contents.pull("repo-in-local", warm_up_stats=False)
+
+        with hoard_cmd.hoard.open_contents(False) as hoard_contents:
+            root_node_id = composite_from_roots(hoard_contents)
+            for calculator_type, result_type in [
+                    (SizeCountPresenceStatsCalculator, SizeCountPresenceStats), (QueryStatsCalculator, QueryStats)]:
+                parallel = calculate_in_parallel(
+                    AppCachedCalculator(calculator_type(hoard_contents), result_type, hoard_contents.stats_cache),
+                    hoard_contents.env, root_node_id, max_workers=2, min_objects=0)
+                serial = Calculator(calculator_type(hoard_contents))[root_node_id]
+                self.assertEqual(serial, parallel)
+
+            hoard_contents.stats_cache.flush()
+            folder_node_id = drilldown(hoard_contents, root_node_id, ["folder-0"])
+            self.assertIsNotNone(hoard_contents.stats_cache.get(  # stored by a worker
+                SizeCountPresenceStatsCalculator(hoard_contents).stat_cache_key + folder_node_id.hashed))
+
+    async def test_remote_copies_are_found_in_roots_of_the_index(self):
+        cave_cmd = TotalCommand(path=join(self.tmpdir.name, "repo")).cave
+        cave_cmd.init()
+        await cave_cmd.refresh(show_details=False)
+
+        hoard_cmd = TotalCommand(path=join(self.tmpdir.name, "hoard")).hoard
+        await hoard_cmd.init()
+        hoard_cmd.add_remote(remote_path=join(self.tmpdir.name, "repo"), name="repo-in-local", mount_point="/")
+        await hoard_cmd.contents.pull("repo-in-local", warm_up_stats=False)
+        repo_uuid = resolve_remote_uuid(hoard_cmd.hoard.config(), "repo-in-local")
+
+        with hoard_cmd.hoard.open_contents(False).writeable() as hoard_contents:
+            repo_root = hoard_contents.env.roots(write=False)[repo_uuid]
+            with hoard_contents.env.objects(write=False) as objects:
+                file_id = objects[objects[repo_root.current].get("wat")].get("test.me.twice")
+
+            moves_and_copies = MovesAndCopies(hoard_contents)
+            self.assertEqual(
+                [(repo_uuid, [FastPosixPath("/wat/test.me.twice")])],
+                list(moves_and_copies.get_remote_copies_expanded("other-uuid", file_id)))
+
+            # the root moves on, with the file at another index in its folder
+            with hoard_contents.env.objects(write=True) as objects:
+                moved_root_id = add_object(objects, repo_root.current, ["wat", "test.me.different"], None)
+            hoard_contents.env.roots(write=True)[repo_uuid].current = moved_root_id
+
+            self.assertEqual(
+                [(repo_uuid, [FastPosixPath("/wat/test.me.twice")])],
+                list(moves_and_copies.get_remote_copies_expanded("other-uuid", file_id)))
+
+    async def test_extended_stats_are_cached_for_the_remote_roots(self):
+        cave_cmd = TotalCommand(path=join(self.tmpdir.name, "repo")).cave
+        cave_cmd.init()
+        await cave_cmd.refresh(show_details=False)
+
+        hoard_cmd = TotalCommand(path=join(self.tmpdir.name, "hoard")).hoard
+        await hoard_cmd.init()
+        hoard_cmd.add_remote(remote_path=join(self.tmpdir.name, "repo"), name="repo-in-local", mount_point="/")
+        await hoard_cmd.contents.pull("repo-in-local", warm_up_stats=False)
+        repo_uuid = resolve_remote_uuid(hoard_cmd.hoard.config(), "repo-in-local")
+
+        with hoard_cmd.hoard.open_contents(False).writeable() as hoard_contents:
+            def extended_stats_key() -> bytes:
+                return ExtendedStatsCalculator(hoard_contents, MovesAndCopies(hoard_contents)).stat_cache_key
+
+            key = extended_stats_key()
+
+            roots = hoard_contents.env.roots(write=True)
+            repo_current_id = roots[repo_uuid].current
+            roots["HOARD"].desired = repo_current_id
+            self.assertEqual(key, extended_stats_key())
+
+            with hoard_contents.env.objects(write=True) as objects:
+                moved_root_id = add_object(objects, repo_current_id, ["wat", "test.me.different"], None)
+            roots[repo_uuid].current = moved_root_id
+            self.assertNotEqual(key, extended_stats_key())
+
     async def test_sync_two_repos(self):
         cave_cmd = TotalCommand(path=join(self.tmpdir.name, "repo")).cave
         cave_cmd.init()
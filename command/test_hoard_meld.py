@@ -8,6 +8,7 @@ from unittest import IsolatedAsyncioTestCase
 
 from command.test_hoard_command import populate_hoard, populate_repotypes, init_complex_hoard, dump_file_list
 from command.test_repo_command import write_contents
+from lmdb_storage.object_store import BACKUP_ROTATION
 
 
 class TestHoardCommand(IsolatedAsyncioTestCase):
@@ -18,6 +19,7 @@ class TestHoardCommand(IsolatedAsyncioTestCase):
         populate_repotypes(self.tmpdir.name)
 
     def tearDown(self):
+        BACKUP_ROTATION.wait()
         self.tmpdir.cleanup()
 
     async def test_recover(self):
@@ -6,6 +6,7 @@ from pathlib import Path
 from unittest.async_case import IsolatedAsyncioTestCase
 
 from command.test_hoard_command import populate_repotypes, init_complex_hoard
+from lmdb_storage.object_store import BACKUP_ROTATION
 
 
 class TestIncomingRepos(IsolatedAsyncioTestCase):
@@ -15,6 +16,7 @@ class TestIncomingRepos(IsolatedAsyncioTestCase):
         populate_repotypes(self.tmpdir.name)
 
     def tearDown(self):
+        BACKUP_ROTATION.wait()
         self.tmpdir.cleanup()
 
     async def test_adding_full_then_adding_partial(self):
@@ -6,6 +6,7 @@ from typing import Callable
 from unittest import IsolatedAsyncioTestCase
 
 from dragon import TotalCommand
+from lmdb_storage.object_store import BACKUP_ROTATION
 
 
 def write_contents(path: str, contents: str) -> None:
@@ -41,6 +42,7 @@ class TestRepoCommand(IsolatedAsyncioTestCase):
         populate(self.tmpdir.name)
 
     def tearDown(self):
+        BACKUP_ROTATION.wait()
         self.tmpdir.cleanup()
 
     def test_populate_temp_dir(self):
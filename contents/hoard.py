@@ -4,11 +4,10 @@ import pathlib
 import sys
 from datetime import datetime
 from functools import cached_property
-from types import NoneType
+from itertools import groupby
 from typing import Dict, Any, Optional, Tuple, Generator, Iterable, List
 
 import rtoml
-from alive_progress import alive_bar
 
 from command.fast_path import FastPosixPath
 from config import HoardConfig
@@ -16,21 +15,22 @@ from contents.hoard_props import HoardFileProps, GET_BY_MOVE, GET_BY_COPY, RESER
 from contents.hoard_tree_walking import walk, composite_from_roots, hoard_tree_root
 from contents.recursive_stats_calc import UsedSizeCalculator, NodeID, QueryStatsCalculator, drilldown, FolderStats, \
     SizeCountPresenceStatsCalculator, SizeCountPresenceStats, FileStats, QueryStats, UsedSize, \
-    CachedReader
+    CachedReader, ExtendedStatsCalculator, ExtendedStats, calculate_in_parallel
 from contents.repo import RepoContentsConfig
-from lmdb_storage.cached_calcs import AppCachedCalculator
+from lmdb_storage.cached_calcs import AppCachedCalculator, flush_app_stats_cache, app_stats_cache
 from lmdb_storage.file_object import FileObject
-from lmdb_storage.lookup_tables import LookupTableObjToPaths, CompressedPath
-from lmdb_storage.lookup_tables_paths import lookup_paths, get_path_string, compute_obj_id_to_path_lookup_table, \
-    compute_obj_id_to_path_difference_lookup_table, decode_bytes_to_intpath
+from lmdb_storage.lookup_tables import LookupTableObjToPaths, CompressedPath, LookupTableIndex
+from lmdb_storage.lookup_tables_paths import lookup_paths, get_path_string, decode_bytes_to_intpath
+from lmdb_storage.lookup_tables_store import LookupTableKind
 from lmdb_storage.object_store import ObjectStorage
-from lmdb_storage.tree_iteration import zip_trees_dfs, dfs, DiffType, zip_dfs
-from lmdb_storage.tree_object import ObjectType, StoredObject, TreeObject, ObjectID
+from lmdb_storage.tree_iteration import zip_trees_dfs, dfs, DiffType, zip_dfs, TreePath
+from lmdb_storage.tree_object import ObjectType, StoredObject, ObjectID, MaybeObjectID
 from lmdb_storage.tree_structure import Objects
 from util import custom_isabs
 
 HOARD_CONTENTS_LMDB_DIR = "hoard.contents.lmdb"
 HOARD_CONTENTS_TOML = "hoard.contents.toml"
+HOARD_STATS_CACHE_LMDB = "hoard.stats-cache.lmdb"
 
 
 class HoardContentsConfig:
@@ -101,50 +101,85 @@ class MovesAndCopies:
     @cached_property
     def _lookup_current(self) -> Dict[str, LookupTableObjToPaths[CompressedPath]]:
         roots = self.parent.env.roots(write=False)
-        with self.parent.env.objects(write=False) as objects:
-            return dict(
-                (remote.uuid, LookupTableObjToPaths[CompressedPath](
-                    compute_obj_id_to_path_lookup_table(objects, roots[remote.uuid].current),
-                    decode_bytes_to_intpath, roots[remote.uuid].current))
-                for remote in self.parent.hoard_config.remotes.all())
+        lookup_tables = self.parent.env.lookup_tables()
+        return dict(
+            (remote.uuid, LookupTableObjToPaths[CompressedPath](
+                lookup_tables.obj_id_to_path(roots[remote.uuid].current),
+                decode_bytes_to_intpath, roots[remote.uuid].current))
+            for remote in self.parent.hoard_config.remotes.all())
 
     @cached_property
     def _lookup_desired_but_not_current(self) -> Dict[str, LookupTableObjToPaths[CompressedPath]]:
         roots = self.parent.env.roots(write=False)
-        with self.parent.env.objects(write=False) as objects:
-            return dict(
-                (remote.uuid, LookupTableObjToPaths[CompressedPath](
-                    compute_obj_id_to_path_difference_lookup_table(
-                        objects, roots[remote.uuid].desired, roots[remote.uuid].current),
-                    decode_bytes_to_intpath, roots[remote.uuid].desired))
-                for remote in self.parent.hoard_config.remotes.all())
+        lookup_tables = self.parent.env.lookup_tables()
+        return dict(
+            (remote.uuid, LookupTableObjToPaths[CompressedPath](
+                lookup_tables.obj_id_to_path_difference(roots[remote.uuid].desired, roots[remote.uuid].current),
+                decode_bytes_to_intpath, roots[remote.uuid].desired))
+            for remote in self.parent.hoard_config.remotes.all())
+
+    @cached_property
+    def _remote_uuids(self) -> List[str]:
+        return [remote.uuid for remote in self.parent.hoard_config.remotes.all()]
+
+    @cached_property
+    def _obj_id_index(self) -> LookupTableIndex[CompressedPath]:
+        """Postings of the current paths of each remote, then of the paths each remote needs to get.
+
+        Paths are relative to the roots that the tables were computed from, kept with the index in table order."""
+        roots = self.parent.env.roots(write=False)
+        current_ids = [roots[uuid].current for uuid in self._remote_uuids]
+        desired_ids = [roots[uuid].desired for uuid in self._remote_uuids]
+        return LookupTableIndex[CompressedPath](
+            self.parent.env.lookup_tables().obj_id_index(
+                [(LookupTableKind.OBJ_ID_TO_PATH, (current_id,)) for current_id in current_ids]
+                + [(LookupTableKind.OBJ_ID_TO_PATH_DIFFERENCE, (desired_id, current_id))
+                   for desired_id, current_id in zip(desired_ids, current_ids)]),
+            decode_bytes_to_intpath, current_ids + desired_ids)
+
+    def _postings_by_uuid(
+            self, obj_id: ObjectID, needed: bool) -> Iterable[Tuple[str, MaybeObjectID, List[CompressedPath]]]:
+        """Yields the remotes that have or need the object, with the root that its paths there are relative to."""
+        tables_offset = len(self._remote_uuids) if needed else 0
+        postings = self._obj_id_index.postings(
+            obj_id, range(tables_offset, tables_offset + len(self._remote_uuids)))
+        for table_idx, table_postings in groupby(postings, key=lambda posting: posting[0]):
+            yield (
+                self._remote_uuids[table_idx - tables_offset], self._obj_id_index.root_ids[table_idx],
+                [path for _, path in table_postings])
 
     @cached_property
     def _lookup_current_but_not_desired(self) -> Dict[str, LookupTableObjToPaths[CompressedPath]]:
         roots = self.parent.env.roots(write=False)
-        with self.parent.env.objects(write=False) as objects:
-            return dict(
-                (remote.uuid, LookupTableObjToPaths[CompressedPath](
-                    compute_obj_id_to_path_difference_lookup_table(
-                        objects, roots[remote.uuid].current, roots[remote.uuid].desired),
-                    decode_bytes_to_intpath, roots[remote.uuid].current))
-                for remote in self.parent.hoard_config.remotes.all())
+        lookup_tables = self.parent.env.lookup_tables()
+        return dict(
+            (remote.uuid, LookupTableObjToPaths[CompressedPath](
+                lookup_tables.obj_id_to_path_difference(roots[remote.uuid].current, roots[remote.uuid].desired),
+                decode_bytes_to_intpath, roots[remote.uuid].current))
+            for remote in self.parent.hoard_config.remotes.all())
 
     @cached_property
     def _lookup_hoard_desired(self) -> LookupTableObjToPaths[CompressedPath]:
         roots = self.parent.env.roots(write=False)
-        with self.parent.env.objects(write=False) as objects:
-            return LookupTableObjToPaths[CompressedPath](
-                compute_obj_id_to_path_difference_lookup_table(
-                    objects, roots["HOARD"].desired, roots["HOARD"].current),
-                decode_bytes_to_intpath, roots["HOARD"].desired)
+        return LookupTableObjToPaths[CompressedPath](
+            self.parent.env.lookup_tables().obj_id_to_path_difference(roots["HOARD"].desired, roots["HOARD"].current),
+            decode_bytes_to_intpath, roots["HOARD"].desired)
 
     def get_existing_paths_in_uuid(self, in_uuid: str, desired_id: ObjectID) -> List[CompressedPath]:
         return self._lookup_current[in_uuid][desired_id]
 
+    @cached_property
+    def _current_ids(self) -> Dict[str, MaybeObjectID]:
+        roots = self.parent.env.roots(write=False)
+        return dict((remote.uuid, roots[remote.uuid].current) for remote in self.parent.hoard_config.remotes.all())
+
     def get_existing_paths_in_uuid_expanded(self, in_uuid: str, desired_id: ObjectID) -> Iterable[FastPosixPath]:
+        """Searches the current root as it was on first use, as the lookup tables do, but without computing one."""
+        current_id = self._current_ids[in_uuid]
         with self.parent.env.objects(write=False) as objects:
-            return list(lookup_paths(self._lookup_current[in_uuid], desired_id, objects.__getitem__))
+            return [
+                get_path_string(current_id, path, objects.__getitem__)
+                for path in self.parent.env.bloom_filters(objects).find_paths(current_id, desired_id)]
 
     def get_paths_in_hoard_expanded(self, desired_id: ObjectID) -> Iterable[FastPosixPath]:
         with self.parent.env.objects(write=False) as objects:
@@ -157,30 +192,20 @@ class MovesAndCopies:
         return get_path_string(self._lookup_hoard_desired.root_id, compressed_path, objects.__getitem__)
 
     def get_remote_copies(self, skip_uuid: str, desired_id: ObjectID) -> Iterable[Tuple[str, List[CompressedPath]]]:
-        for uuid in self._lookup_current.keys():
-            if uuid == skip_uuid:
-                continue
-
-            existing_paths = list(self._lookup_current[uuid][desired_id])
-            if len(existing_paths) > 0:
+        for uuid, _, existing_paths in self._postings_by_uuid(desired_id, needed=False):
+            if uuid != skip_uuid:
                 yield uuid, existing_paths
 
     def get_remote_copies_expanded(
             self, skip_uuid: str, desired_id: ObjectID) -> Iterable[Tuple[str, List[FastPosixPath]]]:
         with self.parent.env.objects(write=False) as objects:
-            for uuid in self._lookup_current.keys():
-                if uuid == skip_uuid:
-                    continue
-
-                existing_paths = list(lookup_paths(self._lookup_current[uuid], desired_id, objects.__getitem__))
-                if len(existing_paths) > 0:
-                    yield uuid, existing_paths
+            for uuid, current_id, existing_paths in self._postings_by_uuid(desired_id, needed=False):
+                if uuid != skip_uuid:
+                    yield uuid, [get_path_string(current_id, path, objects.__getitem__) for path in existing_paths]
 
     def whereis_needed(self, current_id: ObjectID) -> Iterable[Tuple[str, List[CompressedPath]]]:
-        for uuid, lookup_table in self._lookup_desired_but_not_current.items():
-            paths_needing_to_get = list(lookup_table[current_id])
-            if len(paths_needing_to_get) > 0:
-                yield uuid, paths_needing_to_get
+        for uuid, _, needed_paths in self._postings_by_uuid(current_id, needed=True):
+            yield uuid, needed_paths
 
     def whereis_cleanup(self, uuid: str, current_id: ObjectID):
         with self.parent.env.objects(write=False) as objects:
@@ -193,16 +218,16 @@ class ReadonlyHoardFSObjects:
 
         self._size_and_count_agg = AppCachedCalculator(
             SizeCountPresenceStatsCalculator(self.parent),
-            SizeCountPresenceStats)
+            SizeCountPresenceStats, self.parent.stats_cache)
 
     def hoard_files(self) -> Iterable[Tuple[FastPosixPath, FileObject]]:
         hoard_root_id = self.parent.env.roots(write=False)["HOARD"].desired
         with self.parent.env.objects(write=False) as objects:
-            for path, obj_type, obj_id, obj, _ in dfs(objects, "", hoard_root_id):
+            for path, obj_type, obj_id, obj, _ in dfs(objects, TreePath.root(), hoard_root_id):
                 if obj_type == ObjectType.TREE:
                     continue
                 obj: FileObject
-                yield FastPosixPath(path), obj
+                yield path.as_fast_path(), obj
 
     def in_folder(self, folder: FastPosixPath) -> Iterable[Tuple[FastPosixPath, FileObject]]:
         assert custom_isabs(folder.as_posix())  # from 3.13 behavior change...
@@ -215,7 +240,10 @@ class ReadonlyHoardFSObjects:
                 yield FastPosixPath(file.fullname), file.file_obj
 
     def status_by_uuid(
-            self, folder_path: FastPosixPath | None, extended: bool = False) -> Dict[str, Dict[str, Dict[str, Any]]]:
+            self, folder_path: FastPosixPath | None, extended: bool = False,
+            parallel: bool = False) -> Dict[str, Dict[str, Dict[str, Any]]]:
+        """Stats of the files in the folder per remote. Parallel calculation starts a pool of workers, so it is only
+        worth it for single commands, and not e.g. for each folder that is opened in the GUI."""
         stats: Dict[str, Dict[str, Dict[str, Any]]] = dict()
 
         node_id = composite_from_roots(self.parent)
@@ -223,6 +251,9 @@ class ReadonlyHoardFSObjects:
         if path_node_id is None:
             logging.error(f"Requesting info for missing folder path {folder_path}?!")
             node_stats = SizeCountPresenceStats(0)
+        elif parallel:
+            node_stats: SizeCountPresenceStats = calculate_in_parallel(
+                self._size_and_count_agg, self.parent.env, path_node_id)
         else:
             node_stats: SizeCountPresenceStats = self._size_and_count_agg[path_node_id]
 
@@ -241,82 +272,23 @@ class ReadonlyHoardFSObjects:
                     "size": remote_stats.size}
 
         if extended:
-            moves_and_copies = MovesAndCopies(self.parent)
-
-            with self.parent.env.objects(write=False) as objects:
-                for remote in self.parent.hoard_config.remotes.all():
-                    if remote.uuid not in stats:
-                        continue  # won't extend missing  fixme is ugly hack
-
-                    can_be_moved_cnt, can_be_moved_size = 0, 0
-                    can_be_copied_cnt, can_be_copied_size = 0, 0
-                    needed_to_get_cnt, needed_to_get_size = 0, 0
-
-                    remote_root = self.parent.env.roots(write=False)[remote.uuid]
-                    with alive_bar(title="Checking for extended stats") as bar:
-                        for path, diff_type, current_id, desired_id, _ in zip_dfs(
-                                objects, '', remote_root.current, remote_root.desired):
-                            bar()
-                            if diff_type == DiffType.LEFT_MISSING or diff_type == DiffType.DIFFERENT:
-                                # file is missing from current, how can we get it?
-
-                                assert desired_id is not None
-                                desired_obj: StoredObject = objects[desired_id]
-
-                                if desired_obj.object_type == ObjectType.TREE:
-                                    continue  # skip trees
-
-                                assert desired_obj.object_type == ObjectType.BLOB
-                                desired_obj: FileObject
-
-                                paths_to_move_inside_repo = moves_and_copies.get_existing_paths_in_uuid(
-                                    remote.uuid, desired_id)
-                                if len(paths_to_move_inside_repo) > 0:
-                                    # can be moved/copied in repo
-                                    can_be_moved_cnt += 1
-                                    can_be_moved_size += desired_obj.size
-
-                                for uuid, requested_paths in moves_and_copies.get_remote_copies(
-                                        remote.uuid, desired_id):
-                                    assert len(requested_paths) > 0
-
-                                    can_be_copied_cnt += 1
-                                    can_be_copied_size += desired_obj.size
-
-                                    break  # we know that it is desired
-
-                            elif diff_type == DiffType.RIGHT_MISSING:
-                                # file is missing from desired, so supposed to be cleaned up
-                                assert current_id is not None and desired_id is None
-                                current_obj: StoredObject = objects[current_id]
-
-                                if current_obj.object_type == ObjectType.TREE:
-                                    continue  # skip trees
-                                current_obj: FileObject
-
-                                needed_in_places = 0
-                                for uuid, paths_needing_to_get in moves_and_copies.whereis_needed(current_id):
-                                    assert len(paths_needing_to_get) > 0
-                                    needed_in_places += len(paths_needing_to_get)
-
-                                if needed_in_places > 0:
-                                    needed_to_get_cnt += 1
-                                    needed_to_get_size += current_obj.size
-
-                    if can_be_moved_cnt > 0:
-                        stats[remote.uuid][GET_BY_MOVE] = {
-                            "nfiles": can_be_moved_cnt,
-                            "size": can_be_moved_size}
-
-                    if can_be_copied_cnt > 0:
-                        stats[remote.uuid][GET_BY_COPY] = {
-                            "nfiles": can_be_copied_cnt,
-                            "size": can_be_copied_size}
-
-                    if needed_to_get_cnt > 0:
-                        stats[remote.uuid][RESERVED] = {
-                            "nfiles": needed_to_get_cnt,
-                            "size": needed_to_get_size}
+            extended_stats: ExtendedStats = AppCachedCalculator(
+                ExtendedStatsCalculator(self.parent, MovesAndCopies(self.parent)),
+                ExtendedStats, self.parent.stats_cache)[node_id]
+
+            for remote in self.parent.hoard_config.remotes.all():
+                if remote.uuid not in stats:
+                    continue  # won't extend missing  fixme is ugly hack
+
+                stats_for_remote = extended_stats.for_remote(remote.uuid)
+                for extended_status, size_count in [
+                        (GET_BY_MOVE, stats_for_remote.get_by_move),
+                        (GET_BY_COPY, stats_for_remote.get_by_copy),
+                        (RESERVED, stats_for_remote.reserved)]:
+                    if size_count.nfiles > 0:
+                        stats[remote.uuid][extended_status] = {
+                            "nfiles": size_count.nfiles,
+                            "size": size_count.size}
 
         return stats
 
@@ -337,14 +309,14 @@ class ReadonlyHoardFSObjects:
         remote_root = self.parent.env.roots(write=False)[repo_uuid]
         with self.parent.env.objects(write=False) as objects:
             for path, diff_type, current_id, desired_id, _ in zip_dfs(
-                    objects, '', remote_root.current, remote_root.desired):
+                    objects, TreePath.root(), remote_root.current, remote_root.desired):
                 if diff_type == DiffType.RIGHT_MISSING:
                     assert current_id is not None
                     current_obj: StoredObject = objects[current_id]
                     if current_obj.object_type == ObjectType.TREE:
                         continue
                     current_obj: FileObject
-                    yield FastPosixPath(path), current_obj
+                    yield path.as_fast_path(), current_obj
 
     def __contains__(self, file_path: FastPosixPath) -> bool:
         assert file_path.is_absolute()
@@ -362,16 +334,25 @@ class ReadonlyHoardFSObjects:
     def query(self) -> "Query":
         return Query(self.parent)
 
+    def warm_up_stats(self) -> None:
+        """Computes the stats of the whole hoard and stores them, so the next commands read them from the stats cache.
+
+        Stats of nodes that did not change since they were last computed are read from the cache, so only the changed
+        nodes are walked."""
+        calculate_in_parallel(self._size_and_count_agg, self.parent.env, composite_from_roots(self.parent))
+        self.query.warm_up_stats()
+        self.parent.stats_cache.flush()
+
     def desired_hoard(self) -> Iterable[Tuple[FastPosixPath, FileObject]]:
         current_root_id = self.parent.env.roots(write=False)["HOARD"].desired
         return self._iterate_all_files(current_root_id)
 
     def _iterate_all_files(self, current_root_id):
         with self.parent.env.objects(write=False) as objects:
-            for path, object_type, obj_id, obj, _ in dfs(objects, "", current_root_id):
+            for path, object_type, obj_id, obj, _ in dfs(objects, TreePath.root(), current_root_id):
                 if object_type == ObjectType.BLOB:
                     assert isinstance(obj, FileObject)
-                    yield FastPosixPath(path), obj
+                    yield path.as_fast_path(), obj
 
     def desired_in_repo(self, remote_uuid: str):
         current_repo_id = self.parent.env.roots(write=False)[remote_uuid].desired
@@ -382,8 +363,8 @@ class Query:
     def __init__(self, parent: "HoardContents"):
         self.parent = parent
 
-        self._repo_stats_agg = AppCachedCalculator(UsedSizeCalculator(parent), UsedSize)
-        self._file_and_folder_stats = AppCachedCalculator(QueryStatsCalculator(parent), QueryStats)
+        self._repo_stats_agg = AppCachedCalculator(UsedSizeCalculator(parent), UsedSize, parent.stats_cache)
+        self._file_and_folder_stats = AppCachedCalculator(QueryStatsCalculator(parent), QueryStats, parent.stats_cache)
 
     def count_non_deleted(self, folder_name: FastPosixPath) -> int:
         stats = self._get_folder_stats(folder_name)
@@ -437,6 +418,11 @@ class Query:
         repo_root_node: NodeID = NodeID(repo_root.desired, repo_root.current)
         return self._repo_stats_agg[repo_root_node].used_size
 
+    def warm_up_stats(self) -> None:
+        calculate_in_parallel(self._file_and_folder_stats, self.parent.env, composite_from_roots(self.parent))
+        for remote in self.parent.hoard_config.remotes.all():
+            self.used_size(remote.uuid)
+
 
 class HoardContents:
     config: HoardContentsConfig
@@ -445,6 +431,7 @@ class HoardContents:
     def __init__(self, folder: pathlib.Path, is_readonly: bool, hoard_config: HoardConfig):
         self.hoard_config: HoardConfig = hoard_config
         self.config = HoardContentsConfig(folder.joinpath(HOARD_CONTENTS_TOML), is_readonly)
+        self.stats_cache = app_stats_cache(os.path.join(folder, HOARD_STATS_CACHE_LMDB))
         self.fsobjects = ReadonlyHoardFSObjects(self)
 
         self.env = ObjectStorage(os.path.join(folder, HOARD_CONTENTS_LMDB_DIR), map_size=1 << 30)  # 1GB
@@ -452,9 +439,10 @@ class HoardContents:
 
     def close(self, writeable: bool):
         if writeable:
-            self.env.gc()
+            self.env.collect()
             self.validate_desired()
 
+        flush_app_stats_cache()
         self.env.__exit__(None, None, None)
         self.env = None
 
@@ -477,15 +465,14 @@ class HoardContents:
             for path, desired_roots, _ in zip_trees_dfs(
                     objects, "", [r.desired for r in all_roots], drilldown_same=False):
                 desired_objs = list(map((lambda o_id: objects[o_id] if o_id is not None else None), desired_roots))
-                desired_types = map(type, desired_objs)
-                non_none_types = set(desired_types) - {NoneType}
+                non_none_types = set(o.object_type for o in desired_objs if o is not None)
                 if len(non_none_types) > 1:
                     raise ValueError(f"object at path {path} is of many types in different trees: %s", non_none_types)
                 non_none_type = next(iter(non_none_types))
-                if non_none_type is TreeObject:
+                if non_none_type == ObjectType.TREE:
                     pass
                 else:
-                    assert non_none_type is FileObject
+                    assert non_none_type == ObjectType.BLOB
                     file_ids = {o.id for o in desired_objs if o is not None}
                     if len(file_ids) > 1:
                         raise ValueError(f"Object at path {path} has multiple desired file versions: {file_ids}")
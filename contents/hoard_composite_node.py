@@ -1,13 +1,13 @@
 import hashlib
 from abc import abstractmethod
-from typing import Dict, Iterable, Tuple, List
+from typing import Dict, Iterable, Tuple
 
 from msgspec import msgpack
 
 from contents.hashable_key import HashableKey
 from lmdb_storage.file_object import FileObject
 from lmdb_storage.operations.util import remap
-from lmdb_storage.tree_object import ObjectID, StoredObject, MaybeObjectID, ObjectType, TreeObject
+from lmdb_storage.tree_object import ObjectID, StoredObject, MaybeObjectID, ObjectType, TreeObject, merged_child_names
 
 
 class ObjectReader:
@@ -73,12 +73,11 @@ class CompositeObject:
         self._desired_roots = remap(node_id._desired_roots, objects.read)
 
     def children(self) -> Iterable[Tuple[str, "CompositeNodeID"]]:
-        children_names = set(
-            child_names(self._hoard_obj)
-            + sum((child_names(obj) for obj in self._current_roots.values()), [])
-            + sum((child_names(obj) for obj in self._desired_roots.values()), []))
+        trees = [
+            obj for obj in [self._hoard_obj, *self._current_roots.values(), *self._desired_roots.values()]
+            if obj is not None and obj.object_type == ObjectType.TREE]
 
-        for child_name in children_names:
+        for child_name in merged_child_names(trees):
             child_node = self.get_child(child_name)
             if child_node is not None:
                 yield child_name, child_node
@@ -115,6 +114,3 @@ def get_child_if_exists(child_name: str, hoard_obj: StoredObject | None) -> Mayb
         return hoard_obj.get(child_name)
     return None
 
-
-def child_names(obj: StoredObject) -> List[str]:
-    return list(n for n, _ in obj.children) if obj and obj.object_type == ObjectType.TREE else []
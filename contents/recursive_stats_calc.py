@@ -1,8 +1,9 @@
 import abc
 import dataclasses
+import hashlib
 import logging
 from abc import abstractmethod, ABC
-from functools import cached_property
+from functools import cached_property, partial
 from typing import Iterable, Tuple, Dict, List
 
 from msgspec import msgpack, Struct
@@ -10,7 +11,10 @@ from msgspec import msgpack, Struct
 from contents.hoard_composite_node import ObjectReader, CompositeNodeID, CompositeObject
 from contents.hashable_key import HashableKey
 from contents.hoard_props import HoardFileStatus, compute_status
+from lmdb_storage.cached_calcs import AppCachedCalculator, app_stats_cache
 from lmdb_storage.file_object import BlobObject, FileObject
+from lmdb_storage.object_store import ObjectStorage
+from lmdb_storage.parallel_walk import walk_subtrees, PARALLEL_WALK_MIN_OBJECTS
 from lmdb_storage.tree_calculation import RecursiveReader, RecursiveCalculator, StatGetter, ValueCalculator
 from lmdb_storage.tree_object import TreeObject, ObjectType, MaybeObjectID, StoredObject, ObjectID
 from lmdb_storage.tree_structure import Objects
@@ -185,15 +189,13 @@ class HoardFilePresence:
 
 
 class CachedReader(ObjectReader):
+    """Reads objects through the process-wide decoded objects cache."""
+
     def __init__(self, parent: "HoardContents") -> None:
         self.parent = parent
-        self._cache = dict()
 
     def read(self, object_id: ObjectID) -> StoredObject:
-        if object_id not in self._cache:
-            with self.parent.env.objects(write=False) as objects:
-                self._cache[object_id] = objects[object_id]
-        return self._cache[object_id]
+        return self.parent.env.read_object(object_id)
 
 
 def read_hoard_file_presence(node: CompositeObject) -> HoardFilePresence | None:
@@ -214,9 +216,19 @@ def read_hoard_file_presence(node: CompositeObject) -> HoardFilePresence | None:
     return HoardFilePresence(file_obj, node.node_id)
 
 
+class StoredObjectsReader(ObjectReader):
+    """Reads objects in an open transaction, e.g. of a worker that opened the storage on its own."""
+
+    def __init__(self, objects: Objects) -> None:
+        self.objects = objects
+
+    def read(self, object_id: ObjectID) -> StoredObject:
+        return self.objects[object_id]
+
+
 class CompositeNodeCalculator[R](ValueCalculator[CompositeObject, R]):
-    def __init__(self, hoard_contents: "HoardContents"):
-        self.object_reader = CachedReader(hoard_contents)
+    def __init__(self, hoard_contents: "HoardContents | None", object_reader: ObjectReader | None = None):
+        self.object_reader = object_reader if object_reader is not None else CachedReader(hoard_contents)
 
     def calculate(self, calculator: "StatGetter[CompositeNodeID, R]", item: CompositeNodeID) -> R:
         item_object = CompositeObject.expand(item, self.object_reader)
@@ -293,6 +305,45 @@ class QueryStatsCalculator(CompositeNodeCalculator[QueryStats]):
         return "QueryStatsCalculator-V02".encode()
 
 
+def calculate_in_parallel[R](
+        calculator: AppCachedCalculator[CompositeNodeID, R], storage: ObjectStorage, node_id: CompositeNodeID | None,
+        max_workers: int | None = None, min_objects: int = PARALLEL_WALK_MIN_OBJECTS) -> R:
+    """Calculates the stats of the node, with the stats of its children calculated by a pool of workers.
+
+    Each worker calculates with its own read-only snapshot of the storage and stores the stats it calculates in the
+    stats cache, so the stats below the node are there for the next calculations. The node itself is aggregated here
+    from the stats of its children. The calculator of the stats has to be a CompositeNodeCalculator."""
+    if node_id is None or calculator.is_cached(node_id):
+        return calculator[node_id]
+
+    node_calculator = calculator.calculator
+    assert isinstance(node_calculator, CompositeNodeCalculator)
+    node = CompositeObject.expand(node_id, node_calculator.object_reader)
+    if not node_calculator.treat_as_composite(node):
+        return calculator[node_id]
+
+    calculator.stats_cache.flush()  # so that workers read the stats calculated so far
+    children = [child_id for _, child_id in node.children()]
+    calculate_children = partial(
+        _calculate_children, calculator_type=type(node_calculator), result_type=calculator.result_type,
+        stats_cache_path=calculator.stats_cache.path)
+    for children_results in walk_subtrees(storage, children, calculate_children, max_workers, min_objects):
+        for child_id, result in children_results:
+            calculator.prefill(child_id, result)
+
+    return calculator[node_id]
+
+
+def _calculate_children[R](
+        objects: Objects, children: List[CompositeNodeID], calculator_type: type[CompositeNodeCalculator[R]],
+        result_type: type[R], stats_cache_path: str) -> List[Tuple[CompositeNodeID, R]]:
+    stats_cache = app_stats_cache(stats_cache_path, worker=True)
+    calculator = AppCachedCalculator(calculator_type(None, StoredObjectsReader(objects)), result_type, stats_cache)
+    results = [(child_id, calculator[child_id]) for child_id in children]
+    stats_cache.flush()
+    return results
+
+
 def drilldown(contents: "HoardContents", node_at_path: CompositeNodeID, path: List[str]) -> CompositeNodeID | None:
     with contents.env.objects(write=False) as objects:
         class TmpReader(ObjectReader):
@@ -394,3 +445,97 @@ class SizeCountPresenceStatsCalculator(CompositeNodeCalculator[SizeCountPresence
     @cached_property
     def stat_cache_key(self) -> bytes:
         return "SizeCountPresenceStats-V02".encode("UTF-8")
+
+
+@dataclasses.dataclass()
+class ExtendedForRemoteStats:
+    get_by_move: SizeCount
+    get_by_copy: SizeCount
+    reserved: SizeCount
+
+    def add(self, other):
+        assert isinstance(other, ExtendedForRemoteStats)
+        self.get_by_move += other.get_by_move
+        self.get_by_copy += other.get_by_copy
+        self.reserved += other.reserved
+
+
+class ExtendedStats(Struct, Storeable):
+    def should_store(self) -> bool:
+        return self.total > 100
+
+    total: int
+    _per_remote: Dict[str, ExtendedForRemoteStats] = dict()
+
+    def for_remote(self, uuid: str) -> ExtendedForRemoteStats:
+        if uuid not in self._per_remote:
+            self._per_remote[uuid] = ExtendedForRemoteStats(SizeCount(0, 0), SizeCount(0, 0), SizeCount(0, 0))
+        return self._per_remote[uuid]
+
+    def __iadd__(self, other):
+        assert isinstance(other, ExtendedStats), other
+        self.total += other.total
+        for remote, stat in other._per_remote.items():
+            self.for_remote(remote).add(stat)
+        return self
+
+
+class ExtendedStatsCalculator(CompositeNodeCalculator[ExtendedStats]):
+    """Counts the files that each remote can get by moving or copying them, and the files it has to keep for others.
+
+    Where else a file is comes from the lookup tables of the current and desired roots of all remotes, so the stats of
+    each node are cached for those roots, and not for the hoard root or for the node that the status is requested for.
+    Changing any remote root recomputes all extended stats, so repeated status calls are cheap only while the remotes
+    do not change."""
+
+    def __init__(self, hoard_contents: "HoardContents", moves_and_copies: "MovesAndCopies"):
+        super().__init__(hoard_contents)
+        self.moves_and_copies = moves_and_copies
+
+        roots = hoard_contents.env.roots(write=False)
+        remote_uuids = sorted(remote.uuid for remote in hoard_contents.hoard_config.remotes.all())
+        self.lookup_roots: List[Tuple[str, MaybeObjectID, MaybeObjectID]] = [
+            (uuid, roots[uuid].current, roots[uuid].desired) for uuid in remote_uuids]
+
+    def treat_as_composite(self, obj: CompositeObject) -> bool:
+        return obj.is_any_tree()
+
+    def calculate_for_atom(self, obj: CompositeObject) -> ExtendedStats:
+        result = ExtendedStats(1)
+        for uuid, (current_id, desired_id) in obj.node_id.roots:
+            if desired_id is not None and desired_id != current_id:
+                # file is missing from current, how can we get it?
+                desired_obj = obj._desired_roots[uuid]
+                if not isinstance(desired_obj, FileObject):
+                    continue
+
+                if len(self.moves_and_copies.get_existing_paths_in_uuid(uuid, desired_id)) > 0:
+                    result.for_remote(uuid).get_by_move += SizeCount(1, desired_obj.size)
+
+                if any(True for _ in self.moves_and_copies.get_remote_copies(uuid, desired_id)):
+                    result.for_remote(uuid).get_by_copy += SizeCount(1, desired_obj.size)
+
+            elif desired_id is None and current_id is not None:
+                # file is missing from desired, so supposed to be cleaned up
+                current_obj = obj._current_roots[uuid]
+                if not isinstance(current_obj, FileObject):
+                    continue
+
+                if any(len(paths) > 0 for _, paths in self.moves_and_copies.whereis_needed(current_id)):
+                    result.for_remote(uuid).reserved += SizeCount(1, current_obj.size)
+
+        return result
+
+    def aggregate(self, items: Iterable[Tuple[str, ExtendedStats]]) -> ExtendedStats:
+        result = ExtendedStats(0)
+
+        for _, child_result in items:
+            result += child_result
+        return result
+
+    def for_none(self, calculator: "StatGetter[HoardFilePresence, ExtendedStats]") -> ExtendedStats:
+        return ExtendedStats(0)
+
+    @cached_property
+    def stat_cache_key(self) -> bytes:
+        return "ExtendedStats-V02".encode("UTF-8") + hashlib.md5(msgpack.encode(self.lookup_roots)).digest()
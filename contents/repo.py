@@ -66,11 +66,13 @@ class RepoFSObjects:
 
     def add_file(self, filepath: FastPosixPath, file_obj: FileObject) -> None:
         root_id = self.root_id
-        with self.objects as objects:
-            root_id = add_file_object(
-                objects, root_id, filepath.as_posix().split("/"), file_obj)
 
-        self.roots["REPO"].current = root_id
+        def add() -> ObjectID:
+            with self.objects as objects:
+                return add_file_object(
+                    objects, root_id, filepath.as_posix().split("/"), file_obj)
+
+        self.roots["REPO"].current = self.roots.storage.with_map_growth(add)
 
     def mark_moved(self, from_file: FastPosixPath, to_file: FastPosixPath, file_obj: FileObject):
         assert not from_file.is_absolute()
@@ -85,10 +87,13 @@ class RepoFSObjects:
         assert not path.is_absolute()
 
         root_id = self.roots["REPO"].current
-        with self.objects as objects:
-            new_root_id = remove_file_object(
-                objects, root_id, path.as_posix().split("/"))
-        self.roots["REPO"].current = new_root_id
+
+        def remove() -> ObjectID:
+            with self.objects as objects:
+                return remove_file_object(
+                    objects, root_id, path.as_posix().split("/"))
+
+        self.roots["REPO"].current = self.roots.storage.with_map_growth(remove)
 
 
 class RepoContentsConfig:
@@ -183,7 +188,7 @@ class RepoContents:
         assert self.objects is not None
         self.objects = None
 
-        self.env.gc()
+        self.env.collect()
         self.env.__exit__(exc_type, exc_val, exc_tb)
         self.env = None
 
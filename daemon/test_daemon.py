@@ -8,6 +8,7 @@ from unittest.async_case import IsolatedAsyncioTestCase
 from command.test_repo_command import populate, pretty_file_writer
 from daemon.daemon import run_daemon
 from dragon import TotalCommand
+from lmdb_storage.object_store import BACKUP_ROTATION
 
 
 class TestDaemon(IsolatedAsyncioTestCase):
@@ -18,6 +19,7 @@ class TestDaemon(IsolatedAsyncioTestCase):
         populate(self.tmpdir.name)
 
     def tearDown(self):
+        BACKUP_ROTATION.wait()
         self.tmpdir.cleanup()
 
     async def test_run_daemon(self):
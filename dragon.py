@@ -1,24 +1,28 @@
 import logging
+import multiprocessing
 from typing import Optional
 
 import fire
 
 from command.command_hoard import HoardCommand
 from command.command_repo import RepoCommand
+from lmdb_storage.parallel_walk import set_parallel_walks
 
 NONE_TOML = "MISSING"
 
 
 class TotalCommand(object):
-    def __init__(self, verbose: bool = False, path: str = ".", name: Optional[str] = None):
+    def __init__(self, verbose: bool = False, path: str = ".", name: Optional[str] = None, parallel: bool = True):
         logging.basicConfig(
             level=logging.INFO if verbose else logging.WARNING,
             format='%(asctime)s - %(funcName)20s() - %(message)s',
             datefmt='%Y-%m-%d %H:%M:%S')
+        set_parallel_walks(parallel)
         self.cave = RepoCommand(path=path, name=name)
         self.hoard = HoardCommand(path=path)
 
 
 # Press the green button in the gutter to run the script.
 if __name__ == '__main__':
+    multiprocessing.freeze_support()  # workers of the frozen executable run their task instead of the CLI
     fire.Fire(TotalCommand)
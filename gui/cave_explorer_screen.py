@@ -77,7 +77,7 @@ class HoardContentsPendingToSyncFile(Tree[NodeID]):
         self.files_diff_tree_root: NodeID = NodeID(repo_root.current, repo_root.desired)
         self.pending_ops_calculator = AppCachedCalculator(
             DifferencesCalculator(self.hoard_contents, get_current_file_differences),
-            Difference)
+            Difference, self.hoard_contents.stats_cache)
 
         self.root.data = self.files_diff_tree_root
         self.root.label = (
@@ -228,7 +228,7 @@ class HoardContentsPendingToPull(Tree[NodeID]):
             self.contents_diff_tree_root: NodeID = NodeID(desired_root_id, new_desired_root_id)
             self.pending_ops_calculator = AppCachedCalculator(
                 DifferencesCalculator(self.hoard_contents, get_current_file_differences),
-                Difference)
+                Difference, self.hoard_contents.stats_cache)
 
             self.root.label = (
                 Text(PENDING_TO_PULL)
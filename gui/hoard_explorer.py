@@ -1,4 +1,5 @@
 import logging
+import multiprocessing
 import os
 import pathlib
 import subprocess
@@ -95,4 +96,5 @@ def start_hoard_explorer_gui(path: str | None = None):
 
 
 if __name__ == "__main__":
+    multiprocessing.freeze_support()
     start_hoard_explorer_gui()
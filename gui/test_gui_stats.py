@@ -5,6 +5,7 @@ from unittest import IsolatedAsyncioTestCase
 
 from command.fast_path import FastPosixPath
 from command.test_hoard_command import populate_repotypes, init_complex_hoard
+from lmdb_storage.object_store import BACKUP_ROTATION
 
 
 class TestHoardCommand(IsolatedAsyncioTestCase):
@@ -14,6 +15,7 @@ class TestHoardCommand(IsolatedAsyncioTestCase):
         populate_repotypes(self.tmpdir.name)
 
     def tearDown(self):
+        BACKUP_ROTATION.wait()
         self.tmpdir.cleanup()
 
     async def test_query_stats(self):
@@ -1,8 +1,9 @@
+import atexit
 import logging
+import os
 import random
-from typing import Dict, Any, Callable, Tuple
+from typing import Dict, Any, Callable
 
-from lmdb import Transaction
 from msgspec import msgpack
 
 from contents.hashable_key import HashableKey
@@ -38,40 +39,66 @@ class CachedCalculator[T, R](StatGetter[T, R]):
         return self._cache[item]
 
 
-APP_STATS_CACHE: StatsCache | None = None
-APP_STATS_CACHE_READER: Transaction | None = None
+APP_STATS_CACHES: Dict[str, StatsCache] = dict()
 
 
-def app_stats_cache() -> Tuple[StatsCache, Transaction]:
-    global APP_STATS_CACHE
-    global APP_STATS_CACHE_READER
-    if APP_STATS_CACHE is None:
-        APP_STATS_CACHE = StatsCache("./app-cache.lmdb")
-        APP_STATS_CACHE_READER = APP_STATS_CACHE.begin(write=False)
-        APP_STATS_CACHE_READER.__enter__()
-    return APP_STATS_CACHE, APP_STATS_CACHE_READER
+def app_stats_cache(path: str, worker: bool = False) -> StatsCache:
+    """The stats cache at that path, opened once per process, as a worker of another process if requested."""
+    path = os.path.abspath(path)
+    stats_cache = APP_STATS_CACHES.get(path)
+    if stats_cache is None:
+        if len(APP_STATS_CACHES) == 0:
+            atexit.register(flush_app_stats_cache)
+        stats_cache = StatsCache(path, worker=worker)
+        APP_STATS_CACHES[path] = stats_cache
+    return stats_cache
+
+
+def flush_app_stats_cache() -> None:
+    """Commits the stats computed since the last flush, e.g. when a command ends."""
+    for stats_cache in APP_STATS_CACHES.values():
+        stats_cache.flush()
 
 
 APP_CACHE_LOG_RATIO = 10000
 
 
 class AppCachedCalculator[T, R](StatGetter[T, R]):
-    def __init__(self, calculator: ValueCalculator[T, R], result_type: type[R]):
+    def __init__(self, calculator: ValueCalculator[T, R], result_type: type[R], stats_cache: StatsCache):
         self.calculator = calculator
         assert self.calculator.stat_cache_key is not None
 
         self._cache: Dict[Any, R] = dict()
         self._result_type = result_type
 
-        self._stats_cache, self._cache_reader = app_stats_cache()
+        self._stats_cache = stats_cache
+
+    @property
+    def stats_cache(self) -> StatsCache:
+        return self._stats_cache
+
+    @property
+    def result_type(self) -> type[R]:
+        return self._result_type
+
+    def _cache_key(self, item: HashableKey) -> bytes:
+        return self.calculator.stat_cache_key + item.hashed
+
+    def is_cached(self, item: T) -> bool:
+        """Whether the result for the item is already calculated, by this process or in the stats cache."""
+        return item in self._cache or (item is not None and self._stats_cache.get(self._cache_key(item)) is not None)
+
+    def prefill(self, item: T, result: R) -> None:
+        """Uses a result calculated elsewhere, e.g. by another process."""
+        self._cache[item] = result
 
     def __getitem__(self, item: T) -> R:
         if item not in self._cache:
             if item is not None:
                 assert isinstance(item, HashableKey)
 
-                item_key = self.calculator.stat_cache_key + item.hashed
-                cached_blob = self._cache_reader.get(item_key)
+                item_key = self._cache_key(item)
+                cached_blob = self._stats_cache.get(item_key)
 
                 if random.randint(0, APP_CACHE_LOG_RATIO - 1) == 0:
                     logging.warn(f"calculating stats, used%: {used_ratio(self._stats_cache._env)}\n")
@@ -80,14 +107,11 @@ class AppCachedCalculator[T, R](StatGetter[T, R]):
                     self._cache[item] = msgpack.decode(cached_blob, type=self._result_type)
 
                 if item not in self._cache:
-                    self._cache[item] = self.calculator.calculate(self, item)
-
-                result = self._cache[item]
+                    result = self.calculator.calculate(self, item)
+                    self._cache[item] = result
 
-                if result.should_store():
-                    cached_blob = msgpack.encode(result)
-                    with self._stats_cache.begin(write=True) as cache:
-                        cache.put(item_key, cached_blob)
+                    if result.should_store():
+                        self._stats_cache.put(item_key, msgpack.encode(result))
             else:
                 self._cache[item] = self.calculator.for_none(self)
         return self._cache[item]
@@ -113,9 +113,12 @@ class HoardDeferredOperations:
                         else:
                             logging.info("Trying to delete non-existent file %s", item.hoard_file)
 
-                with self._parent.env.objects(write=True) as objects:
-                    new_repo_root_id = objects.mktree_from_tuples(
-                        sorted(loaded_objs.items()), alive_it=alive_it) if len(loaded_objs) > 0 else None
+                def write_tree() -> MaybeObjectID:
+                    with self._parent.env.objects(write=True) as objects:
+                        return objects.mktree_from_tuples(
+                            sorted(loaded_objs.items()), alive_it=alive_it) if len(loaded_objs) > 0 else None
+
+                new_repo_root_id = self._parent.env.with_map_growth(write_tree)
 
                 if new_repo_root_id == repo_root_id:
                     logging.error(
@@ -130,9 +133,21 @@ class HoardDeferredOperations:
                     repo_root.desired = new_repo_root_id
 
         logging.info(f"Cleaning deferred queue...")
+        self._parent.env.with_map_growth(self._clear_queue_in_transaction)
+
+    def _clear_queue_in_transaction(self):
         with self:
             self.clear_queue()  # we are in the same transaction
 
+    def queue_item(self, repo_uuid: str, branch: str, hoard_file: str, stored_obj: StoredObject, op: DeferredOp):
+        """Sets the queue item in its own transaction, running it again if the map had to grow."""
+
+        def set_in_transaction():
+            with self:
+                self.set_queue_item(repo_uuid, branch, hoard_file, stored_obj, op)
+
+        self._parent.env.with_map_growth(set_in_transaction)
+
 
 def mklist_from_tree(objects: Objects, repo_root_id: MaybeObjectID) -> dict[str, FileObject]:
     loaded_objs: Dict[str, FileObject] = {}
@@ -148,23 +163,19 @@ def mklist_from_tree(objects: Objects, repo_root_id: MaybeObjectID) -> dict[str,
 
 def add_to_current_tree_file_obj(
         hoard: HoardContents, repo_uuid: str, hoard_file: str, file_obj: FileObject):
-    with HoardDeferredOperations(hoard) as deferred_ops:
-        deferred_ops.set_queue_item(repo_uuid, BRANCH_CURRENT, hoard_file, file_obj, DeferredOp.ADD)
+    HoardDeferredOperations(hoard).queue_item(repo_uuid, BRANCH_CURRENT, hoard_file, file_obj, DeferredOp.ADD)
 
 
 def add_to_desired_tree(
         hoard: HoardContents, repo_uuid: str, hoard_file: str, file_obj: FileObject):
-    with HoardDeferredOperations(hoard) as deferred_ops:
-        deferred_ops.set_queue_item(repo_uuid, BRANCH_DESIRED, hoard_file, file_obj, DeferredOp.ADD)
+    HoardDeferredOperations(hoard).queue_item(repo_uuid, BRANCH_DESIRED, hoard_file, file_obj, DeferredOp.ADD)
 
 
 def remove_from_current_tree(
         hoard: HoardContents, repo_uuid: str, hoard_file: str, file_obj: FileObject):
-    with HoardDeferredOperations(hoard) as deferred_ops:
-        deferred_ops.set_queue_item(repo_uuid, BRANCH_CURRENT, hoard_file, file_obj, DeferredOp.DEL)
+    HoardDeferredOperations(hoard).queue_item(repo_uuid, BRANCH_CURRENT, hoard_file, file_obj, DeferredOp.DEL)
 
 
 def remove_from_desired_tree(
         hoard: HoardContents, repo_uuid: str, hoard_file: str, file_obj: FileObject):
-    with HoardDeferredOperations(hoard) as deferred_ops:
-        deferred_ops.set_queue_item(repo_uuid, BRANCH_DESIRED, hoard_file, file_obj, DeferredOp.DEL)
+    HoardDeferredOperations(hoard).queue_item(repo_uuid, BRANCH_DESIRED, hoard_file, file_obj, DeferredOp.DEL)
@@ -0,0 +1,223 @@
+import enum
+import logging
+import time
+from typing import Collection, List, Set
+
+import msgspec
+from lmdb import _Database
+
+from lmdb_storage.tree_object import ObjectID, ObjectType
+from lmdb_storage.tree_structure import StoredObjects, BORN_KEY_PREFIX, TOUCHED_KEY_PREFIX
+
+## Incremental collection
+#
+# Objects are only ever written after their children, so objects that existed before the last collection only refer
+# to objects that also existed then. A minor collection thus only traces from the roots through objects written since
+# (the nursery), and deletes the newly added objects that it did not reach. Trees that were written again are traced
+# too, as they may have been collected and re-added with children that were collected and re-added as well.
+#
+# Old garbage is collected by a major collection, that is split between runs: it first marks the live objects, keeping
+# the objects still to visit in a gray queue, and then sweeps the unmarked objects in key order. Every run marks from
+# the current roots before sweeping, so objects that became live during the cycle are never swept.
+#
+# Sweeping in key order would delete children before their parents, so a run that stops halfway would leave garbage
+# trees that miss some of their children, and that are then taken as whole by writers that find them stored. The sweep
+# therefore only records the unmarked objects as dead while it is split between runs, and deletes those that are still
+# unmarked in the run that reaches the last object. Deleting needs no decoding, so it is cheap compared to marking.
+
+GC_STATE_KEY = b"state"
+MARKED_KEY_PREFIX = b"m"
+GRAY_KEY_PREFIX = b"g"
+DEAD_KEY_PREFIX = b"d"
+
+MINOR_COLLECTIONS_PER_MAJOR = 16
+SWEEP_BATCH_SIZE = 1 << 10
+
+
+class CollectionPhase(enum.IntEnum):
+    IDLE = 0
+    MARK = 1
+    SWEEP = 2
+
+
+class CollectionState(msgspec.Struct):
+    phase: CollectionPhase = CollectionPhase.IDLE
+    swept_until: bytes | None = None
+    minor_collections: int = 0  # since the last major collection
+
+
+class IncrementalCollector:
+    def __init__(self, objects: StoredObjects, gc_db: _Database):
+        self.objects = objects
+        self.txn = objects.txn
+        self.gc_db = gc_db
+
+    def load_state(self) -> CollectionState | None:
+        data = self.txn.get(GC_STATE_KEY, db=self.gc_db)
+        return msgspec.msgpack.decode(data, type=CollectionState) if data is not None else None
+
+    def store_state(self, state: CollectionState) -> None:
+        self.txn.put(GC_STATE_KEY, msgspec.msgpack.encode(state), db=self.gc_db)
+
+    def collect(self, root_ids: Collection[ObjectID], deadline: float | None, start_major: bool = False) -> None:
+        state = self.load_state()
+        if state is None:  # storage was never collected incrementally, so it may have untracked garbage
+            state = CollectionState(phase=CollectionPhase.MARK)
+
+        deleted = self.collect_minor(root_ids)
+        logging.info(f"Minor collection deleted {deleted} objects.")
+
+        if state.phase == CollectionPhase.IDLE:
+            state.minor_collections += 1
+            if start_major or state.minor_collections >= MINOR_COLLECTIONS_PER_MAJOR:
+                logging.info(f"Starting major collection after {state.minor_collections} minor ones.")
+                state.phase = CollectionPhase.MARK
+
+        if state.phase != CollectionPhase.IDLE:
+            self.collect_major_step(state, root_ids, deadline)
+
+        self.store_state(state)
+
+    def collect_minor(self, root_ids: Collection[ObjectID]) -> int:
+        born = set(self._keys(BORN_KEY_PREFIX))
+        touched = set(self._keys(TOUCHED_KEY_PREFIX))
+
+        reached: Set[ObjectID] = set()
+        q = list(root_ids)
+        while len(q) > 0:
+            current_id = q.pop()
+            if current_id in reached or (current_id not in born and current_id not in touched):
+                continue  # objects from before the last collection only refer to such objects
+
+            reached.add(current_id)
+            current_obj = self.objects[current_id]
+            if current_obj is not None and current_obj.object_type == ObjectType.TREE:
+                q.extend(child_id for _, child_id in current_obj.children)
+
+        unreached = born - reached
+        for obj_id in unreached:
+            del self.objects[obj_id]
+
+        self._clear(BORN_KEY_PREFIX)
+        self._clear(TOUCHED_KEY_PREFIX)
+        return len(unreached)
+
+    def collect_major_step(self, state: CollectionState, root_ids: Collection[ObjectID], deadline: float | None):
+        self._mark_gray(root_ids)  # roots may have changed since the last step
+        if not self._mark(deadline):
+            logging.info("Major collection ran out of time while marking.")
+            return
+
+        state.phase = CollectionPhase.SWEEP
+        if not self._sweep(state, deadline):
+            logging.info(f"Major collection ran out of time while sweeping, swept until {state.swept_until}.")
+            return
+
+        logging.info("Major collection finished.")
+        self._clear(MARKED_KEY_PREFIX)
+        self._clear(GRAY_KEY_PREFIX)
+        state.phase = CollectionPhase.IDLE
+        state.swept_until = None
+        state.minor_collections = 0
+
+    def reset(self) -> None:
+        """Forgets all collection progress, to be used after all garbage was collected at once."""
+        self._clear(BORN_KEY_PREFIX)
+        self._clear(TOUCHED_KEY_PREFIX)
+        self._clear(MARKED_KEY_PREFIX)
+        self._clear(GRAY_KEY_PREFIX)
+        self._clear(DEAD_KEY_PREFIX)
+        self.store_state(CollectionState())
+
+    def is_sweeping(self) -> bool:
+        """Whether a major collection is sweeping, so stored objects may be dead and due to be deleted."""
+        state = self.load_state()
+        return state is not None and state.phase == CollectionPhase.SWEEP
+
+    def _is_marked(self, obj_id: ObjectID) -> bool:
+        return self.txn.get(MARKED_KEY_PREFIX + obj_id, db=self.gc_db) is not None
+
+    def _mark_gray(self, obj_ids: Collection[ObjectID]) -> None:
+        for obj_id in obj_ids:
+            if not self._is_marked(obj_id):
+                self.txn.put(GRAY_KEY_PREFIX + obj_id, b"", db=self.gc_db)
+
+    def _mark(self, deadline: float | None) -> bool:
+        """Marks objects from the gray queue and queues their children, returns whether the queue was emptied."""
+        while True:
+            if _is_past(deadline):
+                return False
+
+            gray_ids = self._keys(GRAY_KEY_PREFIX, limit=SWEEP_BATCH_SIZE)
+            if len(gray_ids) == 0:
+                return True
+
+            for obj_id in gray_ids:
+                self.txn.delete(GRAY_KEY_PREFIX + obj_id, db=self.gc_db)
+                if self._is_marked(obj_id):
+                    continue
+
+                self.txn.put(MARKED_KEY_PREFIX + obj_id, b"", db=self.gc_db)
+                obj = self.objects[obj_id]
+                if obj is not None and obj.object_type == ObjectType.TREE:
+                    self._mark_gray([child_id for _, child_id in obj.children])
+
+    def _sweep(self, state: CollectionState, deadline: float | None) -> bool:
+        """Records unmarked objects as dead in key order, and deletes them once all objects were visited, returns
+        whether they were deleted."""
+        while True:
+            if _is_past(deadline):
+                return False
+
+            if self._sweep_batch(state):
+                break
+
+        deleted = self._delete_dead()
+        logging.info(f"Major collection deleted {deleted} objects.")
+        return True
+
+    def _sweep_batch(self, state: CollectionState) -> bool:
+        """Records the unmarked objects of the next batch as dead, returns whether all objects were visited."""
+        obj_ids = self.objects.ids_after(state.swept_until, limit=SWEEP_BATCH_SIZE)
+        if len(obj_ids) == 0:
+            return True
+
+        for obj_id in obj_ids:
+            if not self._is_marked(obj_id):
+                self.txn.put(DEAD_KEY_PREFIX + obj_id, b"", db=self.gc_db)
+        state.swept_until = obj_ids[-1]
+        return False
+
+    def _delete_dead(self) -> int:
+        """Deletes the dead objects that were not marked since they were found, all in the same transaction."""
+        deleted = 0
+        for obj_id in self._keys(DEAD_KEY_PREFIX):
+            if not self._is_marked(obj_id):
+                del self.objects[obj_id]
+                deleted += 1
+        self._clear(DEAD_KEY_PREFIX)
+        return deleted
+
+    def _keys(self, prefix: bytes, limit: int | None = None) -> List[ObjectID]:
+        result = []
+        with self.txn.cursor(db=self.gc_db) as cursor:
+            found = cursor.set_range(prefix)
+            while found and (limit is None or len(result) < limit):
+                key = bytes(cursor.key())
+                if not key.startswith(prefix):
+                    break
+                result.append(key[len(prefix):])
+                found = cursor.next()
+        return result
+
+    def _clear(self, prefix: bytes) -> None:
+        with self.txn.cursor(db=self.gc_db) as cursor:
+            if not cursor.set_range(prefix):
+                return
+            while bytes(cursor.key()).startswith(prefix):
+                if not cursor.delete():
+                    break
+
+
+def _is_past(deadline: float | None) -> bool:
+    return deadline is not None and time.monotonic() >= deadline
@@ -1,63 +1,184 @@
-from typing import Iterable, Tuple, List, Callable, Dict
+import bisect
+import struct
+import sys
+from array import array
+from typing import Iterable, Tuple, List, Callable, Dict, Sequence, Iterator
 
 from varint import decode_buffer
 
 type CompressedPath = List[int]
 
 
-def _read_packed[LookupData](packed_lookup_data) -> Dict[bytes, List[int] | List[LookupData]]:
+## Indexed lookup data format
+#  header: magic: 8 bytes, version: uint8, padding: 7 bytes, count: uint64
+#  keys: 20 bytes[count], sorted, then padding to 8 bytes
+#  offsets: uint64[count], of the data of each key in the packed entries
+#  packed entries: (key: 20 bytes, data size: varint, data)[count], as they were computed
+#
+# The index is used in place, so the format can be memory-mapped from a file and used with no parse step.
+
+KEY_LEN = 20
+INDEXED_MAGIC = b"HOARDLUT"
+INDEXED_VERSION = 1
+INDEXED_HEADER = struct.Struct("<8sB7xQ")
+OFFSET_LEN = 8
+
+
+def _pad_to_offset(size: int) -> int:
+    return -size % OFFSET_LEN
+
+
+def index_lookup_data(packed_lookup_data: bytes) -> bytes:
+    """Indexes the packed entries, entries with the same key keep their order in the packed data."""
+    entry_starts = array("Q")
     idx = 0
-    lookup_table: Dict[bytes, List[int] | List[LookupData]] = dict()
     while idx < len(packed_lookup_data):
-        prefix = bytes(packed_lookup_data[idx:idx + 20])
-        assert type(prefix) is bytes
-        idx += 20
+        entry_starts.append(idx)
+        cnt, idx = decode_buffer(packed_lookup_data, idx + KEY_LEN)  # find size of data
+        idx += cnt
 
-        if prefix not in lookup_table:
-            lookup_table[prefix] = [idx]
-        else:
-            lookup_table[prefix].append(idx)
+    sorted_starts = sorted(entry_starts, key=lambda start: packed_lookup_data[start:start + KEY_LEN])
+    sorted_keys = b"".join(packed_lookup_data[start:start + KEY_LEN] for start in sorted_starts)
+    offsets = array("Q", (start + KEY_LEN for start in sorted_starts))
+    if sys.byteorder != "little":
+        offsets.byteswap()
+
+    return b"".join([
+        INDEXED_HEADER.pack(INDEXED_MAGIC, INDEXED_VERSION, len(sorted_starts)),
+        sorted_keys, bytes(_pad_to_offset(len(sorted_keys))),
+        offsets.tobytes(),
+        packed_lookup_data])
+
+
+class IndexedLookupData:
+    """Indexed lookup data read in place from a buffer, e.g. bytes or a memory-mapped file."""
+
+    def __init__(self, buffer):
+        assert sys.byteorder == "little", "Indexed lookup tables are only read on little-endian machines."
+        self._buffer = memoryview(buffer)
+        magic, version, count = INDEXED_HEADER.unpack_from(self._buffer, 0)
+        if magic != INDEXED_MAGIC:
+            raise ValueError(f"Not an indexed lookup table, starts with {bytes(magic)}!")
+        if version != INDEXED_VERSION:
+            raise ValueError(f"Unsupported indexed lookup table version {version}!")
+
+        keys_at = INDEXED_HEADER.size
+        offsets_at = keys_at + count * KEY_LEN + _pad_to_offset(count * KEY_LEN)
+        packed_at = offsets_at + count * OFFSET_LEN
+
+        self.keys = _SortedKeys(self._buffer[keys_at:keys_at + count * KEY_LEN])
+        self.offsets = self._buffer[offsets_at:packed_at].cast("Q")
+        self.packed_lookup_data = self._buffer[packed_at:]
+
+    def entries(self) -> Iterator[Tuple[bytes, memoryview]]:
+        """Yields the keys and the data of all entries, in key order."""
+        for key, offset in zip(self.keys, self.offsets):
+            cnt, start = decode_buffer(self.packed_lookup_data, offset)
+            yield key, self.packed_lookup_data[start:start + cnt]
 
-        cnt, idx = decode_buffer(packed_lookup_data, idx)  # find size of path
-        idx += cnt
-    return lookup_table
+
+class _SortedKeys(Sequence[bytes]):
+    """Views concatenated fixed-size keys as a sequence, to be searched with bisect."""
+
+    def __init__(self, keys: memoryview):
+        self._keys = keys
+
+    def __len__(self) -> int:
+        return len(self._keys) // KEY_LEN
+
+    def __getitem__(self, idx: int) -> bytes:
+        if not 0 <= idx < len(self):
+            raise IndexError(idx)
+        return self._keys[idx * KEY_LEN:(idx + 1) * KEY_LEN].tobytes()
+
+    def __iter__(self) -> Iterator[bytes]:
+        for start in range(0, len(self._keys), KEY_LEN):
+            yield self._keys[start:start + KEY_LEN].tobytes()
 
 
 class LookupTable[LookupData]:
-    def __init__(self, packed_lookup_data: bytes, reader: Callable[[bytes, int], LookupData]):
-        lookup_table = _read_packed(packed_lookup_data)
+    """Lookup table over packed entries of a 20-byte key and varint-sized data, possibly many with the same key.
+
+    Searches a sorted index of the keys and the offsets of their data, and decodes the data of a key when looked up.
+    Packed entries are indexed when the table is created, indexed lookup data is used as-is."""
 
-        self._lookup_table = lookup_table
-        self._packed_lookup_data = packed_lookup_data
+    def __init__(
+            self, lookup_data: bytes | IndexedLookupData, reader: Callable[[bytes, int], Tuple[int, LookupData]]):
+        if not isinstance(lookup_data, IndexedLookupData):
+            lookup_data = IndexedLookupData(index_lookup_data(lookup_data))
 
-        self._decoded_lookup_data = dict()
+        self._packed_lookup_data = lookup_data.packed_lookup_data
+        self._offsets = lookup_data.offsets
+        self._keys = lookup_data.keys
+        self._keys_count: int | None = None
+
+        self._decoded_lookup_data: Dict[bytes, List[LookupData]] = dict()
         self._reader = reader
 
     def __str__(self):
         return f"LookupTable[{len(self)}]"
 
     def __len__(self) -> int:
-        return len(self._lookup_table)
+        if self._keys_count is None:
+            self._keys_count = sum(1 for _ in self.keys())
+        return self._keys_count
+
+    def _find(self, key: bytes) -> Tuple[int, int]:
+        """Returns the range of indexes of the entries with that key."""
+        start = bisect.bisect_left(self._keys, key)
+        end = start
+        while end < len(self._keys) and self._keys[end] == key:
+            end += 1
+        return start, end
 
     def __getitem__(self, obj_id: bytearray | bytes) -> List[LookupData]:
         hash_prefix = bytes(obj_id) if isinstance(obj_id, bytearray) else obj_id
-        if hash_prefix not in self._lookup_table:
-            return []
+        decoded = self._decoded_lookup_data.get(hash_prefix)
+        if decoded is None:
+            start, end = self._find(hash_prefix)
+            if start == end:
+                return []
 
-        idxs = self._lookup_table[hash_prefix]
-        if isinstance(idxs[0], int):  # convert the list of ints to the list of unpacked paths
-            idxs = [self._reader(self._packed_lookup_data, idx)[1] for idx in idxs]
-            self._lookup_table[hash_prefix] = idxs
-        return idxs
+            decoded = [self._reader(self._packed_lookup_data, self._offsets[idx])[1] for idx in range(start, end)]
+            self._decoded_lookup_data[hash_prefix] = decoded
+        return decoded
 
     def __contains__(self, obj_id: bytes) -> bool:
-        return bytes(obj_id) in self._lookup_table
+        start, end = self._find(bytes(obj_id))
+        return start < end
 
     def keys(self) -> Iterable[bytes]:
-        return self._lookup_table.keys()
+        last_key = None
+        for key in self._keys:
+            if key != last_key:
+                yield key
+                last_key = key
 
 
 class LookupTableObjToPaths[LookupData](LookupTable[LookupData]):
-    def __init__(self, packed_lookup_data: bytes, reader: Callable[[bytes, int], LookupData], root_id):
-        super().__init__(packed_lookup_data, reader)
+    def __init__(
+            self, lookup_data: bytes | IndexedLookupData, reader: Callable[[bytes, int], Tuple[int, LookupData]],
+            root_id):
+        super().__init__(lookup_data, reader)
         self.root_id = root_id
+
+
+class LookupTableIndex[LookupData]:
+    """Index of many tables, with the root ids that the data in the postings of each table refers to.
+
+    Each table is searched by its own sorted keys, so when a root changes only the tables of that root are computed
+    again, and the tables of the other roots are reused as they are."""
+
+    def __init__(
+            self, tables: List[bytes | IndexedLookupData], reader: Callable[[bytes, int], Tuple[int, LookupData]],
+            root_ids: List[bytes | None]):
+        assert len(tables) == len(root_ids)
+        self.tables = [LookupTable[LookupData](lookup_data, reader) for lookup_data in tables]
+        self.root_ids = root_ids
+
+    def __getitem__(self, obj_id: bytearray | bytes) -> List[Tuple[int, LookupData]]:
+        return self.postings(obj_id, range(len(self.tables)))
+
+    def postings(self, obj_id: bytearray | bytes, table_idxs: Iterable[int]) -> List[Tuple[int, LookupData]]:
+        """Postings of the object in those tables, in the order of the tables."""
+        return [(table_idx, data) for table_idx in table_idxs for data in self.tables[table_idx][obj_id]]
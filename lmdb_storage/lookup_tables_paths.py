@@ -1,13 +1,13 @@
 import hashlib
 import logging
 import sys
-from typing import Iterable, Tuple, Callable
+from typing import Iterable, Tuple, Callable, List, Iterator
 
 from command.fast_path import FastPosixPath
 from lmdb_storage.file_object import FileObject
 from lmdb_storage.lookup_tables import LookupTableObjToPaths, CompressedPath
 
-from lmdb_storage.tree_iteration import SkipFun, CANT_SKIP
+from lmdb_storage.tree_iteration import SkipFun, CANT_SKIP, SkipFlag
 from lmdb_storage.tree_object import ObjectType, ObjectID, StoredObject, TreeObject, MaybeObjectID
 from lmdb_storage.tree_structure import Objects
 from util import format_size
@@ -26,7 +26,15 @@ def fast_path_dfs[P](
     if start_id is None:
         return
 
-    def _fast_path(path: P, obj_id: ObjectID) -> Iterable[Tuple[P, ObjectType, ObjectID, StoredObject, SkipFun]]:
+    skip_children = SkipFlag()
+    stack: List[Iterator[Tuple[P, ObjectID]]] = [iter([(start_path, start_id)])]
+    while len(stack) > 0:
+        current = next(stack[-1], None)
+        if current is None:
+            stack.pop()
+            continue
+
+        path, obj_id = current
         assert type(obj_id) is bytes
 
         obj = objects[obj_id]
@@ -35,59 +43,61 @@ def fast_path_dfs[P](
 
         if not isinstance(obj, TreeObject):
             yield path, ObjectType.BLOB, obj_id, obj, CANT_SKIP
-            return
-
-        should_skip = False
-
-        def skip_children() -> None:
-            nonlocal should_skip
-            should_skip = True
+            continue
 
+        skip_children.skip = False
         yield path, ObjectType.TREE, obj_id, obj, skip_children
-        if should_skip:
-            return
+        if not skip_children.skip:
+            stack.append(_extended_child_paths(path, obj, state_extender))
 
-        for child_idx, (child_name, child_id) in enumerate(obj.children):
-            yield from _fast_path(state_extender(path, child_idx, child_name), child_id)
 
-    yield from _fast_path(start_path, start_id)
+def _extended_child_paths[P](
+        path: P, tree: TreeObject, state_extender: Callable[[P, int, str], P]) -> Iterator[Tuple[P, ObjectID]]:
+    for child_idx, (child_name, child_id) in enumerate(tree.children):
+        yield state_extender(path, child_idx, child_name), child_id
 
 
 def fast_zip_left_dfs(
         objects: Objects, compressed_path: bytearray, left_id: MaybeObjectID, right_id: MaybeObjectID,
         drilldown_same: bool = True) -> Iterable[Tuple[bytearray, StoredObject | None, StoredObject | None, SkipFun]]:
-    if left_id is None and right_id is None:
-        return  # nothing more to yield
-
-    left_obj = objects[left_id] if left_id else None
-    right_obj = objects[right_id] if right_id else None
+    skip_children = SkipFlag()
+    stack: List[Iterator[Tuple[bytearray, MaybeObjectID, MaybeObjectID]]] = [
+        iter([(compressed_path, left_id, right_id)])]
+    while len(stack) > 0:
+        current = next(stack[-1], None)
+        if current is None:
+            stack.pop()
+            continue
 
-    if left_id == right_id and not drilldown_same:  # we got same value for all
-        yield compressed_path, left_obj, right_obj, CANT_SKIP
-        return
+        compressed_path, left_id, right_id = current
+        if left_id is None and right_id is None:
+            continue  # nothing more to yield
 
-    if isinstance(left_obj, TreeObject):
-        # has tree
-        should_skip = False
+        left_obj = objects[left_id] if left_id else None
+        right_obj = objects[right_id] if right_id else None
 
-        def skip_children() -> None:
-            nonlocal should_skip
-            should_skip = True
+        if left_id == right_id and not drilldown_same:  # we got same value for all
+            yield compressed_path, left_obj, right_obj, CANT_SKIP
+            continue
 
-        yield compressed_path, left_obj, right_obj, skip_children
+        if isinstance(left_obj, TreeObject):
+            # has tree
+            skip_children.skip = False
+            yield compressed_path, left_obj, right_obj, skip_children
+            if not skip_children.skip:
+                stack.append(_zipped_left_children(compressed_path, left_obj, right_obj))
+        else:
+            # only one or more files
+            yield compressed_path, left_obj, right_obj, CANT_SKIP
 
-        if should_skip:
-            return
 
-        for child_idx, (child_name, _) in enumerate(left_obj.children):
-            yield from fast_zip_left_dfs(
-                objects, compressed_path + encode(child_idx),
-                left_obj.get(child_name) if isinstance(left_obj, TreeObject) else None,
-                right_obj.get(child_name) if isinstance(right_obj, TreeObject) else None,
-                drilldown_same)
-    else:
-        # only one or more files
-        yield compressed_path, left_obj, right_obj, CANT_SKIP
+def _zipped_left_children(
+        compressed_path: bytearray, left_obj: TreeObject,
+        right_obj: StoredObject | None) -> Iterator[Tuple[bytearray, MaybeObjectID, MaybeObjectID]]:
+    for child_idx, (child_name, left_child_id) in enumerate(left_obj.children):
+        yield (
+            compressed_path + encode(child_idx), left_child_id,
+            right_obj.get(child_name) if isinstance(right_obj, TreeObject) else None)
 
 
 def lookup_paths(
@@ -176,7 +186,7 @@ def decode_bytes_to_intpath(packed_lookup_data: bytes, idx: int) -> Tuple[int, C
 
 def decode_bytes_to_object_id(packed_lookup_data: bytes, idx: int) -> Tuple[int, bytes]:
     cnt, idx = decode_buffer(packed_lookup_data, idx)
-    return idx + cnt, packed_lookup_data[idx:idx + cnt]
+    return idx + cnt, bytes(packed_lookup_data[idx:idx + cnt])
 
 
 def compute_path_lookup_table(objects: Objects, root_id: MaybeObjectID) -> bytearray:
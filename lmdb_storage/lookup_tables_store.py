@@ -0,0 +1,185 @@
+import enum
+import logging
+import mmap
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Collection, List, Tuple, Dict
+
+from lmdb_storage.lookup_tables import IndexedLookupData, index_lookup_data
+from lmdb_storage.lookup_tables_paths import compute_obj_id_to_path_lookup_table, \
+    compute_obj_id_to_path_difference_lookup_table, compute_path_lookup_table
+from lmdb_storage.tree_object import MaybeObjectID, ObjectID
+from lmdb_storage.tree_structure import Objects
+
+## Persisted lookup tables
+#  file: <storage path>-LUT/<kind>-<root id hex>[-<other root id hex>].lut, in the indexed lookup data format
+#  a missing root id is written as "none"
+#
+# Lookup tables are computed from immutable roots, so they are stored and reused across runs. The files are
+# memory-mapped, so processes using the same tables share them in the page cache. Tables of roots that are no longer
+# live are deleted when garbage is collected.
+#
+# Tables are first written to <file name>.<pid>.partial, and then renamed, so readers never see partially written
+# ones. Partial files left by processes that died while writing are deleted with the tables of dead roots.
+
+LOOKUP_TABLE_SUFFIX = ".lut"
+PARTIAL_FILE_SUFFIX = ".partial"
+STALE_PARTIAL_FILE_AGE = 10 * 60  # seconds, younger ones may still be written
+MISSING_ROOT_NAME = "none"
+
+
+class LookupTableKind(enum.IntEnum):
+    OBJ_ID_TO_PATH = 1
+    OBJ_ID_TO_PATH_DIFFERENCE = 2
+    PATH_TO_OBJ_ID = 3
+
+
+def lookup_tables_folder(storage_path: str) -> Path:
+    return Path(f"{storage_path}-LUT")
+
+
+def lookup_table_file_name(kind: LookupTableKind, *root_ids: MaybeObjectID) -> str:
+    return "-".join(
+        [str(kind.value)] + [root_id.hex() if root_id is not None else MISSING_ROOT_NAME for root_id in root_ids]
+    ) + LOOKUP_TABLE_SUFFIX
+
+
+def file_root_ids(file_name: str) -> List[ObjectID]:
+    _, *root_names = file_name.removesuffix(LOOKUP_TABLE_SUFFIX).split("-")
+    return [bytes.fromhex(root_name) for root_name in root_names if root_name != MISSING_ROOT_NAME]
+
+
+class MappedLookupTables:
+    """Lookup tables that this process mapped from files, shared by their readers.
+
+    Tables are not closed when their files are deleted, as readers may still hold them or views of their data. A file
+    is unmapped when the last reference to its table is dropped."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._tables: Dict[Path, IndexedLookupData] = dict()
+
+    def __len__(self) -> int:
+        return len(self._tables)
+
+    def open(self, file: Path) -> IndexedLookupData:
+        with self._lock:
+            table = self._tables.get(file)
+            if table is None:
+                with open(file, "rb") as f:
+                    mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                try:
+                    table = IndexedLookupData(mapped)
+                except ValueError:
+                    mapped.close()
+                    raise
+                self._tables[file] = table
+            return table
+
+    def forget(self, file: Path) -> None:
+        """Stops sharing the table, so that it is mapped again if its file is stored again."""
+        with self._lock:
+            self._tables.pop(file, None)
+
+
+MAPPED_LOOKUP_TABLES = MappedLookupTables()
+
+
+def delete_lookup_table(file: Path) -> bool:
+    """Stops sharing the table if this process mapped it and deletes its file, returns whether it was deleted."""
+    MAPPED_LOOKUP_TABLES.forget(file)
+    try:
+        file.unlink()
+        return True
+    except OSError as e:  # may still be mapped by another process
+        logging.warning(f"Can't delete lookup table {file}: {e}")
+        return False
+
+
+def drop_stale_lookup_tables(storage_path: str, live_root_ids: Collection[ObjectID]) -> int:
+    """Deletes the tables computed from roots that are not live anymore, and old partially written tables."""
+    folder = lookup_tables_folder(storage_path)
+    if not folder.is_dir():
+        return 0
+
+    live_root_ids = set(live_root_ids)
+    dropped = 0
+    for file in folder.glob("*" + LOOKUP_TABLE_SUFFIX):
+        if all(root_id in live_root_ids for root_id in file_root_ids(file.name)):
+            continue
+        dropped += delete_lookup_table(file)
+
+    for file in folder.glob("*" + PARTIAL_FILE_SUFFIX):
+        try:
+            if time.time() - file.stat().st_mtime < STALE_PARTIAL_FILE_AGE:
+                continue
+            file.unlink()
+            dropped += 1
+        except OSError as e:
+            logging.warning(f"Can't delete partial lookup table {file}: {e}")
+    return dropped
+
+
+class PersistedLookupTables:
+    def __init__(self, storage: "ObjectStorage"):
+        self.storage = storage
+        self.folder = lookup_tables_folder(storage._env_params.path)
+
+    def obj_id_to_path(self, root_id: MaybeObjectID) -> IndexedLookupData:
+        return self._get_or_compute(
+            lookup_table_file_name(LookupTableKind.OBJ_ID_TO_PATH, root_id),
+            self._from_objects(lambda objects: compute_obj_id_to_path_lookup_table(objects, root_id)))
+
+    def obj_id_to_path_difference(self, existing_in: MaybeObjectID, missing_in: MaybeObjectID) -> IndexedLookupData:
+        return self._get_or_compute(
+            lookup_table_file_name(LookupTableKind.OBJ_ID_TO_PATH_DIFFERENCE, existing_in, missing_in),
+            self._from_objects(
+                lambda objects: compute_obj_id_to_path_difference_lookup_table(objects, existing_in, missing_in)))
+
+    def path_to_obj_id(self, root_id: MaybeObjectID) -> IndexedLookupData:
+        return self._get_or_compute(
+            lookup_table_file_name(LookupTableKind.PATH_TO_OBJ_ID, root_id),
+            self._from_objects(lambda objects: compute_path_lookup_table(objects, root_id)))
+
+    def obj_id_index(
+            self, tables: List[Tuple[LookupTableKind, Tuple[MaybeObjectID, ...]]]) -> List[IndexedLookupData]:
+        """Tables to index object ids to their paths in, of kind OBJ_ID_TO_PATH or OBJ_ID_TO_PATH_DIFFERENCE.
+
+        Only the tables that are not stored yet are computed, e.g. the ones of roots that changed."""
+        return [self._obj_id_to_path_table(kind, root_ids) for kind, root_ids in tables]
+
+    def _obj_id_to_path_table(self, kind: LookupTableKind, root_ids: Tuple[MaybeObjectID, ...]) -> IndexedLookupData:
+        if kind == LookupTableKind.OBJ_ID_TO_PATH:
+            return self.obj_id_to_path(*root_ids)
+        elif kind == LookupTableKind.OBJ_ID_TO_PATH_DIFFERENCE:
+            return self.obj_id_to_path_difference(*root_ids)
+        else:
+            raise ValueError(f"Can't index tables of kind {kind}!")
+
+    def _from_objects(self, compute: Callable[[Objects], bytearray]) -> Callable[[], bytearray]:
+        def compute_from_objects() -> bytearray:
+            with self.storage.objects(write=False) as objects:
+                return compute(objects)
+
+        return compute_from_objects
+
+    def _get_or_compute(self, file_name: str, compute: Callable[[], bytearray]) -> IndexedLookupData:
+        file = self.folder.joinpath(file_name)
+        if file.is_file():
+            try:
+                return MAPPED_LOOKUP_TABLES.open(file)
+            except (OSError, ValueError) as e:
+                logging.error(f"Can't read lookup table {file}, computing it again: {e}")
+
+        indexed_lookup_data = index_lookup_data(compute())
+
+        try:  # storing is best-effort, the table is still usable from memory
+            self.folder.mkdir(parents=True, exist_ok=True)
+            partial_file = file.with_name(f"{file.name}.{os.getpid()}{PARTIAL_FILE_SUFFIX}")
+            partial_file.write_bytes(indexed_lookup_data)
+            os.replace(partial_file, file)
+        except OSError as e:
+            logging.warning(f"Can't store lookup table {file}: {e}")
+        return IndexedLookupData(indexed_lookup_data)
@@ -0,0 +1,111 @@
+import logging
+import threading
+from collections import OrderedDict
+from typing import Tuple, Dict
+
+from lmdb_storage.tree_object import ObjectID, StoredObject
+
+DEFAULT_DECODED_OBJECTS_CACHE_SIZE = 1 << 28  # 256MB
+
+# decoded objects take roughly this much more memory than their packed data
+DECODED_SIZE_RATIO = 4
+DECODED_OBJECT_OVERHEAD = 256
+
+type CacheKey = Tuple[str, ObjectID]
+
+
+def estimate_decoded_size(packed_size: int) -> int:
+    return DECODED_OBJECT_OVERHEAD + DECODED_SIZE_RATIO * packed_size
+
+
+class DecodedObjectCache:
+    """ LRU cache of decoded objects with a memory budget, shared by all transactions of the process.
+
+    Objects are content-addressed, so a decoded object never goes stale. They are still kept per storage path, so that
+    reading from a storage is not affected by what other storages contain. It is used from the backup and the GUI worker
+    threads too, so all changes to the order of the objects are done under a lock.
+    """
+
+    def __init__(self, max_size: int):
+        self._max_size = max_size
+        self._used_size = 0
+        self._objects: OrderedDict[CacheKey, Tuple[StoredObject, int]] = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._objects)
+
+    def __str__(self) -> str:
+        return (
+            f"DecodedObjectCache[{len(self)} objects, {self._used_size} of {self._max_size} bytes,"
+            f" hits={self.hits}, misses={self.misses}, evictions={self.evictions}]")
+
+    @property
+    def max_size(self) -> int:
+        return self._max_size
+
+    @property
+    def used_size(self) -> int:
+        return self._used_size
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "objects": len(self), "used_size": self._used_size, "max_size": self._max_size,
+            "hits": self.hits, "misses": self.misses, "evictions": self.evictions}
+
+    def get(self, namespace: str, obj_id: ObjectID) -> StoredObject | None:
+        key = (namespace, obj_id)
+        with self._lock:
+            cached = self._objects.get(key)
+            if cached is None:
+                self.misses += 1
+                return None
+
+            self.hits += 1
+            self._objects.move_to_end(key)
+            return cached[0]
+
+    def put(self, namespace: str, obj_id: ObjectID, obj: StoredObject, size: int) -> None:
+        if size > self._max_size:
+            return  # would evict everything else
+
+        key = (namespace, obj_id)
+        with self._lock:
+            old = self._objects.pop(key, None)
+            if old is not None:
+                self._used_size -= old[1]
+
+            self._objects[key] = (obj, size)
+            self._used_size += size
+            self._evict_to(self._max_size)
+
+    def evict(self, namespace: str, obj_id: ObjectID) -> None:
+        with self._lock:
+            old = self._objects.pop((namespace, obj_id), None)
+            if old is not None:
+                self._used_size -= old[1]
+
+    def resize(self, max_size: int) -> None:
+        logging.info(f"Resizing decoded objects cache to {max_size} bytes")
+        with self._lock:
+            self._max_size = max_size
+            self._evict_to(max_size)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._objects.clear()
+            self._used_size = 0
+
+    def _evict_to(self, max_size: int) -> None:
+        """Must be called with the lock held."""
+        while self._used_size > max_size:
+            _, (_, size) = self._objects.popitem(last=False)
+            self._used_size -= size
+            self.evictions += 1
+
+
+DECODED_OBJECTS_CACHE = DecodedObjectCache(DEFAULT_DECODED_OBJECTS_CACHE_SIZE)
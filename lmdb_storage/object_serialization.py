@@ -1,24 +1,51 @@
 import enum
 import hashlib
-from typing import Dict, Tuple, Iterable
+import struct
+from typing import Dict, Tuple, Iterable, List
 
 import msgpack
 
 from lmdb_storage.file_object import BlobObject, FileObject
-from lmdb_storage.tree_object import ObjectType, StoredObject, TreeObject, TreeObjectBuilder, ObjectID
+from lmdb_storage.tree_object import ObjectType, StoredObject, TreeObject, TreeObjectBuilder, ObjectID, MaybeObjectID
 
 
 ## LMDB object format
 #  object_id    blob
 #
-# blob is file:
-#  Type.FILE, (fasthash, size)
+# V0 (msgpack), also used to calculate object_id
+#  blob is file:
+#   Type.FILE, (fasthash, size)
 #
-# blob is tree:
-#  Type.TREE, Dict[obj name to object_id]
+#  blob is tree:
+#   Type.TREE, Dict[obj name to object_id]
+#
+# V1 (fixed layout, little-endian), starts with 0xff, version, type
+#  blob is file:
+#   size: int64, fasthash: field, md5: field
+#   field is kind: uint8 and then nothing for None, 16 bytes for md5-like hex strings or uint16 len + utf-8 data
+#
+#  blob is tree:
+#   count: uint32, name_ends: uint32[count], ids: 20 bytes[count], names: utf-8 concatenated
 
 class BlobStorageFormat(enum.IntEnum):
     V0 = 0
+    V1 = 1
+
+
+LATEST_STORAGE_FORMAT = BlobStorageFormat.V1
+
+V1_HEADER = struct.Struct("<BBB")
+V1_TREE_COUNT = struct.Struct("<I")
+V1_TREE_NAME_END = struct.Struct("<I")
+V1_TREE_ID_LEN = 20
+V1_BLOB_SIZE = struct.Struct("<q")
+V1_FIELD_STR_LEN = struct.Struct("<H")
+
+
+class V1FieldKind(enum.IntEnum):
+    NONE = 0
+    HEX16 = 1
+    STR = 2
 
 
 def find_object_data_version(obj_packed):
@@ -27,13 +54,34 @@ def find_object_data_version(obj_packed):
     else:
         assert obj_packed[0] == 0xff, f"Undetermined format version: first byte is {obj_packed[0]}!"
         v = obj_packed[1]
-        assert v < 1
+        assert v <= max(BlobStorageFormat), f"Unsupported format version {v}!"
         return BlobStorageFormat(v)
 
 
-def read_stored_object(obj_id: bytes, obj_packed: bytes) -> StoredObject:
+def read_object_type(obj_packed: bytes | memoryview) -> ObjectType:
+    """Finds the type of the object without decoding it."""
+    version = find_object_data_version(obj_packed)
+    if version == BlobStorageFormat.V1:
+        _, _, obj_type = V1_HEADER.unpack_from(obj_packed, 0)
+        return ObjectType(obj_type)
+    elif version == BlobStorageFormat.V0:
+        return ObjectType(obj_packed[1])  # the type is a fixint right after the fixarray marker
+    else:
+        raise NotImplementedError(f"Not implemented version {version}")
+
+
+def read_stored_object(obj_id: bytes, obj_packed: bytes | memoryview) -> StoredObject:
+    """Decodes the object. The packed data can be a buffer that is valid only for the current transaction."""
     version = find_object_data_version(obj_packed)
-    if version == BlobStorageFormat.V0:
+    if version == BlobStorageFormat.V1:
+        _, _, obj_type = V1_HEADER.unpack_from(obj_packed, 0)
+        if obj_type == ObjectType.TREE.value:
+            return PackedTreeObject(obj_id, bytes(obj_packed))  # owns a copy, as it outlives the transaction
+        elif obj_type == ObjectType.BLOB.value:
+            return _read_file_object_v1(obj_id, obj_packed)
+        else:
+            raise ValueError(f"Unrecognized type {obj_type}")
+    elif version == BlobStorageFormat.V0:
         obj_data = msgpack.loads(obj_packed)  # fixme make this faster by extracting type away
         if obj_data[0] == ObjectType.BLOB.value:
             assert len(obj_data[1]) == 3, len(obj_data[1])
@@ -46,10 +94,135 @@ def read_stored_object(obj_id: bytes, obj_packed: bytes) -> StoredObject:
         raise NotImplementedError(f"Not implemented version {version}")
 
 
+class PackedTreeObject(TreeObject):
+    """Tree object that reads its children straight from the V1 packed data, decoding them only when iterated."""
+
+    def __init__(self, id: ObjectID, packed: bytes):
+        self._id = id
+        self._packed = memoryview(packed)
+        self._count, = V1_TREE_COUNT.unpack_from(self._packed, V1_HEADER.size)
+
+        self._ends_at = V1_HEADER.size + V1_TREE_COUNT.size
+        self._ids_at = self._ends_at + self._count * V1_TREE_NAME_END.size
+        self._names_at = self._ids_at + self._count * V1_TREE_ID_LEN
+
+        self._sorted_children_or_none: List[Tuple[str, ObjectID]] | None = None
+
+    @property
+    def _sorted_children(self) -> List[Tuple[str, ObjectID]]:
+        if self._sorted_children_or_none is None:
+            packed = self._packed
+            name_ends = struct.unpack_from(f"<{self._count}I", packed, self._ends_at)
+            names_at, ids_at = self._names_at, self._ids_at
+
+            sorted_children = []
+            name_start = 0
+            for idx, name_end in enumerate(name_ends):
+                id_at = ids_at + idx * V1_TREE_ID_LEN
+                sorted_children.append((
+                    str(packed[names_at + name_start:names_at + name_end], "utf-8"),
+                    packed[id_at:id_at + V1_TREE_ID_LEN].tobytes()))
+                name_start = name_end
+            self._sorted_children_or_none = sorted_children
+        return self._sorted_children_or_none
+
+    def _packed_name(self, idx: int) -> bytes:
+        name_start, = V1_TREE_NAME_END.unpack_from(self._packed, self._ends_at + (idx - 1) * V1_TREE_NAME_END.size) \
+            if idx > 0 else (0,)
+        name_end, = V1_TREE_NAME_END.unpack_from(self._packed, self._ends_at + idx * V1_TREE_NAME_END.size)
+        return self._packed[self._names_at + name_start:self._names_at + name_end].tobytes()
+
+    def get(self, child_name: str) -> MaybeObjectID:
+        if self._sorted_children_or_none is not None:
+            return super().get(child_name)
+
+        # utf-8 byte order is the same as the str order the children are sorted by
+        packed_child_name = child_name.encode("utf-8")
+        lo, hi = 0, self._count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._packed_name(mid) < packed_child_name:
+                lo = mid + 1
+            else:
+                hi = mid
+
+        if lo < self._count and self._packed_name(lo) == packed_child_name:
+            id_at = self._ids_at + lo * V1_TREE_ID_LEN
+            return self._packed[id_at:id_at + V1_TREE_ID_LEN].tobytes()
+        return None
+
+    def __eq__(self, other):
+        if isinstance(other, PackedTreeObject):
+            return self._packed == other._packed
+        return super().__eq__(other)
+
+    def __hash__(self):
+        return super().__hash__()
+
+
+def _read_file_object_v1(obj_id: bytes, obj_packed: bytes | memoryview) -> FileObject:
+    idx = V1_HEADER.size
+    size, = V1_BLOB_SIZE.unpack_from(obj_packed, idx)
+    idx += V1_BLOB_SIZE.size
+
+    fasthash, idx = _read_field_v1(obj_packed, idx)
+    md5, idx = _read_field_v1(obj_packed, idx)
+    return FileObject(obj_id, (fasthash, size, md5))
+
+
+def _read_field_v1(obj_packed: bytes | memoryview, idx: int) -> Tuple[str | None, int]:
+    kind = obj_packed[idx]
+    idx += 1
+    if kind == V1FieldKind.NONE:
+        return None, idx
+    elif kind == V1FieldKind.HEX16:
+        return obj_packed[idx:idx + 16].hex(), idx + 16
+    elif kind == V1FieldKind.STR:
+        str_len, = V1_FIELD_STR_LEN.unpack_from(obj_packed, idx)
+        idx += V1_FIELD_STR_LEN.size
+        return str(obj_packed[idx:idx + str_len], "utf-8"), idx + str_len
+    else:
+        raise ValueError(f"Unrecognized field kind {kind}")
+
+
+def _write_field_v1(value: str | None) -> bytes:
+    if value is None:
+        return bytes((V1FieldKind.NONE,))
+
+    if len(value) == 32 and value == value.lower():
+        try:
+            hex_data = bytes.fromhex(value)
+        except ValueError:
+            hex_data = None  # not a hex string, store as-is
+        if hex_data is not None and len(hex_data) == 16:
+            return bytes((V1FieldKind.HEX16,)) + hex_data
+
+    encoded = value.encode("utf-8")
+    return bytes((V1FieldKind.STR,)) + V1_FIELD_STR_LEN.pack(len(encoded)) + encoded
+
+
 def _serialize_tree_object(tree_obj_items: Iterable[Tuple[str, ObjectID]]):
     return msgpack.packb((ObjectType.TREE.value, tree_obj_items))
 
 
+def _serialize_tree_object_v1(sorted_items: List[Tuple[str, ObjectID]]) -> bytes:
+    names = [name.encode("utf-8") for name, _ in sorted_items]
+
+    name_ends = []
+    name_end = 0
+    for name in names:
+        name_end += len(name)
+        name_ends.append(name_end)
+
+    assert all(len(obj_id) == V1_TREE_ID_LEN for _, obj_id in sorted_items), "V1 trees only support 20-byte ids!"
+    return b"".join([
+        V1_HEADER.pack(0xff, BlobStorageFormat.V1, ObjectType.TREE.value),
+        V1_TREE_COUNT.pack(len(names)),
+        struct.pack(f"<{len(name_ends)}I", *name_ends),
+        *(obj_id for _, obj_id in sorted_items),
+        *names])
+
+
 def construct_tree_object(tree_obj_builder: TreeObjectBuilder) -> TreeObject:
     assert isinstance(tree_obj_builder, Dict)
     sorted_items = list(sorted(tree_obj_builder.items()))
@@ -57,12 +230,34 @@ def construct_tree_object(tree_obj_builder: TreeObjectBuilder) -> TreeObject:
     return TreeObject(hashlib.sha1(serialized).digest(), sorted_items)
 
 
-def write_stored_object(obj: StoredObject) -> bytes:
-    if obj.object_type == ObjectType.BLOB:
-        assert isinstance(obj, FileObject)
-        return msgpack.packb((ObjectType.BLOB.value, (obj.fasthash, obj.size, obj.md5)))
-    elif obj.object_type == ObjectType.TREE:
-        obj: TreeObject
-        return _serialize_tree_object(obj.children)
+def write_stored_object(obj: StoredObject, version: BlobStorageFormat = BlobStorageFormat.V0) -> bytes:
+    if version == BlobStorageFormat.V1:
+        if obj.object_type == ObjectType.BLOB:
+            assert isinstance(obj, FileObject)
+            return b"".join([
+                V1_HEADER.pack(0xff, BlobStorageFormat.V1, ObjectType.BLOB.value),
+                V1_BLOB_SIZE.pack(obj.size),
+                _write_field_v1(obj.fasthash),
+                _write_field_v1(obj.md5)])
+        elif obj.object_type == ObjectType.TREE:
+            obj: TreeObject
+            if isinstance(obj, PackedTreeObject):
+                return obj._packed.tobytes()
+            return _serialize_tree_object_v1(obj.children)
+        else:
+            raise ValueError(f"Unrecognized type {obj.object_type}")
+    elif version == BlobStorageFormat.V0:
+        if obj.object_type == ObjectType.BLOB:
+            assert isinstance(obj, FileObject)
+            return msgpack.packb((ObjectType.BLOB.value, (obj.fasthash, obj.size, obj.md5)))
+        elif obj.object_type == ObjectType.TREE:
+            obj: TreeObject
+            return _serialize_tree_object(obj.children)
+        else:
+            raise ValueError(f"Unrecognized type {obj.object_type}")
     else:
-        raise ValueError(f"Unrecognized type {obj.object_type}")
+        raise NotImplementedError(f"Not implemented version {version}")
+
+
+def write_latest_stored_object(obj: StoredObject) -> bytes:
+    return write_stored_object(obj, LATEST_STORAGE_FORMAT)
@@ -1,20 +1,28 @@
+import contextlib
 import dataclasses
+import enum
+import hashlib
 import logging
 import os
 import shutil
 import sys
+import threading
+import time
 from datetime import datetime
 from pathlib import Path
-from typing import Collection, Tuple, Dict
+from typing import Collection, Tuple, Dict, Callable, List, Iterator
 
 import lmdb
 from alive_progress import alive_bar
 from lmdb import Transaction, Environment, _Database
 
-from lmdb_storage.object_serialization import read_stored_object, write_stored_object
+from lmdb_storage.garbage_collection import IncrementalCollector
+from lmdb_storage.lookup_tables_store import PersistedLookupTables, drop_stale_lookup_tables
+from lmdb_storage.object_cache import DECODED_OBJECTS_CACHE
+from lmdb_storage.object_serialization import read_stored_object, write_latest_stored_object, read_object_type
 from lmdb_storage.roots import Roots
-from lmdb_storage.tree_iteration import dfs
-from lmdb_storage.tree_structure import Objects, ObjectID, StoredObjects, TransactionCreator
+from lmdb_storage.tree_bloom_filters import TreeBloomFilters
+from lmdb_storage.tree_structure import Objects, ObjectID, StoredObjects, TransactionCreator, DEFAULT_BATCH_SIZE
 from lmdb_storage.tree_object import ObjectType, StoredObject, TreeObject
 from util import format_size
 
@@ -28,6 +36,7 @@ class EnvParams:
     path: str
     map_size: int | None
     max_dbs: int
+    readonly: bool = False
 
 
 def maybe_migrate_storage(path):
@@ -50,18 +59,27 @@ def maybe_migrate_storage(path):
 class ObjectEnvironmentCache:
     def __init__(self) -> None:
         self._cache: Dict[str, Tuple[EnvParams, Environment, Dict[str, _Database], int]] = dict()
+        self._lock = threading.RLock()  # backups release environments from their own threads
 
-    def obtain(self, path: str, map_size: int | None, max_dbs: int) -> Tuple[Environment, Dict[str, _Database]]:
+    def obtain(
+            self, path: str, map_size: int | None, max_dbs: int,
+            readonly: bool = False) -> Tuple[Environment, Dict[str, _Database]]:
+        with self._lock:
+            return self._obtain(path, map_size, max_dbs, readonly)
+
+    def _obtain(
+            self, path: str, map_size: int | None, max_dbs: int,
+            readonly: bool) -> Tuple[Environment, Dict[str, _Database]]:
         logging.debug(f"### LMDB OBTAIN {path}")
 
-        env_params = EnvParams(path, max_dbs=max_dbs, map_size=map_size)
+        env_params = EnvParams(path, max_dbs=max_dbs, map_size=map_size, readonly=readonly)
 
         if path not in self._cache:
             logging.info(f"### LMDB OPENING {path}")
             if not os.path.isfile(path):
                 maybe_migrate_storage(path)
 
-            env = lmdb.open(path, max_dbs=max_dbs, map_size=map_size, readonly=False, subdir=False)
+            env = lmdb.open(path, max_dbs=max_dbs, map_size=map_size, readonly=readonly, subdir=False)
             self._cache[path] = (
                 env_params,
                 env,
@@ -69,25 +87,51 @@ class ObjectEnvironmentCache:
                     "objects": env.open_db("objects".encode()),
                     "repos": env.open_db("repos".encode()),
                     "deferred_ops": env.open_db("deferred_ops".encode()),
+                    "gc": env.open_db("gc".encode()),
+                    "trees": env.open_db("trees".encode()),
+                    "meta": env.open_db("meta".encode()),
+                    "blooms": env.open_db("blooms".encode()),
                 },
                 0)
 
         cached_params, env, dbs, usage = self._cache[path]
 
         assert cached_params.path == path
-        if env_params.map_size is not None and env_params.map_size != env.info()["map_size"]:
+        if env_params.map_size is not None and env_params.map_size != cached_params.map_size:
             raise ValueError(
-                f"Trying to access a database with different size to be set: {env_params.map_size} but stored is with {env.info()["map_size"]}!")
+                f"Trying to access a database with different size to be set: {env_params.map_size} but opened is with {cached_params.map_size}!")
 
         if env_params.max_dbs != cached_params.max_dbs:
             raise ValueError(
                 f"Trying to access a database with different # of named dbs: {env_params.max_dbs} but stored is with {cached_params.max_dbs}")
 
+        if cached_params.readonly and not env_params.readonly:
+            raise ValueError(f"Trying to write to a database that is opened read-only: {path}")
+
         self._cache[path] = (cached_params, env, dbs, usage + 1)
 
         return env, dbs
 
+    def retain(self, path: str) -> Environment:
+        """Keeps an already open environment open until it is released again."""
+        with self._lock:
+            if path not in self._cache:
+                raise ValueError("Cannot retain an uninitialized object!")
+
+            cached_params, env, dbs, usage = self._cache[path]
+            self._cache[path] = (cached_params, env, dbs, usage + 1)
+            return env
+
+    def users(self, path: str) -> int:
+        """Returns how many times the environment was obtained or retained and not released yet."""
+        with self._lock:
+            return self._cache[path][3] if path in self._cache else 0
+
     def release(self, path):
+        with self._lock:
+            self._release(path)
+
+    def _release(self, path):
         if path not in self._cache:
             raise ValueError("Cannot release an uninitialized object!")
 
@@ -99,6 +143,7 @@ class ObjectEnvironmentCache:
         usage -= 1
         if usage == 0:
             logging.info(f"### LMDB CLOSING CONNECTION {path}")
+            USED_SIZE_CACHE.forget(env.path())
             env.close()
             self._cache.pop(path)
         else:
@@ -106,10 +151,12 @@ class ObjectEnvironmentCache:
 
 
 OBJECT_ENVIRONMENT_CACHE = ObjectEnvironmentCache()
-MAX_MAP_SIZE = 1 << 30
+DEFAULT_MAX_MAP_SIZE = 1 << 36  # 64GB
+GROW_MAP_AT_RATIO = 0.5
+DEFAULT_GC_TIME_BUDGET = 2.0  # seconds
 
 
-def used_size(env):
+def calculate_used_size(env: Environment) -> int:
     # +--------------------+---------------------------------------+
     # | ``psize``          | Size of a database page in bytes.     |
     # +--------------------+---------------------------------------+
@@ -125,7 +172,7 @@ def used_size(env):
     # +--------------------+---------------------------------------+
     stat = env.stat()
     used_size = stat["psize"] * (stat["leaf_pages"] + stat["branch_pages"] + stat["overflow_pages"])
-    with env.begin(write=False) as txn:
+    with begin_txn(env, write=False) as txn:
         for db_name, _ in txn.cursor():
             dbi = env.open_db(db_name, txn=txn)
             stat = txn.stat(dbi)
@@ -133,14 +180,129 @@ def used_size(env):
     return used_size
 
 
+class ActiveTransactions:
+    """Counts the transactions of each environment that are active, in all threads and in the current one."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts: Dict[str, int] = dict()
+        self._local = threading.local()
+
+    def _thread_counts(self) -> Dict[str, int]:
+        if not hasattr(self._local, "counts"):
+            self._local.counts = dict()
+        return self._local.counts
+
+    def started(self, path: str):
+        with self._lock:
+            self._counts[path] = self._counts.get(path, 0) + 1
+        thread_counts = self._thread_counts()
+        thread_counts[path] = thread_counts.get(path, 0) + 1
+
+    def ended(self, path: str):
+        with self._lock:
+            self._counts[path] -= 1
+        self._thread_counts()[path] -= 1
+
+    def count(self, path: str) -> int:
+        with self._lock:
+            return self._counts.get(path, 0)
+
+    def count_in_thread(self, path: str) -> int:
+        return self._thread_counts().get(path, 0)
+
+
+ACTIVE_TRANSACTIONS = ActiveTransactions()
+
+
+class TrackedTransaction:
+    """A transaction that is counted as active while it is entered, so that the map is only resized without any."""
+
+    def __init__(self, txn: Transaction, path: str):
+        self._txn = txn
+        self._path = path
+
+    def __enter__(self):
+        self._txn.__enter__()
+        ACTIVE_TRANSACTIONS.started(self._path)
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        try:
+            return self._txn.__exit__(exc_type, exc_val, exc_tb)
+        finally:
+            ACTIVE_TRANSACTIONS.ended(self._path)
+
+    def __getattr__(self, name: str):
+        # kept on the wrapper, so that reads and writes only pay for the lookup once
+        value = getattr(self._txn, name)
+        setattr(self, name, value)
+        return value
+
+
+def begin_txn(env: Environment, **kwargs) -> Transaction:
+    """Begins a transaction, first adopting the map size if another process that shares the environment grew it."""
+    try:
+        return env.begin(**kwargs)
+    except lmdb.MapResizedError:
+        logging.warning(f"Map of {env.path()} was grown by another process, adopting its size.")
+        env.set_mapsize(0)
+        return env.begin(**kwargs)
+
+
+class UsedSizeCache:
+    """Used sizes of environments, that are calculated again only if a transaction was committed since."""
+
+    def __init__(self):
+        self._sizes: Dict[str, Tuple[int, int]] = dict()
+
+        self.lookups = 0
+        self.refreshes = 0
+
+    def used_size(self, env: Environment) -> int:
+        self.lookups += 1
+        path = env.path()
+        last_txnid = env.info()["last_txnid"]
+
+        cached = self._sizes.get(path)
+        if cached is None or cached[0] != last_txnid:
+            self.refreshes += 1
+            cached = (last_txnid, calculate_used_size(env))
+            self._sizes[path] = cached
+        return cached[1]
+
+    def forget(self, path: str) -> None:
+        self._sizes.pop(path, None)
+
+    def stats(self) -> Dict[str, int]:
+        return {"environments": len(self._sizes), "lookups": self.lookups, "refreshes": self.refreshes}
+
+
+USED_SIZE_CACHE = UsedSizeCache()
+
+
+def used_size(env: Environment) -> int:
+    return USED_SIZE_CACHE.used_size(env)
+
+
 def used_ratio(env: Environment):
     return used_size(env) / env.info()["map_size"]
 
 
+class StorageLayout(enum.IntEnum):
+    MIXED = 0  # all objects in the objects db
+    SEPARATE_TREES = 1  # trees in the trees db, blobs in the objects db
+
+
+LATEST_STORAGE_LAYOUT = StorageLayout.SEPARATE_TREES
+STORAGE_LAYOUT_KEY = b"layout"
+
 MAX_BACKUPS = 5
+DEFAULT_BACKUP_INTERVAL = 10 * 60  # seconds
+LAST_BACKUP_ROOTS_FILE = "last_backup_roots"
 
 
-def store_backup_rotation(env: Environment):
+def store_backup_rotation(env: Environment) -> Path:
     lmdb_path = env.path()
     backup_dir = Path(lmdb_path + "-BAK")
     backup_dir.mkdir(parents=True, exist_ok=True)
@@ -158,23 +320,101 @@ def store_backup_rotation(env: Environment):
     logging.info(f"Storing backup as {backup_file}")
     backup_file.unlink(missing_ok=True)
 
-    env.copy(backup_file.as_posix(), compact=True)
+    # copy under another name, so that an interrupted copy is not taken for a backup
+    partial_file = backup_file.with_name(backup_file.name + ".partial")
+    partial_file.unlink(missing_ok=True)
+    env.copy(partial_file.as_posix(), compact=True)
+    partial_file.replace(backup_file)
+    return backup_dir
+
+
+class BackupRotation:
+    """Stores backups of storages from background threads, skipping them if the roots did not change since the last
+    backup or if the last backup is too recent."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._running: Dict[str, threading.Thread] = dict()
+
+    def maybe_store(self, storage: "ObjectStorage", interval: float) -> bool:
+        """Starts a backup of the storage if needed, returns whether it was started."""
+        path = storage._env_params.path
+        backup_dir = Path(path + "-BAK")
+        backup_dir.mkdir(parents=True, exist_ok=True)
+
+        fingerprint = storage.roots_fingerprint()
+        last_fingerprint_file = backup_dir.joinpath(LAST_BACKUP_ROOTS_FILE)
+        if last_fingerprint_file.is_file() and last_fingerprint_file.read_text() == fingerprint:
+            logging.info(f"Roots of {path} did not change since the last backup, skipping.")
+            return False
+
+        backups = list(sorted(backup_dir.glob("backup_*.lmdb")))
+        if len(backups) > 0 and time.time() - backups[-1].stat().st_mtime < interval:
+            logging.info(f"Last backup of {path} is more recent than {interval}s, skipping.")
+            return False
+
+        with self._lock:
+            running = self._running.get(path)
+            if running is not None and running.is_alive():
+                logging.info(f"Backup of {path} is still running, skipping.")
+                return False
+
+            # the environment is kept open until the backup is done, even if the storage gets closed
+            env = OBJECT_ENVIRONMENT_CACHE.retain(path)
+            thread = threading.Thread(
+                target=self._store, args=(path, env, fingerprint), name=f"backup {path}", daemon=False)
+            self._running[path] = thread
+            thread.start()
+            return True
+
+    def _store(self, path: str, env: Environment, fingerprint: str) -> None:
+        try:
+            backup_dir = store_backup_rotation(env)
+            backup_dir.joinpath(LAST_BACKUP_ROOTS_FILE).write_text(fingerprint)
+        except Exception as e:
+            logging.error(f"Storing backup of {path} failed: {e}")
+        finally:
+            OBJECT_ENVIRONMENT_CACHE.release(path)
+
+    @contextlib.contextmanager
+    def paused(self, path: str) -> Iterator[None]:
+        """Waits for the running backup of the storage to finish, and starts no new ones until exited.
+
+        A backup reads the whole environment in one transaction, so its map must not be resized meanwhile."""
+        with self._lock:
+            running = self._running.get(path)
+            if running is not None and running.is_alive():
+                logging.info(f"Waiting for the backup of {path} to finish.")
+                running.join()
+            yield
+
+    def wait(self) -> None:
+        """Waits for all started backups to finish."""
+        with self._lock:
+            running = list(self._running.values())
+        for thread in running:
+            thread.join()
+
+
+BACKUP_ROTATION = BackupRotation()
 
 
 class ObjectStorage(TransactionCreator):
-    def __init__(self, path: str, *, map_size: int | None = None, max_dbs=5):
-        self._env_params = EnvParams(
-            path, map_size=None if map_size is None else min(MAX_MAP_SIZE, map_size), max_dbs=max_dbs)
+    def __init__(
+            self, path: str, *, map_size: int | None = None, max_map_size: int = DEFAULT_MAX_MAP_SIZE, max_dbs=8,
+            backup_interval: float = DEFAULT_BACKUP_INTERVAL, readonly: bool = False):
+        self._env_params = EnvParams(path, map_size=map_size, max_dbs=max_dbs, readonly=readonly)
+        self._max_map_size = max_map_size
+        self._backup_interval = backup_interval
+        self._unstored_bloom_filters: Dict[ObjectID, int] = dict()
 
     def __enter__(self):
         self._env, self._dbs = OBJECT_ENVIRONMENT_CACHE.obtain(
-            self._env_params.path, max_dbs=self._env_params.max_dbs, map_size=self._env_params.map_size)
-        if self.used_ratio > 0.6:
-            logging.warn(f"Start cleaning with used ratio of {self.used_ratio}.")
-            self._env.set_mapsize(self._env_params.map_size * 2)
-            self.gc()
-            self._env.set_mapsize(self._env_params.map_size)
-            logging.warn(f"Ended cleaning with used ratio of {self.used_ratio}.")
+            self._env_params.path, max_dbs=self._env_params.max_dbs, map_size=self._env_params.map_size,
+            readonly=self._env_params.readonly)
+        if not self._env_params.readonly:
+            self.maybe_migrate_layout()
+            self.maybe_grow_map()
 
         return self
 
@@ -194,42 +434,149 @@ class ObjectStorage(TransactionCreator):
     def used_ratio(self):
         return used_ratio(self._env)
 
-    def maybe_gc(self):
-        if self.used_ratio > 0.6:
-            self.gc()
-            if self.used_ratio > 0.4:
-                logging.error("Even after GC usage is more than 40%. Can fill up.")
+    def usage_stats(self) -> Dict[str, int | float]:
+        return {"used_size": self.used_size, "map_size": self._env.info()["map_size"], "used_ratio": self.used_ratio}
+
+    def maybe_migrate_layout(self):
+        with self.begin(db_name="meta", write=False) as txn:
+            layout = txn.get(STORAGE_LAYOUT_KEY)
+        if layout is not None and StorageLayout(int(layout)) == LATEST_STORAGE_LAYOUT:
+            return
+
+        self.with_map_growth(self._move_trees_to_own_db)
+
+    def _move_trees_to_own_db(self):
+        """Moves the trees of older storages to the trees db. New storages only get the layout recorded."""
+        trees_db = self._dbs["trees"]
+        with self.begin(db_name="objects", write=True) as txn:
+            tree_ids = [
+                obj_id for obj_id, obj_packed in txn.cursor() if read_object_type(obj_packed) == ObjectType.TREE]
+            if len(tree_ids) > 0:
+                logging.warning(f"Migrating {self._env_params.path} to layout {LATEST_STORAGE_LAYOUT.name}.")
+            for obj_id in tree_ids:
+                txn.put(obj_id, txn.get(obj_id), db=trees_db)
+                txn.delete(obj_id)
+
+            txn.put(STORAGE_LAYOUT_KEY, str(LATEST_STORAGE_LAYOUT.value).encode(), db=self._dbs["meta"])
+        if len(tree_ids) > 0:
+            logging.warning(f"Moved {len(tree_ids)} trees to their own db.")
+
+    def maybe_grow_map(self):
+        """Grows the map ahead of writes if it is getting full.
+
+        The environment is shared by all storages of the same path in the process, and they may have transactions
+        active, so it only grows if this storage is its only user. Writes grow it anyway when it fills up."""
+        if OBJECT_ENVIRONMENT_CACHE.users(self._env_params.path) > 1:
+            return
+        if self.used_ratio > GROW_MAP_AT_RATIO:
+            self.grow_map()
+
+    def grow_map(self) -> bool:
+        """Doubles the map size up to the maximal one, returns whether it grew.
+
+        Must be called when no transactions are active."""
+        assert ACTIVE_TRANSACTIONS.count(self._env_params.path) == 0, \
+            f"Can't grow map of {self._env_params.path} with active transactions!"
+        map_size = self._env.info()["map_size"]
+        if map_size >= self._max_map_size:
+            logging.error(f"Map of {self._env_params.path} is already {format_size(map_size)}, can't grow it.")
+            return False
+
+        new_map_size = min(2 * map_size, self._max_map_size)
+        logging.warning(f"Growing map of {self._env_params.path} to {format_size(new_map_size)}.")
+        with BACKUP_ROTATION.paused(self._env_params.path):
+            self._env.set_mapsize(new_map_size)
+        return True
+
+    def with_map_growth[R](self, write: Callable[[], R]) -> R:
+        """Runs the writes, growing the map and running them again if it fills up.
+
+        The writes need to be in their own transactions, so that they are aborted when the map fills up, and no other
+        transactions of this thread can be active, so that the map can grow."""
+        assert ACTIVE_TRANSACTIONS.count_in_thread(self._env_params.path) == 0, \
+            f"Writes to {self._env_params.path} that grow the map can't run in another transaction!"
+        while True:
+            try:
+                return write()
+            except lmdb.MapFullError:
+                if not self.grow_map():
+                    raise
 
     def gc(self, silent: bool = False):
-        logging.warn(f"Used space = {format_size(self.used_size)}")
-        logging.warn(f"Used pct = {100 * self.used_ratio}")
+        logging.warning(f"Used space = {format_size(self.used_size)}")
+        logging.warning(f"Used pct = {100 * self.used_ratio}")
 
         root_ids = self.roots(write=False).all_live
         logging.info(f"found {len(root_ids)} live top-level refs.")
 
-        with self.objects(write=False) as objects:
+        with self.objects(write=False, use_cache=False) as objects:
             self.validate_storage(objects, root_ids)
 
             live_ids = find_all_live(objects, root_ids)
 
         logging.info(f"retaining {len(live_ids)} live objects.")
-        with self.objects(write=True) as objects:
+        self.with_map_growth(lambda: self._delete_all_except(live_ids, root_ids, silent))
+        self.drop_stale_lookup_tables(root_ids)
+
+        self.maybe_backup()
+
+    def _delete_all_except(self, live_ids: Collection[ObjectID], root_ids: Collection[ObjectID], silent: bool):
+        with self.objects(write=True, use_cache=False) as objects:
+            self.bloom_filters(objects).store_unstored()
+            IncrementalCollector(objects, self._dbs["gc"]).reset()
+
             if not silent:
                 ab = alive_bar(title="deleting objects")
                 bar = ab.__enter__()
             try:
-                for obj_id, _ in objects.txn.cursor():
-                    if obj_id not in live_ids:
-                        del objects[obj_id]
-                        if not silent:
-                            bar()
+                dead_ids = [obj_id for obj_id in objects.ids() if obj_id not in live_ids]
+                for obj_id in dead_ids:
+                    del objects[obj_id]
+                    if not silent:
+                        bar()
             finally:
                 if not silent:
                     ab.__exit__(None, None, None)
 
             self.validate_storage(objects, root_ids)
 
-        store_backup_rotation(self._env)
+    def collect(self, time_budget: float | None = DEFAULT_GC_TIME_BUDGET):
+        """Collects the garbage added since the last collection, and continues collecting older garbage while there is
+        time left. Collecting older garbage runs to the end if there is no time budget."""
+        self.maybe_grow_map()
+        start_major = self.used_ratio > 0.6
+        deadline = None if time_budget is None else time.monotonic() + time_budget
+
+        root_ids = self.roots(write=False).all_live
+        logging.info(f"found {len(root_ids)} live top-level refs.")
+
+        def collect_in_transaction():
+            with self.objects(write=True, use_cache=False) as objects:
+                self.validate_storage(objects, root_ids)
+                self.bloom_filters(objects).store_unstored()
+                IncrementalCollector(objects, self._dbs["gc"]).collect(root_ids, deadline, start_major=start_major)
+                self.validate_storage(objects, root_ids)
+
+        self.with_map_growth(collect_in_transaction)
+        self.drop_stale_lookup_tables(root_ids)
+
+        self.maybe_backup()
+
+    def drop_stale_lookup_tables(self, root_ids: Collection[ObjectID]):
+        dropped = drop_stale_lookup_tables(self._env_params.path, root_ids)
+        logging.info(f"dropped {dropped} lookup tables of dead roots.")
+
+    def maybe_backup(self) -> bool:
+        """Starts a backup in the background if the roots changed and the last one is old enough."""
+        return BACKUP_ROTATION.maybe_store(self, self._backup_interval)
+
+    def roots_fingerprint(self) -> str:
+        with self.begin(db_name="repos", write=False) as txn:
+            digest = hashlib.sha1()
+            for name, root_data in txn.cursor():
+                digest.update(name)
+                digest.update(root_data)
+            return digest.hexdigest()
 
     def validate_storage(self, objects, root_ids):
         for root_id in root_ids:
@@ -237,26 +584,79 @@ class ObjectStorage(TransactionCreator):
                 raise InconsistentObjectStorage(f"Missing root ID {root_id}: not in stored objects!")
 
     def copy_trees_from(self, other: "ObjectStorage", root_ids: Collection[ObjectID]):
+        """Copies the objects of the trees that are not stored here yet, moving the serialized data as-is.
+
+        Reads the other storage level by level in key order, and only decodes trees to find their children. While a
+        major collection is sweeping, trees that are already stored may be dead, so their subtrees are copied too."""
         assert isinstance(root_ids, Collection)
+        self.with_map_growth(lambda: self._copy_trees_from(other, root_ids))
+
+    def _copy_trees_from(self, other: "ObjectStorage", root_ids: Collection[ObjectID]):
         with other.objects(write=False) as other_objects:
             with self.objects(write=True) as self_objects:
-                for root_id in root_ids:
-                    for _, _, live_id, _, should_skip in dfs(other_objects, "", root_id):
-                        if live_id in self_objects:
-                            should_skip()  # we already have it here, so do not drill down
-                        else:
-                            self_objects[live_id] = other_objects[live_id]
-
-    def begin(self, db_name: str, write: bool) -> Transaction:
-        return self._env.begin(db=self._dbs[db_name], write=write)
-
-    def objects(self, write: bool) -> StoredObjects:
+                copy_stored = IncrementalCollector(self_objects, self._dbs["gc"]).is_sweeping()
+
+                def unstored(obj_ids: List[ObjectID]) -> List[ObjectID]:
+                    if copy_stored:
+                        return sorted(obj_ids)
+                    stored = self_objects.stored_ids(obj_ids)
+                    return sorted(obj_id for obj_id in obj_ids if obj_id not in stored)
+
+                queued = set(root_ids)
+                level = unstored(list(queued))
+                while len(level) > 0:
+                    children = []
+                    for start in range(0, len(level), DEFAULT_BATCH_SIZE):
+                        batch_ids = level[start:start + DEFAULT_BATCH_SIZE]
+                        packed_items = other_objects.get_packed_many(batch_ids)
+                        if len(packed_items) != len(batch_ids):
+                            raise InconsistentObjectStorage(
+                                f"Missing {len(batch_ids) - len(packed_items)} objects in {other._env_params.path}!")
+
+                        for obj_id, obj_packed in packed_items:
+                            if read_object_type(obj_packed) != ObjectType.TREE:
+                                continue
+                            for _, child_id in read_stored_object(obj_id, obj_packed).children:
+                                if child_id not in queued:
+                                    queued.add(child_id)
+                                    children.append(child_id)
+
+                        self_objects.put_packed_many(packed_items)
+                    level = unstored(children)
+
+    def begin(self, db_name: str, write: bool, buffers: bool = False) -> TrackedTransaction:
+        return TrackedTransaction(
+            begin_txn(self._env, db=self._dbs[db_name], write=write, buffers=buffers), self._env_params.path)
+
+    def db(self, db_name: str) -> _Database:
+        return self._dbs[db_name]
+
+    def objects(self, write: bool, use_cache: bool = True) -> StoredObjects:
+        """Opens the stored objects. Validation and collection read without the decoded objects cache, as it can
+        still have objects that another process already deleted."""
         return StoredObjects(
-            self, db_name="objects", write=write, object_reader=read_stored_object, object_writer=write_stored_object)
+            self, db_name="objects", write=write, object_reader=read_stored_object,
+            object_writer=write_latest_stored_object,
+            object_cache=DECODED_OBJECTS_CACHE, cache_namespace=self._env_params.path, use_cache=use_cache,
+            nursery_db=self._dbs["gc"], trees_db=self._dbs["trees"], blooms_db=self._dbs["blooms"])
+
+    def bloom_filters(self, objects: StoredObjects) -> TreeBloomFilters:
+        return TreeBloomFilters(objects, self._dbs["blooms"], self._unstored_bloom_filters)
+
+    def read_object(self, obj_id: ObjectID) -> StoredObject | None:
+        """Reads a single object, opening a transaction only if it is not in the decoded objects cache."""
+        obj = DECODED_OBJECTS_CACHE.get(self._env_params.path, obj_id)
+        if obj is None:
+            with self.objects(write=False) as objects:
+                obj = objects.load(obj_id)
+        return obj
 
     def roots(self, write: bool) -> Roots:
         return Roots(self, write)
 
+    def lookup_tables(self) -> PersistedLookupTables:
+        return PersistedLookupTables(self)
+
 
 def find_all_live(objects: Objects, root_ids: Collection[ObjectID]) -> Collection[ObjectID]:
     live_ids = set(root_ids)
@@ -1,5 +1,4 @@
 import abc
-from functools import lru_cache
 from typing import List, Iterable
 
 from lmdb_storage.file_object import BlobObject
@@ -7,7 +6,7 @@ from lmdb_storage.operations.three_way_merge import TransformedRoots
 from lmdb_storage.operations.fast_association import FastAssociation
 from lmdb_storage.operations.util import ByRoot
 from lmdb_storage.tree_structure import Objects, ObjectID
-from lmdb_storage.tree_object import ObjectType, StoredObject, TreeObject
+from lmdb_storage.tree_object import ObjectType, StoredObject, TreeObject, merged_child_names
 
 
 class TreeGenerator[F, R]:
@@ -25,7 +24,6 @@ class TreeGenerator[F, R]:
         assert isinstance(obj_ids, ByRoot)
         return self._execute_recursively([], TransformedRoots.HACK_create(obj_ids).map(self.get_objects))
 
-    @lru_cache(maxsize=1<<16)
     def get_objects(self, obj_id: ObjectID) -> StoredObject | None:
         return self.objects[obj_id] if obj_id is not None else None
 
@@ -34,8 +32,7 @@ class TreeGenerator[F, R]:
         files: FastAssociation[BlobObject] = all_original.filter(lambda v: v.object_type == ObjectType.BLOB)
 
         if self.should_drill_down(merge_state, trees, files):
-            all_children_names = list(sorted(set(
-                child_name for tree_obj in trees.values() for child_name, _ in tree_obj.children)))
+            all_children_names = list(merged_child_names(trees.values()))
 
             for child_name in all_children_names:
                 all_objects_in_child_name = trees.map(lambda obj: obj.get(child_name)).map(self.get_objects)
@@ -4,7 +4,7 @@ from typing import List, Dict
 from lmdb_storage.file_object import BlobObject
 from lmdb_storage.operations.util import ByRoot, Transformed
 from lmdb_storage.tree_structure import Objects, ObjectID
-from lmdb_storage.tree_object import StoredObject, TreeObject
+from lmdb_storage.tree_object import StoredObject, TreeObject, merged_child_names
 
 
 class Transformation[S, R](abc.ABC):
@@ -34,8 +34,7 @@ class Transformation[S, R](abc.ABC):
         files = all_original.filter_type(BlobObject)
 
         if self.should_drill_down(merge_state, trees, files):
-            all_children_names = list(sorted(set(
-                child_name for tree_obj in trees.values() for child_name, _ in tree_obj.children)))
+            all_children_names = list(merged_child_names(trees.values()))
 
             merge_result: Dict[str, R] = dict()
             for child_name in all_children_names:
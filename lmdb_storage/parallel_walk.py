@@ -0,0 +1,75 @@
+import logging
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, List, Iterator, Tuple
+
+from lmdb_storage.object_store import ObjectStorage
+from lmdb_storage.tree_iteration import ObjectIDs
+from lmdb_storage.tree_object import TreeObject, zip_children
+from lmdb_storage.tree_structure import Objects
+
+## Parallel walks
+#
+# Full scans of big storages are split by the top-level subtrees of the walked roots. The subtrees are walked in chunks
+# by a pool of processes, each opening the storage read-only, as LMDB supports readers from many processes. Workers
+# are spawned instead of forked, as a forked process must not use the environments that its parent has opened.
+#
+# The walk of a chunk returns a partial aggregate, that has to be picklable. Partial aggregates are yielded in the order
+# of the subtrees, so reducing them gives the same result as walking all subtrees in order in one process.
+#
+# Executables need to call multiprocessing.freeze_support() first thing in main, so that the spawned workers run their
+# task instead of the program. Parallel walks can be turned off with set_parallel_walks or with
+# DRAGON_PARALLEL_WALKS=0 in the environment, so everything is walked in the calling process.
+
+PARALLEL_WALK_MIN_OBJECTS = 1 << 18
+CHUNKS_PER_WORKER = 4
+
+PARALLEL_WALKS_ENABLED = os.getenv("DRAGON_PARALLEL_WALKS", "1") != "0"
+
+
+def set_parallel_walks(enabled: bool) -> None:
+    global PARALLEL_WALKS_ENABLED
+    PARALLEL_WALKS_ENABLED = enabled
+
+
+def top_level_subtrees(objects: Objects, root_ids: ObjectIDs) -> List[Tuple[str, ObjectIDs]]:
+    """Splits zipped roots into their zipped top-level children, with the paths that zip_trees_dfs from "" gives."""
+    trees = [objects[root_id] if root_id is not None else None for root_id in root_ids]
+    trees = [tree if isinstance(tree, TreeObject) else None for tree in trees]
+    return [("/" + child_name, child_ids) for child_name, child_ids in zip_children(trees)]
+
+
+def walk_subtrees[T, A](
+        storage: ObjectStorage, subtrees: List[T], walk: Callable[[Objects, List[T]], A],
+        max_workers: int | None = None, min_objects: int = PARALLEL_WALK_MIN_OBJECTS) -> Iterator[A]:
+    """Walks chunks of the subtrees, yielding the partial aggregates of the chunks in order.
+
+    The walk has to be a module-level function or a partial of one, so that it can be sent to the workers. Storages
+    with fewer than min_objects objects are walked in this process, as starting the workers would take longer."""
+    max_workers = max_workers if max_workers is not None else os.cpu_count() or 1
+    chunks = _split_to_chunks(subtrees, max_workers * CHUNKS_PER_WORKER)
+
+    with storage.objects(write=False) as objects:
+        is_small = len(objects) < min_objects
+    if not PARALLEL_WALKS_ENABLED or is_small or max_workers <= 1 or len(chunks) <= 1:
+        with storage.objects(write=False) as objects:
+            for chunk in chunks:
+                yield walk(objects, chunk)
+        return
+
+    logging.info(f"Walking {len(subtrees)} subtrees in {len(chunks)} chunks with {max_workers} workers.")
+    path = storage._env_params.path
+    with ProcessPoolExecutor(max_workers, mp_context=multiprocessing.get_context("spawn")) as executor:
+        yield from executor.map(_walk_in_worker, [path] * len(chunks), [walk] * len(chunks), chunks)
+
+
+def _walk_in_worker[T, A](path: str, walk: Callable[[Objects, List[T]], A], chunk: List[T]) -> A:
+    with ObjectStorage(path, readonly=True) as storage:
+        with storage.objects(write=False) as objects:
+            return walk(objects, chunk)
+
+
+def _split_to_chunks[T](items: List[T], max_chunks: int) -> List[List[T]]:
+    chunk_size = max(1, -(-len(items) // max_chunks))
+    return [items[idx:idx + chunk_size] for idx in range(0, len(items), chunk_size)]
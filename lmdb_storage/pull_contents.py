@@ -51,13 +51,14 @@ def merge_contents(
     assert all(v is not None for v in current_ids.values())
 
     # execute merge
-    with env.objects(write=True) as objects:
-        merged_ids = ThreewayMerge(
-            objects, current_id=roots.repo_current_id, staging_id=roots.repo_staging_id, repo_name=roots.repo_name,
-            merge_prefs=merge_prefs) \
-            .execute(current_ids)
+    def merge() -> FastAssociation[ObjectID]:
+        with env.objects(write=True) as objects:
+            return ThreewayMerge(
+                objects, current_id=roots.repo_current_id, staging_id=roots.repo_staging_id, repo_name=roots.repo_name,
+                merge_prefs=merge_prefs) \
+                .execute(current_ids)
 
-    return merged_ids
+    return env.with_map_growth(merge)
 
 
 def commit_merged(hoard: Root, repo: Root, all_roots: List[Root], merged_ids: FastAssociation[ObjectID]) -> None:
@@ -1,5 +1,5 @@
 import binascii
-from typing import Collection, List
+from typing import Collection, List, Callable
 
 import msgspec
 from lmdb import Transaction
@@ -36,11 +36,7 @@ class Root:
         with self.roots.storage.objects(write=False) as objects:
             assert root_id is None or objects[root_id] is not None
 
-        with self.roots as roots:
-            root_data = self.load_from_storage
-            root_data.current = root_id
-
-            roots.txn.put(self.name.encode(), msgspec.msgpack.encode(root_data))
+        self._update(lambda root_data: setattr(root_data, "current", root_id))
 
     @property
     def load_from_storage(self) -> RootData:
@@ -50,6 +46,15 @@ class Root:
     def write_to_storage(self, root_data: RootData):
         self.roots.txn.put(self.name.encode(), msgspec.msgpack.encode(root_data))
 
+    def _update(self, update: Callable[[RootData], None]):
+        def write():
+            with self.roots:
+                root_data = self.load_from_storage
+                update(root_data)
+                self.write_to_storage(root_data)
+
+        self.roots.storage.with_map_growth(write)
+
     @property
     def desired(self) -> bytes | None:
         with self.roots:
@@ -61,10 +66,7 @@ class Root:
         with self.roots.storage.objects(write=False) as objects:
             assert root_id is None or objects[root_id] is not None
 
-        with self.roots:
-            root_data = self.load_from_storage
-            root_data.desired = root_id
-            self.write_to_storage(root_data)
+        self._update(lambda root_data: setattr(root_data, "desired", root_id))
 
     @property
     def staging(self) -> bytes | None:
@@ -77,10 +79,7 @@ class Root:
         with self.roots.storage.objects(write=False) as objects:
             assert root_id is None or objects[root_id] is not None
 
-        with self.roots:
-            root_data = self.load_from_storage
-            root_data.staging = root_id
-            self.write_to_storage(root_data)
+        self._update(lambda root_data: setattr(root_data, "staging", root_id))
 
 
 class Roots:
@@ -1,25 +1,156 @@
 import logging
-import random
+import struct
+import threading
+import time
+from typing import Dict, Set, List, Tuple
 
 import lmdb
 from lmdb import Transaction
 
-from lmdb_storage.object_store import MAX_MAP_SIZE, used_ratio
+from lmdb_storage.object_store import used_ratio
+
+## Stats cache
+#  db "cache": stat key -> stats
+#  db "used": stat key -> generation that last used it: uint32
+#  db "meta": b"generation" -> current generation: uint32
+#
+# Each time the cache is opened starts a new generation. Stats that are stored or read are marked as used in the
+# current generation, so when the cache gets half full the least recently used half is evicted. Stats of roots that
+# are no longer live are not read anymore, so they are evicted first. Read stats are only marked again if they were
+# last used GENERATION_REFRESH_AGE generations ago, so reading a warm cache rarely writes.
+
+STATS_CACHE_MAP_SIZE = 1 << 30
+STATS_CACHE_BATCH_SIZE = 1 << 12
+STATS_CACHE_FLUSH_INTERVAL = 5.0  # seconds
+EVICT_AT_RATIO = 0.5
+GENERATION_REFRESH_AGE = 8
+
+GENERATION_KEY = b"generation"
+GENERATION = struct.Struct("<I")
 
 
 class StatsCache:
-    def __init__(self, path: str):
-        self._env = lmdb.open(path, max_dbs=1, map_size=MAX_MAP_SIZE, readonly=False, subdir=False)
+    """Stats stored by key, written behind in batches.
+
+    Stored stats are buffered and committed together when enough are collected, when the buffer gets old, or when
+    flushed explicitly. Reads see the buffered stats, then a read snapshot that is renewed on each flush, so it sees the
+    committed stats of this and of other processes.
+
+    Workers that calculate stats for the process that opened the cache open it as workers, so they use its generation
+    instead of starting another and don't evict stats.
+
+    The cache is shared by the threads of the process, e.g. the GUI and the stats warm-up, so the buffers and the read
+    snapshot are only used with the lock held."""
+
+    def __init__(self, path: str, worker: bool = False):
+        self.path = path
+        self._env = lmdb.open(path, max_dbs=3, map_size=STATS_CACHE_MAP_SIZE, readonly=False, subdir=False)
         self._cache_db = self._env.open_db("cache".encode())
-        self.maybe_gc()
+        self._used_db = self._env.open_db("used".encode())
+        self._meta_db = self._env.open_db("meta".encode())
+
+        if worker:
+            self.generation = self._current_generation()
+        else:
+            self.generation = self._start_generation()
+            self.maybe_gc()
+
+        self._lock = threading.Lock()
+        self._pending: Dict[bytes, bytes] = dict()
+        self._pending_used: Set[bytes] = set()
+        self._last_flush = time.monotonic()
+        self._reader: Transaction = self.begin(write=False)
+
+    def _start_generation(self) -> int:
+        with self._env.begin(write=True) as txn:
+            data = txn.get(GENERATION_KEY, db=self._meta_db)
+            generation = GENERATION.unpack(data)[0] + 1 if data is not None else 1
+            txn.put(GENERATION_KEY, GENERATION.pack(generation), db=self._meta_db)
+        return generation
+
+    def _current_generation(self) -> int:
+        with self._env.begin(write=False) as txn:
+            data = txn.get(GENERATION_KEY, db=self._meta_db)
+            return GENERATION.unpack(data)[0] if data is not None else 1
 
     def begin(self, write: bool) -> Transaction:
         return self._env.begin(db=self._cache_db, write=write)
 
-    def maybe_gc(self):
-        if used_ratio(self._env) > 0.5:
-            logging.warning("Stats cache is half full, deleting 50% of it!")
+    def get(self, key: bytes) -> bytes | None:
+        with self._lock:
+            blob = self._pending.get(key)
+            if blob is not None:
+                return blob
+
+            if self._is_flush_due():
+                self._flush()
+            blob = self._reader.get(key)
+            if blob is not None and self._is_refresh_due(key):
+                self._pending_used.add(key)
+            return blob
+
+    def _is_refresh_due(self, key: bytes) -> bool:
+        used = self._reader.get(key, db=self._used_db)
+        return used is None or GENERATION.unpack(used)[0] + GENERATION_REFRESH_AGE <= self.generation
+
+    def put(self, key: bytes, blob: bytes) -> None:
+        with self._lock:
+            self._pending[key] = blob
+            if len(self._pending) >= STATS_CACHE_BATCH_SIZE or self._is_flush_due():
+                self._flush()
+
+    def _is_flush_due(self) -> bool:
+        return time.monotonic() - self._last_flush > STATS_CACHE_FLUSH_INTERVAL
+
+    def flush(self) -> None:
+        with self._lock:
+            self._flush()
+
+    def _flush(self) -> None:
+        """Must be called with the lock held."""
+        if len(self._pending) > 0 or len(self._pending_used) > 0:
+            logging.debug(f"Storing {len(self._pending)} stats, marking {len(self._pending_used)} as used.")
+            used = GENERATION.pack(self.generation)
             with self.begin(write=True) as txn:
-                for k, _ in txn.cursor():
-                    if random.randint(0, 1):
-                        txn.delete(k)
+                with txn.cursor() as cursor:
+                    cursor.putmulti(sorted(self._pending.items()))
+                with txn.cursor(db=self._used_db) as cursor:
+                    cursor.putmulti((key, used) for key in sorted(self._pending_used.union(self._pending.keys())))
+            self._pending.clear()
+            self._pending_used.clear()
+
+        self._reader.abort()
+        self._reader = self.begin(write=False)
+        self._last_flush = time.monotonic()
+
+    def close(self) -> None:
+        with self._lock:
+            self._flush()
+            self._reader.abort()
+            self._env.close()
+
+    def maybe_gc(self):
+        if used_ratio(self._env) > EVICT_AT_RATIO:
+            logging.warning("Stats cache is half full, evicting the least recently used half of it!")
+            self.evict_least_recently_used(0.5)
+
+    def evict_least_recently_used(self, ratio: float) -> int:
+        """Deletes that ratio of the stats, the ones used longest ago first."""
+        with self.begin(write=True) as txn:
+            last_used: List[Tuple[int, bytes]] = []
+            for key in txn.cursor().iternext(keys=True, values=False):
+                used = txn.get(key, db=self._used_db)
+                last_used.append((GENERATION.unpack(used)[0] if used is not None else 0, key))
+
+            last_used.sort()
+            evicted = last_used[:int(len(last_used) * ratio)]
+            for _, key in evicted:
+                txn.delete(key)
+                txn.delete(key, db=self._used_db)
+
+            # marks of stats evicted while they were read by another process
+            unused_keys = [
+                key for key in txn.cursor(db=self._used_db).iternext(keys=True, values=False) if txn.get(key) is None]
+            for key in unused_keys:
+                txn.delete(key, db=self._used_db)
+        return len(evicted)
@@ -0,0 +1,176 @@
+import unittest
+from tempfile import TemporaryDirectory
+from typing import List
+from unittest.mock import patch
+
+from lmdb_storage.file_object import FileObject
+from lmdb_storage.garbage_collection import IncrementalCollector, CollectionPhase, MINOR_COLLECTIONS_PER_MAJOR, \
+    CollectionState
+from lmdb_storage.object_store import ObjectStorage, BACKUP_ROTATION
+from lmdb_storage.test_experiment_lmdb import dump_tree
+from lmdb_storage.tree_structure import BORN_KEY_PREFIX
+
+
+def make_tree(env: ObjectStorage, prefix: str, count: int) -> bytes:
+    with env.objects(write=True) as objects:
+        return objects.mktree_from_tuples(
+            (f"/{prefix}/file-{i}.txt", FileObject.create(f"{prefix}-hash-{i}", i)) for i in range(count))
+
+
+def stored_ids(env: ObjectStorage) -> List[bytes]:
+    with env.objects(write=False) as objects:
+        return list(objects.ids())
+
+
+def collection_phase(env: ObjectStorage) -> CollectionPhase:
+    with env.objects(write=False) as objects:
+        return IncrementalCollector(objects, env._dbs["gc"]).load_state().phase
+
+
+class TestIncrementalCollection(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = TemporaryDirectory(delete=True)
+        self.path = self.tmpdir.name + "/test-objects.lmdb"
+
+    def tearDown(self):
+        BACKUP_ROTATION.wait()
+        self.tmpdir.cleanup()
+
+    def test_minor_collection_deletes_unreachable_new_objects(self):
+        with ObjectStorage(self.path, map_size=1 << 24) as env:
+            live_id = make_tree(env, "live", 10)
+            env.roots(write=True)["HOARD"].current = live_id
+            env.gc()
+
+            with env.objects(write=False) as objects:
+                live_tree = dump_tree(objects, live_id)
+            live_ids = stored_ids(env)
+            self.assertEqual(1 + 1 + 10, len(live_ids))
+
+            make_tree(env, "garbage", 5)  # not referred to by any root
+            self.assertEqual(12 + 7, len(stored_ids(env)))
+
+            env.collect()
+            self.assertEqual(live_ids, stored_ids(env))
+            self.assertEqual(CollectionPhase.IDLE, collection_phase(env))
+
+            with env.objects(write=False) as objects:
+                self.assertEqual(live_tree, dump_tree(objects, live_id))
+
+    def test_minor_collection_keeps_readded_objects_below_rewritten_trees(self):
+        with ObjectStorage(self.path, map_size=1 << 24) as env:
+            root_id = make_tree(env, "data", 3)
+            env.roots(write=True)["HOARD"].current = root_id
+            env.gc()
+
+            # the tree becomes garbage and its files are deleted first, as a partial sweep would do
+            env.roots(write=True)["HOARD"].current = make_tree(env, "other", 1)
+            with env.objects(write=True) as objects:
+                for _, file_id in objects[objects[root_id].get("data")].children:
+                    del objects[file_id]
+
+            # the files are added again, below trees that are written again but are still stored
+            self.assertEqual(root_id, make_tree(env, "data", 3))
+            env.roots(write=True)["HOARD"].current = root_id
+
+            env.collect()
+            with env.objects(write=False) as objects:
+                self.assertEqual([
+                    ('$ROOT', 1),
+                    ('$ROOT/data', 1),
+                    ('$ROOT/data/file-0.txt', 2),
+                    ('$ROOT/data/file-1.txt', 2),
+                    ('$ROOT/data/file-2.txt', 2)], dump_tree(objects, root_id))
+            self.assertEqual(1 + 1 + 3, len(stored_ids(env)))
+
+    def test_major_collection_is_split_by_time_budget(self):
+        with ObjectStorage(self.path, map_size=1 << 24) as env:
+            live_id = make_tree(env, "live", 10)
+            env.roots(write=True)["HOARD"].current = live_id
+            garbage_id = make_tree(env, "garbage", 10)
+            env.roots(write=True)["REPO"].current = garbage_id
+            env.gc()
+
+            env.roots(write=True)["REPO"].current = None  # is now old garbage, not visible by minor collections
+            for _ in range(MINOR_COLLECTIONS_PER_MAJOR - 1):
+                env.collect()
+                self.assertEqual(2 * 12, len(stored_ids(env)))
+
+            env.collect(time_budget=0)
+            self.assertEqual(CollectionPhase.MARK, collection_phase(env))
+            self.assertEqual(2 * 12, len(stored_ids(env)))
+
+            # new objects during the cycle are retained if live
+            live_id = make_tree(env, "live-too", 4)
+            env.roots(write=True)["HOARD"].current = live_id
+
+            env.collect(time_budget=None)
+            self.assertEqual(CollectionPhase.IDLE, collection_phase(env))
+            with env.objects(write=False) as objects:
+                self.assertEqual(1 + 1 + 4, len(dump_tree(objects, live_id)))
+                self.assertIsNone(objects[garbage_id])
+
+            # the previous live tree was queued for marking when the cycle started, so it lives until the next cycle
+            self.assertEqual(1 + 1 + 4 + 12, len(stored_ids(env)))
+
+    def test_first_collection_of_untracked_storage_is_major(self):
+        with ObjectStorage(self.path, map_size=1 << 24) as env:
+            make_tree(env, "garbage", 5)
+            with env.objects(write=True) as objects:  # as if written before tracking new objects
+                IncrementalCollector(objects, env._dbs["gc"])._clear(BORN_KEY_PREFIX)
+
+            env.collect(time_budget=None)
+            self.assertEqual([], stored_ids(env))
+
+    def test_minor_collection_deletes_unreachable_copied_objects(self):
+        with ObjectStorage(self.tmpdir.name + "/other-objects.lmdb", map_size=1 << 24) as other:
+            copied_id = make_tree(other, "copied", 10)
+
+        with ObjectStorage(self.path, map_size=1 << 24) as env:
+            live_id = make_tree(env, "live", 10)
+            env.roots(write=True)["HOARD"].current = live_id
+            env.gc()
+            live_ids = stored_ids(env)
+
+            with ObjectStorage(self.tmpdir.name + "/other-objects.lmdb", map_size=1 << 24) as other:
+                env.copy_trees_from(other, [copied_id])
+            self.assertEqual(2 * 12, len(stored_ids(env)))
+
+            env.collect()
+            self.assertEqual(live_ids, stored_ids(env))
+
+    def test_copying_into_storage_while_sweep_is_paused(self):
+        with ObjectStorage(self.tmpdir.name + "/other-objects.lmdb", map_size=1 << 24) as other:
+            garbage_id = make_tree(other, "garbage", 10)
+
+        with ObjectStorage(self.path, map_size=1 << 24) as env:
+            live_id = make_tree(env, "live", 10)
+            env.roots(write=True)["HOARD"].current = live_id
+            self.assertEqual(garbage_id, make_tree(env, "garbage", 10))
+            env.roots(write=True)["REPO"].current = garbage_id
+            env.gc()
+            env.roots(write=True)["REPO"].current = None
+
+            # a major collection that marked everything and then ran out of time after sweeping a few objects
+            with env.objects(write=True) as objects:
+                collector = IncrementalCollector(objects, env._dbs["gc"])
+                collector._mark_gray([live_id])
+                self.assertTrue(collector._mark(None))
+
+                state = CollectionState(phase=CollectionPhase.SWEEP)
+                with patch("lmdb_storage.garbage_collection.SWEEP_BATCH_SIZE", 4):
+                    self.assertFalse(collector._sweep_batch(state))
+                collector.store_state(state)
+            self.assertEqual(CollectionPhase.SWEEP, collection_phase(env))
+            self.assertEqual(2 * 12, len(stored_ids(env)))
+
+            with ObjectStorage(self.tmpdir.name + "/other-objects.lmdb", map_size=1 << 24) as other:
+                env.copy_trees_from(other, [garbage_id])
+            env.roots(write=True)["REPO"].current = garbage_id
+
+            env.collect(time_budget=None)
+            self.assertEqual(CollectionPhase.IDLE, collection_phase(env))
+            self.assertEqual(2 * 12, len(stored_ids(env)))
+            with env.objects(write=False, use_cache=False) as objects:
+                self.assertEqual(1 + 1 + 10, len(dump_tree(objects, garbage_id)))
+                self.assertEqual(1 + 1 + 10, len(dump_tree(objects, live_id)))
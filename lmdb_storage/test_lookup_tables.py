@@ -0,0 +1,75 @@
+import hashlib
+import mmap
+import unittest
+from tempfile import TemporaryDirectory
+from typing import Dict, List
+
+from lmdb_storage.lookup_tables import LookupTable, IndexedLookupData, index_lookup_data
+from lmdb_storage.lookup_tables_paths import decode_bytes_to_intpath, decode_bytes_to_object_id
+from varint import encode
+
+
+def key_of(i: int) -> bytes:
+    return hashlib.sha1(str(i).encode()).digest()
+
+
+def pack(entries: List[tuple[bytes, bytes]]) -> bytes:
+    return b"".join(key + encode(len(data)) + data for key, data in entries)
+
+
+class TestLookupTable(unittest.TestCase):
+    def test_lookup_keeps_order_of_entries_with_same_key(self):
+        entries = [(key_of(i % 17), encode(i) + encode(i // 2)) for i in range(200)]
+        table = LookupTable[List[int]](pack(entries), decode_bytes_to_intpath)
+
+        expected: Dict[bytes, List[List[int]]] = dict()
+        for i in range(200):
+            expected.setdefault(key_of(i % 17), []).append([i, i // 2])
+
+        self.assertEqual(17, len(table))
+        self.assertEqual(sorted(expected.keys()), list(table.keys()))
+        for key, paths in expected.items():
+            self.assertTrue(key in table)
+            self.assertEqual(paths, table[key])
+            self.assertEqual(paths, table[bytearray(key)])  # decoded paths are reused
+
+        self.assertFalse(key_of(1000) in table)
+        self.assertEqual([], table[key_of(1000)])
+        self.assertEqual([], table[b"\xff" * 20])
+        self.assertEqual([], table[b"\x00" * 20])
+
+    def test_lookup_object_ids(self):
+        entries = [(key_of(i), key_of(-i)) for i in range(50)]
+        table = LookupTable[bytes](bytearray(pack(entries)), decode_bytes_to_object_id)
+
+        self.assertEqual(50, len(table))
+        for key, obj_id in entries:
+            self.assertEqual([obj_id], table[key])
+
+    def test_empty_table(self):
+        table = LookupTable[bytes](b"", decode_bytes_to_object_id)
+        self.assertEqual(0, len(table))
+        self.assertEqual([], list(table.keys()))
+        self.assertEqual([], table[key_of(1)])
+        self.assertFalse(key_of(1) in table)
+
+    def test_lookup_in_mapped_indexed_file(self):
+        entries = [(key_of(i % 7), encode(i)) for i in range(30)]
+        with TemporaryDirectory(delete=True) as tmpdir:
+            with open(tmpdir + "/table.lut", "wb") as f:
+                f.write(index_lookup_data(pack(entries)))
+
+            with open(tmpdir + "/table.lut", "rb") as f:
+                mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            table = LookupTable[List[int]](IndexedLookupData(mapped), decode_bytes_to_intpath)
+
+            in_memory = LookupTable[List[int]](pack(entries), decode_bytes_to_intpath)
+            self.assertEqual(list(in_memory.keys()), list(table.keys()))
+            for key in in_memory.keys():
+                self.assertEqual(in_memory[key], table[key])
+
+        self.assertRaises(ValueError, IndexedLookupData, pack(entries))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,118 @@
+import os
+import time
+import unittest
+from tempfile import TemporaryDirectory
+from typing import List
+
+from lmdb_storage.file_object import FileObject
+from lmdb_storage.lookup_tables_paths import compute_obj_id_to_path_lookup_table, compute_path_lookup_table, \
+    compute_obj_id_to_path_difference_lookup_table, decode_bytes_to_intpath
+from lmdb_storage.lookup_tables import index_lookup_data, IndexedLookupData, LookupTableIndex
+from lmdb_storage.lookup_tables_store import lookup_tables_folder, LookupTableKind, MAPPED_LOOKUP_TABLES, \
+    STALE_PARTIAL_FILE_AGE, lookup_table_file_name
+from lmdb_storage.object_store import ObjectStorage, BACKUP_ROTATION
+
+
+class TestLookupTablesStore(unittest.TestCase):
+    def test_lookup_tables_are_stored_until_roots_die(self):
+        tmpdir = TemporaryDirectory(delete=True)
+        with ObjectStorage(tmpdir.name + "/test-objects.lmdb", map_size=1 << 24) as env:
+            with env.objects(write=True) as objects:
+                old_id = objects.mktree_from_tuples([
+                    ("/a.txt", FileObject.create("a", 1)), ("/folder/b.txt", FileObject.create("b", 2))])
+                new_id = objects.mktree_from_tuples([
+                    ("/a.txt", FileObject.create("a", 1)), ("/folder/c.txt", FileObject.create("c", 3))])
+            env.roots(write=True)["REPO"].current = old_id
+            env.roots(write=True)["REPO"].desired = new_id
+
+            def stored_tables_count() -> int:
+                return len(list(lookup_tables_folder(env._env_params.path).glob("*.lut")))
+
+            def packed_data(lookup_data: IndexedLookupData) -> bytes:
+                return lookup_data.packed_lookup_data.tobytes()
+
+            lookup_tables = env.lookup_tables()
+            with env.objects(write=False) as objects:
+                self.assertEqual(
+                    compute_obj_id_to_path_lookup_table(objects, old_id),
+                    packed_data(lookup_tables.obj_id_to_path(old_id)))
+                self.assertEqual(
+                    compute_path_lookup_table(objects, new_id), packed_data(lookup_tables.path_to_obj_id(new_id)))
+                self.assertEqual(
+                    compute_obj_id_to_path_difference_lookup_table(objects, new_id, old_id),
+                    packed_data(lookup_tables.obj_id_to_path_difference(new_id, old_id)))
+            self.assertEqual(3, stored_tables_count())
+
+            with env.objects(write=False) as objects:  # read from the mapped file
+                mapped_table = env.lookup_tables().obj_id_to_path(old_id)
+                mapped_data = index_lookup_data(compute_obj_id_to_path_lookup_table(objects, old_id))
+                self.assertEqual(mapped_data, mapped_table._buffer.tobytes())
+                self.assertIs(mapped_table, env.lookup_tables().obj_id_to_path(old_id))
+            self.assertEqual(b"", packed_data(lookup_tables.obj_id_to_path(None)))
+            self.assertEqual(4, stored_tables_count())
+
+            # left by processes that died while writing
+            folder = lookup_tables_folder(env._env_params.path)
+            stale_partial_file = folder.joinpath("a.lut.1.partial")
+            recent_partial_file = folder.joinpath("b.lut.2.partial")
+            stale_partial_file.write_bytes(b"stale")
+            os.utime(stale_partial_file, (0, time.time() - STALE_PARTIAL_FILE_AGE - 1))
+            recent_partial_file.write_bytes(b"recent")
+
+            mapped_count = len(MAPPED_LOOKUP_TABLES)
+            env.roots(write=True)["REPO"].current = new_id
+            env.collect()
+            self.assertEqual(2, stored_tables_count())  # only tables of new_id or of no root are left
+            self.assertEqual([recent_partial_file], list(folder.glob("*.partial")))
+            self.assertEqual(mapped_count - 1, len(MAPPED_LOOKUP_TABLES))
+            self.assertEqual(mapped_data, mapped_table._buffer.tobytes())  # is still readable by who holds it
+
+            BACKUP_ROTATION.wait()
+
+    def test_obj_id_index_reuses_tables(self):
+        tmpdir = TemporaryDirectory(delete=True)
+        with ObjectStorage(tmpdir.name + "/test-objects.lmdb", map_size=1 << 24) as env:
+            with env.objects(write=True) as objects:
+                left_id = objects.mktree_from_tuples([
+                    ("/a.txt", FileObject.create("a", 1)), ("/folder/b.txt", FileObject.create("b", 2))])
+                right_id = objects.mktree_from_tuples([
+                    ("/a.txt", FileObject.create("a", 1)), ("/folder/c.txt", FileObject.create("c", 3))])
+                a_id = objects[left_id].get("a.txt")
+                b_id = objects[objects[left_id].get("folder")].get("b.txt")
+                c_id = objects[objects[right_id].get("folder")].get("c.txt")
+
+            def stored_tables() -> List[str]:
+                return sorted(file.name for file in lookup_tables_folder(env._env_params.path).glob("*.lut"))
+
+            lookup_tables = env.lookup_tables()
+            tables = [
+                (LookupTableKind.OBJ_ID_TO_PATH, (left_id,)),
+                (LookupTableKind.OBJ_ID_TO_PATH, (right_id,)),
+                (LookupTableKind.OBJ_ID_TO_PATH_DIFFERENCE, (right_id, left_id))]
+            root_ids = [left_id, right_id, right_id]
+            index = LookupTableIndex(lookup_tables.obj_id_index(tables), decode_bytes_to_intpath, root_ids)
+            self.assertEqual([(0, [0]), (1, [0])], index[a_id])
+            self.assertEqual([(0, [1, 0])], index[b_id])
+            self.assertEqual([(1, [1, 0]), (2, [1, 0])], index[c_id])
+            self.assertEqual([(2, [1, 0])], index.postings(c_id, range(2, 3)))
+            self.assertEqual(
+                sorted(lookup_table_file_name(kind, *table_root_ids) for kind, table_root_ids in tables),
+                stored_tables())  # only the indexed tables are stored
+
+            # indexing other tables reuses the stored ones
+            left_table = lookup_tables.obj_id_to_path(left_id)
+            other_tables = lookup_tables.obj_id_index([(LookupTableKind.OBJ_ID_TO_PATH, (left_id,))] + tables[2:])
+            self.assertIs(left_table, other_tables[0])
+            self.assertEqual(3, len(stored_tables()))
+
+            other_index = LookupTableIndex(other_tables, decode_bytes_to_intpath, [left_id, right_id])
+            self.assertEqual([(0, [1, 0])], other_index[b_id])
+            self.assertEqual([(1, [1, 0])], other_index[c_id])
+
+            # the tables of dead roots are dropped, but are still readable by who holds them
+            env.roots(write=True)["REPO"].current = right_id
+            env.collect()
+            self.assertEqual([lookup_table_file_name(LookupTableKind.OBJ_ID_TO_PATH, right_id)], stored_tables())
+            self.assertEqual([(0, [1, 0])], index[b_id])
+
+            BACKUP_ROTATION.wait()
@@ -0,0 +1,101 @@
+import unittest
+from tempfile import TemporaryDirectory
+
+from lmdb_storage.file_object import FileObject
+from lmdb_storage.object_cache import DecodedObjectCache, DECODED_OBJECTS_CACHE
+from lmdb_storage.object_serialization import construct_tree_object
+from lmdb_storage.object_store import ObjectStorage, InconsistentObjectStorage
+
+
+class TestDecodedObjectCache(unittest.TestCase):
+    def test_lru_eviction_within_budget(self):
+        cache = DecodedObjectCache(max_size=300)
+        objs = [FileObject.create(f"hash{i}", i) for i in range(4)]
+
+        for obj in objs[:3]:
+            cache.put("store", obj.id, obj, 100)
+        self.assertEqual(3, len(cache))
+        self.assertEqual(300, cache.used_size)
+
+        self.assertIs(objs[0], cache.get("store", objs[0].id))  # refreshes objs[0]
+        cache.put("store", objs[3].id, objs[3], 100)  # evicts objs[1] as least recently used
+
+        self.assertIsNone(cache.get("store", objs[1].id))
+        self.assertIs(objs[0], cache.get("store", objs[0].id))
+        self.assertIs(objs[2], cache.get("store", objs[2].id))
+        self.assertIs(objs[3], cache.get("store", objs[3].id))
+        self.assertEqual({
+            "objects": 3, "used_size": 300, "max_size": 300, "hits": 4, "misses": 1, "evictions": 1}, cache.stats())
+
+        cache.resize(150)
+        self.assertEqual(1, len(cache))
+        self.assertIs(objs[3], cache.get("store", objs[3].id))
+
+    def test_objects_are_kept_per_namespace(self):
+        cache = DecodedObjectCache(max_size=1000)
+        obj = FileObject.create("hash", 1)
+        cache.put("store", obj.id, obj, 100)
+
+        self.assertIsNone(cache.get("other-store", obj.id))
+        self.assertIs(obj, cache.get("store", obj.id))
+
+        cache.evict("store", obj.id)
+        self.assertIsNone(cache.get("store", obj.id))
+        self.assertEqual(0, cache.used_size)
+
+    def test_too_large_objects_are_not_cached(self):
+        cache = DecodedObjectCache(max_size=100)
+        obj = FileObject.create("hash", 1)
+        cache.put("store", obj.id, obj, 101)
+        self.assertEqual(0, len(cache))
+
+    def test_storage_reads_are_shared_across_transactions(self):
+        with TemporaryDirectory(delete=True) as tmpdir:
+            with ObjectStorage(f"{tmpdir}/test.lmdb", map_size=1 << 20) as env:
+                file_obj = FileObject.create("hash", 1)
+                tree_obj = construct_tree_object({"file": file_obj.id})
+                with env.objects(write=True) as objects:
+                    objects[file_obj.id] = file_obj
+                    objects[tree_obj.id] = tree_obj
+
+                with env.objects(write=False) as objects:
+                    loaded_tree = objects[tree_obj.id]
+                    self.assertEqual(tree_obj, loaded_tree)
+
+                hits = DECODED_OBJECTS_CACHE.hits
+                with env.objects(write=False) as objects:
+                    self.assertIs(loaded_tree, objects[tree_obj.id])
+                self.assertIs(loaded_tree, env.read_object(tree_obj.id))
+                self.assertEqual(hits + 2, DECODED_OBJECTS_CACHE.hits)
+
+                with env.objects(write=True) as objects:
+                    del objects[tree_obj.id]
+
+                with env.objects(write=False) as objects:
+                    self.assertIsNone(objects[tree_obj.id])
+                self.assertIsNone(env.read_object(tree_obj.id))
+
+    def test_validation_does_not_read_from_cache(self):
+        with TemporaryDirectory(delete=True) as tmpdir:
+            with ObjectStorage(f"{tmpdir}/test.lmdb", map_size=1 << 20) as env:
+                file_obj = FileObject.create("hash", 1)
+                with env.objects(write=True) as objects:
+                    objects[file_obj.id] = file_obj
+
+                with env.objects(write=False) as objects:
+                    self.assertEqual(file_obj, objects[file_obj.id])
+
+                # as if deleted by another process, that can't evict it from the cache of this one
+                with env.begin(db_name="objects", write=True) as txn:
+                    txn.delete(file_obj.id)
+
+                with env.objects(write=False) as objects:
+                    self.assertEqual(file_obj, objects[file_obj.id])
+                with env.objects(write=False, use_cache=False) as objects:
+                    self.assertIsNone(objects[file_obj.id])
+                    with self.assertRaises(InconsistentObjectStorage):
+                        env.validate_storage(objects, [file_obj.id])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,9 +1,10 @@
+import hashlib
 import unittest
 
 from lmdb_storage.file_object import FileObject
 from lmdb_storage.object_serialization import write_stored_object, read_stored_object, construct_tree_object, \
     find_object_data_version, BlobStorageFormat
-from lmdb_storage.tree_object import TreeObject
+from lmdb_storage.tree_object import TreeObject, ObjectType, zip_children, merged_child_names
 
 
 class TestObjectSerialization(unittest.TestCase):
@@ -140,6 +141,118 @@ class TestObjectSerialization(unittest.TestCase):
             b'\x92\x01\x92\x92\xa1a\xc4\x08and roll\x92\xa1z\xc4\x08yeeeeah!')
         self.assertEqual(TreeObject(b'', sorted({"z": b'yeeeeah!', 'a': b'and roll'}.items())), tree_obj)
 
+    def test_serialization_version_v1(self):
+        self.assertEqual(
+            BlobStorageFormat.V1,
+            find_object_data_version(b'\xff\x01\x02\x01\x00\x00\x00\x00\x00\x00\x00\x02\x07\x00asdasda\x00'))
+
+        self.assertEqual(
+            BlobStorageFormat.V1,
+            find_object_data_version(b'\xff\x01\x01\x00\x00\x00\x00'))
+
+    def test_serialize_files_v1(self):
+        blob_obj = FileObject.create("asdasda", 1, None)
+        self.assertEqual(
+            b'\xff\x01\x02\x01\x00\x00\x00\x00\x00\x00\x00\x02\x07\x00asdasda\x00',
+            write_stored_object(blob_obj, BlobStorageFormat.V1))
+        self.assertEqual(b'\n\x94\xfb\x8bt*c}B3S-"\xeb8\xe2\x80\x90\x00\xbd', blob_obj.id)  # id is same as V0
+
+        blob_obj = FileObject.create("d41d8cd98f00b204e9800998ecf8427e", 756181684685, "d41d8cd98f00b204e9800998ecf8427e")
+        self.assertEqual(
+            b'\xff\x01\x02\xcd\xd1\xf0\x0f\xb0\x00\x00\x00'
+            b'\x01\xd4\x1d\x8c\xd9\x8f\x00\xb2\x04\xe9\x80\t\x98\xec\xf8B~'
+            b'\x01\xd4\x1d\x8c\xd9\x8f\x00\xb2\x04\xe9\x80\t\x98\xec\xf8B~',
+            write_stored_object(blob_obj, BlobStorageFormat.V1))
+
+        blob_obj = FileObject.create("", -5, "")
+        self.assertEqual(
+            b'\xff\x01\x02\xfb\xff\xff\xff\xff\xff\xff\xff\x02\x00\x00\x02\x00\x00',
+            write_stored_object(blob_obj, BlobStorageFormat.V1))
+
+    def test_roundtrip_files_v1(self):
+        for blob_obj in [
+            FileObject.create("asdasda", 1, None),
+            FileObject.create("asdasda", 1, "asdfas"),
+            FileObject.create("", -5, "asdfas"),
+            FileObject.create("D41D8CD98F00B204E9800998ECF8427E", 756181684685, "d41d8cd98f00b204e9800998ecf8427e"),
+            FileObject.create("d41d8cd98f00b204e9800998ecf8427e ", 3, "d41d8cd98f00b204 e9800998ecf8427e")]:
+            read_obj = read_stored_object(blob_obj.id, memoryview(write_stored_object(blob_obj, BlobStorageFormat.V1)))
+            self.assertEqual(blob_obj, read_obj)
+            self.assertEqual(blob_obj.id, read_obj.id)
+            self.assertEqual(blob_obj.md5, read_obj.md5)
+
+    def test_serialize_trees_v1(self):
+        tree_obj = construct_tree_object({})
+        self.assertEqual(b'\xff\x01\x01\x00\x00\x00\x00', write_stored_object(tree_obj, BlobStorageFormat.V1))
+        self.assertEqual(b'\xa8\x0f\x91\xbcH\x85\n\x1f\xb3E\x9b\xb7k\x9fc\x08\xd4\xd3W\x10', tree_obj.id)
+
+        tree_obj = construct_tree_object({"z": b'y' * 20, 'a': b'a' * 20, "\u044a": b'b' * 20})
+        self.assertEqual(
+            b'\xff\x01\x01\x03\x00\x00\x00\x01\x00\x00\x00\x02\x00\x00\x00\x04\x00\x00\x00'
+            b'aaaaaaaaaaaaaaaaaaaayyyyyyyyyyyyyyyyyyyybbbbbbbbbbbbbbbbbbbbaz\xd1\x8a',
+            write_stored_object(tree_obj, BlobStorageFormat.V1))
+
+    def test_roundtrip_trees_v1(self):
+        for tree_obj in [
+            construct_tree_object({}),
+            construct_tree_object({"some": b'w' * 20}),
+            construct_tree_object({"z": b'y' * 20, 'a': b'a' * 20, "\u044a": b'b' * 20})]:
+            packed = write_stored_object(tree_obj, BlobStorageFormat.V1)
+            read_obj = read_stored_object(tree_obj.id, memoryview(packed))
+
+            self.assertEqual(ObjectType.TREE, read_obj.object_type)
+            self.assertEqual(tree_obj, read_obj)
+            self.assertEqual(tree_obj.children, read_obj.children)
+            for child_name, child_id in tree_obj.children:
+                self.assertTrue(child_name in read_obj)
+                self.assertEqual(child_id, read_obj.get(child_name))
+            self.assertFalse("missing" in read_obj)
+
+            self.assertEqual(packed, write_stored_object(read_obj, BlobStorageFormat.V1))
+            self.assertEqual(write_stored_object(tree_obj), write_stored_object(read_obj))  # can still write V0
+
+    def test_tree_lookup_by_name(self):
+        names = [f"IMG_{i:05}.jpg" for i in range(0, 2000, 3)] + ["a", "IMG", "\u044a", "\u044a\u044a", "Z"]
+        tree_obj = construct_tree_object(dict((name, hashlib.sha1(name.encode()).digest()) for name in names))
+        packed_obj = read_stored_object(tree_obj.id, write_stored_object(tree_obj, BlobStorageFormat.V1))
+        v0_obj = read_stored_object(tree_obj.id, write_stored_object(tree_obj, BlobStorageFormat.V0))
+
+        for obj in [tree_obj, packed_obj, v0_obj]:
+            for name in names:
+                self.assertEqual(hashlib.sha1(name.encode()).digest(), obj.get(name))
+                self.assertTrue(name in obj)
+
+            for missing_name in ["", "IMG_00001.jpg", "IMG_", "IMG_99999.jpg", "b", "\u044b", "\u044a\u044a\u044a", "0"]:
+                self.assertIsNone(obj.get(missing_name))
+                self.assertFalse(missing_name in obj)
+
+        self.assertEqual(tree_obj, packed_obj)
+        self.assertEqual(tree_obj, v0_obj)
+        self.assertEqual(packed_obj, v0_obj)
+
+    def test_zip_children_of_trees(self):
+        def make_tree(*names: str) -> TreeObject:
+            return construct_tree_object(dict((name, name.encode().ljust(20, b"_")) for name in names))
+
+        left = make_tree("a", "c", "\u044a")
+        right = make_tree("b", "c", "Z")
+        packed_right = read_stored_object(right.id, write_stored_object(right, BlobStorageFormat.V1))
+
+        def id_of(name: str) -> bytes:
+            return name.encode().ljust(20, b"_")
+
+        for trees in [[left, None, right], [left, None, packed_right]]:
+            self.assertEqual([
+                ("Z", [None, None, id_of("Z")]),
+                ("a", [id_of("a"), None, None]),
+                ("b", [None, None, id_of("b")]),
+                ("c", [id_of("c"), None, id_of("c")]),
+                ("\u044a", [id_of("\u044a"), None, None])], list(zip_children(trees)))
+
+        self.assertEqual(["Z", "a", "b", "c", "\u044a"], list(merged_child_names([left, packed_right, right])))
+        self.assertEqual([], list(zip_children([None, make_tree()])))
+        self.assertEqual([], list(merged_child_names([])))
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,210 @@
+import pathlib
+import unittest
+from tempfile import TemporaryDirectory
+from unittest.mock import patch
+
+import lmdb
+
+from lmdb_storage.file_object import FileObject
+from lmdb_storage.object_cache import DECODED_OBJECTS_CACHE
+from lmdb_storage.object_serialization import write_latest_stored_object
+from lmdb_storage.object_store import ObjectStorage, USED_SIZE_CACHE, BACKUP_ROTATION, STORAGE_LAYOUT_KEY
+from lmdb_storage.test_experiment_lmdb import dump_tree
+from lmdb_storage.tree_structure import ObjectID, ObjectsBatch
+
+
+class TestObjectStore(unittest.TestCase):
+    def test_writing_trees_does_not_read_objects(self):
+        tmpdir = TemporaryDirectory(delete=True)
+        with ObjectStorage(tmpdir.name + "/test-objects.lmdb", map_size=1 << 24) as env:
+            all_data = [(f"/folder-{i % 7}/sub-{i % 3}/file-{i}", FileObject.create(f"hash-{i % 50}", i % 50))
+                        for i in range(200)]
+
+            misses, hits = DECODED_OBJECTS_CACHE.misses, DECODED_OBJECTS_CACHE.hits
+            with env.objects(write=True) as objects:
+                root_id = objects.mktree_from_tuples(all_data)
+                self.assertEqual(root_id, objects.mktree_from_tuples(reversed(all_data)))
+            self.assertEqual((misses, hits), (DECODED_OBJECTS_CACHE.misses, DECODED_OBJECTS_CACHE.hits))
+
+            with env.objects(write=False) as objects:
+                self.assertEqual(1 + 7 + 7 * 3 + 200, len(dump_tree(objects, root_id)))
+                self.assertEqual(1 + 7 + 21 + 50, len(objects))
+
+    def test_batched_writes_skip_existing_objects(self):
+        tmpdir = TemporaryDirectory(delete=True)
+        with ObjectStorage(tmpdir.name + "/test-objects.lmdb", map_size=1 << 24) as env:
+            file_objs = [FileObject.create(f"hash-{i}", i) for i in range(10)]
+            with env.objects(write=True) as objects:
+                batch = ObjectsBatch(objects, batch_size=3)
+                for file_obj in file_objs[:5]:
+                    batch[file_obj.id] = file_obj
+                batch.flush()
+
+                self.assertEqual(
+                    (10, 5),
+                    objects.put_packed_many((f.id, write_latest_stored_object(f)) for f in reversed(file_objs)))
+
+            with env.objects(write=False) as objects:
+                for file_obj in file_objs:
+                    self.assertEqual(file_obj, objects[file_obj.id])
+
+    def test_copy_trees_moves_serialized_objects(self):
+        tmpdir = TemporaryDirectory(delete=True)
+        all_data = [(f"/folder-{i % 7}/file-{i}", FileObject.create(f"hash-{i}", i)) for i in range(30)]
+        with ObjectStorage(tmpdir.name + "/source.lmdb", map_size=1 << 24) as source:
+            with source.objects(write=True) as objects:
+                root_id = objects.mktree_from_tuples(all_data)
+                partial_id = objects.mktree_from_tuples(all_data[:10])
+
+            with ObjectStorage(tmpdir.name + "/target.lmdb", map_size=1 << 24) as target:
+                target.copy_trees_from(source, [partial_id])
+                target.copy_trees_from(source, [root_id, partial_id])
+
+                with source.objects(write=False) as source_objects, target.objects(write=False) as target_objects:
+                    self.assertEqual(dump_tree(source_objects, root_id), dump_tree(target_objects, root_id))
+                    self.assertEqual(
+                        [(k, bytes(v)) for k, v in source_objects.get_packed_many(source_objects.ids())],
+                        [(k, bytes(v)) for k, v in target_objects.get_packed_many(target_objects.ids())])
+
+    def test_trees_are_moved_to_their_own_db(self):
+        tmpdir = TemporaryDirectory(delete=True)
+        path = tmpdir.name + "/test-objects.lmdb"
+        all_data = [(f"/folder-{i % 7}/file-{i}", FileObject.create(f"hash-{i}", i)) for i in range(30)]
+        with self.assertLogs(level="WARNING") as logs, ObjectStorage(path, map_size=1 << 24) as env:
+            with env.begin(db_name="meta", write=False) as txn:
+                self.assertIsNotNone(txn.get(STORAGE_LAYOUT_KEY))  # new storages start in the latest layout
+
+            with env.objects(write=True) as objects:
+                root_id = objects.mktree_from_tuples(all_data)
+                all_packed = [(k, bytes(v)) for k, v in objects.get_packed_many(objects.ids())]
+
+            # store as in the layout before trees had their own db
+            with env.begin(db_name="objects", write=True) as txn:
+                for obj_id, obj_packed in all_packed:
+                    txn.put(obj_id, obj_packed)
+                txn.drop(env.db("trees"), delete=False)
+                txn.delete(STORAGE_LAYOUT_KEY, db=env.db("meta"))
+        self.assertEqual([], [line for line in logs.output if "trees" in line or "layout" in line])
+
+        with self.assertLogs(level="WARNING") as logs, ObjectStorage(path, map_size=1 << 24) as env:
+            with env.begin(db_name="trees", write=False) as txn:
+                self.assertEqual(1 + 7, txn.stat(env.db("trees"))["entries"])
+            with env.begin(db_name="objects", write=False) as txn:
+                self.assertEqual(30, txn.stat(env.db("objects"))["entries"])
+
+            with env.objects(write=False) as objects:
+                self.assertEqual(1 + 7 + 30, len(objects))
+                self.assertEqual(1 + 7 + 30, len(dump_tree(objects, root_id)))
+                self.assertEqual(all_packed, [(k, bytes(v)) for k, v in objects.get_packed_many(objects.ids())])
+        self.assertIn(f"WARNING:root:Moved {1 + 7} trees to their own db.", logs.output)
+
+    def test_map_grows_when_full(self):
+        tmpdir = TemporaryDirectory(delete=True)
+        path = tmpdir.name + "/test-objects.lmdb"
+        all_data = [(f"/folder-{i % 7}/file-{i}", FileObject.create(f"hash-{i}", i)) for i in range(2000)]
+
+        def write_all(env: ObjectStorage) -> ObjectID:
+            with env.objects(write=True) as objects:
+                return objects.mktree_from_tuples(all_data)
+
+        with ObjectStorage(path, map_size=1 << 16, max_map_size=1 << 17) as env:
+            self.assertRaises(lmdb.MapFullError, env.with_map_growth, lambda: write_all(env))
+            self.assertEqual(1 << 17, env._env.info()["map_size"])
+
+        with ObjectStorage(path, map_size=1 << 16) as env:
+            root_id = env.with_map_growth(lambda: write_all(env))
+            self.assertLess(1 << 17, env._env.info()["map_size"])
+
+        with ObjectStorage(path, map_size=1 << 16) as env:
+            with env.objects(write=False) as objects:
+                self.assertEqual(1 + 7 + 2000, len(dump_tree(objects, root_id)))
+
+    def test_map_grows_only_without_active_transactions(self):
+        tmpdir = TemporaryDirectory(delete=True)
+        path = tmpdir.name + "/test-objects.lmdb"
+        with ObjectStorage(path, map_size=1 << 20) as env:
+            with env.objects(write=False):
+                self.assertRaises(AssertionError, env.grow_map)
+                self.assertRaises(AssertionError, env.with_map_growth, lambda: None)
+
+            self.assertTrue(env.grow_map())
+            self.assertEqual(1 << 21, env._env.info()["map_size"])
+
+        BACKUP_ROTATION.wait()
+
+    def test_map_grows_on_open_only_if_not_used_elsewhere(self):
+        tmpdir = TemporaryDirectory(delete=True)
+        path = tmpdir.name + "/test-objects.lmdb"
+        with patch("lmdb_storage.object_store.GROW_MAP_AT_RATIO", 0):
+            with ObjectStorage(path, map_size=1 << 20) as env:
+                self.assertEqual(1 << 21, env._env.info()["map_size"])
+
+                with ObjectStorage(path, map_size=1 << 20) as other:  # shares the open environment
+                    self.assertEqual(1 << 21, other._env.info()["map_size"])
+
+        BACKUP_ROTATION.wait()
+
+    def test_used_size_is_calculated_once_per_commit(self):
+        tmpdir = TemporaryDirectory(delete=True)
+        with ObjectStorage(tmpdir.name + "/test-objects.lmdb", map_size=1 << 24) as env:
+            refreshes = USED_SIZE_CACHE.refreshes  # was calculated when opening
+            used_size = env.used_size
+            self.assertEqual(used_size, env.used_size)
+            self.assertEqual(used_size / (1 << 24), env.used_ratio)
+            self.assertEqual(refreshes, USED_SIZE_CACHE.refreshes)
+
+            with env.objects(write=True) as objects:
+                objects.mktree_from_tuples(
+                    (f"/file-{i}", FileObject.create(f"hash-{i}", i)) for i in range(1000))
+
+            self.assertLess(used_size, env.usage_stats()["used_size"])
+            self.assertEqual(refreshes + 1, USED_SIZE_CACHE.refreshes)
+
+    def test_backups_are_skipped_when_roots_did_not_change(self):
+        tmpdir = TemporaryDirectory(delete=True)
+        path = tmpdir.name + "/test-objects.lmdb"
+        backup_dir = pathlib.Path(path + "-BAK")
+
+        def set_root(env: ObjectStorage, count: int):
+            with env.objects(write=True) as objects:
+                root_id = objects.mktree_from_tuples(
+                    (f"/file-{i}", FileObject.create(f"hash-{i}", i)) for i in range(count))
+            env.roots(write=True)["HOARD"].current = root_id
+
+        with ObjectStorage(path, map_size=1 << 24, backup_interval=3600) as env:
+            set_root(env, 10)
+            self.assertTrue(env.maybe_backup())
+            self.assertFalse(env.maybe_backup())  # still running or roots are unchanged
+        BACKUP_ROTATION.wait()  # the storage was closed, but the backup finished
+        self.assertEqual(1, len(list(backup_dir.glob("backup_*.lmdb"))))
+
+        with ObjectStorage(path, map_size=1 << 24, backup_interval=3600) as env:
+            self.assertFalse(env.maybe_backup())
+
+            set_root(env, 20)
+            self.assertFalse(env.maybe_backup())  # last backup is too recent
+
+        with ObjectStorage(path, map_size=1 << 24, backup_interval=0) as env:
+            self.assertTrue(env.maybe_backup())
+            BACKUP_ROTATION.wait()
+            fingerprint = env.roots_fingerprint()
+
+        backups = list(sorted(backup_dir.glob("backup_*.lmdb")))
+        self.assertLessEqual(1, len(backups))  # backups within the same second overwrite each other
+        with ObjectStorage(backups[-1].as_posix()) as backup:
+            self.assertEqual(fingerprint, backup.roots_fingerprint())
+
+    def test_map_grows_after_running_backup(self):
+        tmpdir = TemporaryDirectory(delete=True)
+        path = tmpdir.name + "/test-objects.lmdb"
+
+        with ObjectStorage(path, map_size=1 << 24, backup_interval=0) as env:
+            with env.objects(write=True) as objects:
+                root_id = objects.mktree_from_tuples(
+                    (f"/file-{i}", FileObject.create(f"hash-{i}", i)) for i in range(1000))
+            env.roots(write=True)["HOARD"].current = root_id
+
+            self.assertTrue(env.maybe_backup())
+            self.assertTrue(env.grow_map())
+            self.assertFalse(BACKUP_ROTATION._running[path].is_alive())
+            self.assertEqual(1 << 25, env._env.info()["map_size"])
@@ -0,0 +1,48 @@
+import unittest
+from tempfile import TemporaryDirectory
+from typing import List, Tuple
+from unittest.mock import patch
+
+from lmdb_storage.file_object import FileObject
+from lmdb_storage.object_store import ObjectStorage
+from lmdb_storage.parallel_walk import walk_subtrees, top_level_subtrees, set_parallel_walks
+from lmdb_storage.tree_iteration import zip_trees_dfs
+from lmdb_storage.tree_structure import ObjectID, Objects
+
+
+class TestParallelWalk(unittest.TestCase):
+    def test_walking_subtrees_in_parallel(self):
+        tmpdir = TemporaryDirectory(delete=True)
+        with ObjectStorage(tmpdir.name + "/test-objects.lmdb", map_size=1 << 24) as env:
+            with env.objects(write=True) as objects:
+                left_id = objects.mktree_from_tuples(
+                    (f"/folder-{i % 5}/file-{i}.txt", FileObject.create(f"hash-{i}", i)) for i in range(50))
+                right_id = objects.mktree_from_tuples(
+                    (f"/folder-{i % 7}/file-{i}.txt", FileObject.create(f"hash-{i}", i)) for i in range(20, 70))
+
+            with env.objects(write=False) as objects:
+                expected = [
+                    (str(path), obj_ids) for path, obj_ids, _ in zip_trees_dfs(objects, "", [left_id, right_id])][1:]
+                subtrees = top_level_subtrees(objects, [left_id, right_id])
+            self.assertEqual([f"/folder-{i}" for i in range(7)], [path for path, _ in subtrees])
+
+            serial = list(walk_subtrees(env, subtrees, list_zipped_paths, max_workers=1))
+            self.assertEqual(expected, sum(serial, []))
+
+            parallel = list(walk_subtrees(env, subtrees, list_zipped_paths, max_workers=2, min_objects=0))
+            self.assertEqual(expected, sum(parallel, []))
+            self.assertLess(1, len(parallel))
+
+            set_parallel_walks(False)
+            try:
+                with patch("lmdb_storage.parallel_walk.ProcessPoolExecutor", side_effect=AssertionError):
+                    chunked = list(walk_subtrees(env, subtrees, list_zipped_paths, max_workers=2, min_objects=0))
+            finally:
+                set_parallel_walks(True)
+            self.assertEqual(parallel, chunked)
+
+def list_zipped_paths(objects: Objects, subtrees: List[Tuple[str, List[ObjectID | None]]]):
+    return [
+        (path, obj_ids) for subtree_path, subtree_ids in subtrees
+        for path, obj_ids, _ in zip_trees_dfs(objects, subtree_path, subtree_ids)]
+
@@ -22,7 +22,7 @@ from util import format_size
 def force_iterating_over(hoard_contents: HoardContents) -> Tuple[int, int]:
     decoded_file, decoded_folder = 0, 0
     with hoard_contents.env.objects(write=False) as objects:
-        for k, v in objects.txn.cursor():
+        for k in objects.ids():
             value = objects[k]
             if value.object_type == ObjectType.BLOB:
                 decoded_file += 1
@@ -162,19 +162,18 @@ class TestPerformance(IsolatedAsyncioTestCase):
                 paths_in_hoard = 0
                 files_in_hoard = 0
                 files_not_in_hoard = 0
-                for k, v in objects.txn.cursor():
-                    value = objects[k]
-                    if value.object_type == ObjectType.BLOB:
-                        paths_and_files = list(_resolve(lookup_table, k, read_with_cache))
-                        paths_in_hoard += len(paths_and_files)
-
-                        paths_as_string = list(lookup_paths(lookup_table, k, read_with_cache))
-                        assert len(paths_as_string) == len(paths_and_files)
-
-                        if len(paths_and_files) == 0:
-                            files_not_in_hoard += 1
-                        else:
-                            files_in_hoard += 1
+                for k in objects.txn.cursor().iternext(keys=True, values=False):  # only blobs, trees are apart
+                    k = bytes(k)
+                    paths_and_files = list(_resolve(lookup_table, k, read_with_cache))
+                    paths_in_hoard += len(paths_and_files)
+
+                    paths_as_string = list(lookup_paths(lookup_table, k, read_with_cache))
+                    assert len(paths_as_string) == len(paths_and_files)
+
+                    if len(paths_and_files) == 0:
+                        files_not_in_hoard += 1
+                    else:
+                        files_in_hoard += 1
 
                 time = default_timer() - start
                 sys.stdout.write(
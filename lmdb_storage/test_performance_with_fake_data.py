@@ -12,7 +12,7 @@ from unittest import TestCase
 import msgpack
 
 from lmdb_storage.file_object import BlobObject, FileObject
-from lmdb_storage.object_store import ObjectStorage
+from lmdb_storage.object_store import ObjectStorage, BACKUP_ROTATION
 
 random.seed(42)
 vocabulary = [
@@ -81,6 +81,7 @@ class TestPerformance(TestCase):
         self.tmpdir = tempfile.TemporaryDirectory()
 
     def tearDown(self):
+        BACKUP_ROTATION.wait()
         self.tmpdir.cleanup()
 
     def test_create_vocabulary_and_index(self):
@@ -0,0 +1,109 @@
+import threading
+import unittest
+from tempfile import TemporaryDirectory
+from unittest.mock import patch
+
+from lmdb_storage.stats_cache import StatsCache, STATS_CACHE_BATCH_SIZE, GENERATION_REFRESH_AGE
+
+
+def committed_count(cache: StatsCache) -> int:
+    with cache.begin(write=False) as txn:
+        return txn.stat(cache._cache_db)["entries"]
+
+
+class TestStatsCache(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = TemporaryDirectory(delete=True)
+        self.path = self.tmpdir.name + "/test-cache.lmdb"
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_stats_are_written_behind(self):
+        cache = StatsCache(self.path)
+        self.assertIsNone(cache.get(b"key"))
+
+        cache.put(b"key", b"value")
+        self.assertEqual(b"value", cache.get(b"key"))
+        self.assertEqual(0, committed_count(cache))
+
+        cache.flush()
+        self.assertEqual(1, committed_count(cache))
+        self.assertEqual(b"value", cache.get(b"key"))  # from the renewed snapshot
+        cache.close()
+
+    def test_full_batches_are_committed(self):
+        cache = StatsCache(self.path)
+        for i in range(STATS_CACHE_BATCH_SIZE + 10):
+            cache.put(f"key-{i}".encode(), f"value-{i}".encode())
+        self.assertEqual(STATS_CACHE_BATCH_SIZE, committed_count(cache))
+
+        for i in range(STATS_CACHE_BATCH_SIZE + 10):
+            self.assertEqual(f"value-{i}".encode(), cache.get(f"key-{i}".encode()))
+        cache.close()
+
+    def test_least_recently_used_stats_are_evicted(self):
+        cache = StatsCache(self.path)
+        for i in range(10):
+            cache.put(f"old-{i}".encode(), b"value")
+        cache.close()
+
+        for _ in range(GENERATION_REFRESH_AGE):
+            StatsCache(self.path).close()
+
+        cache = StatsCache(self.path)
+        self.assertEqual(1 + 1 + GENERATION_REFRESH_AGE, cache.generation)
+        for i in range(5):
+            cache.put(f"new-{i}".encode(), b"value")
+            self.assertEqual(b"value", cache.get(f"old-{i}".encode()))
+        cache.flush()
+
+        self.assertEqual(5, cache.evict_least_recently_used(1 / 3))
+        cache.flush()
+        for i in range(10):
+            self.assertEqual(b"value" if i < 5 else None, cache.get(f"old-{i}".encode()))
+        for i in range(5):
+            self.assertEqual(b"value", cache.get(f"new-{i}".encode()))
+        cache.close()
+
+    def test_workers_use_the_generation_of_the_cache(self):
+        cache = StatsCache(self.path)
+        cache.put(b"key", b"value")
+        cache.close()
+
+        with patch.object(StatsCache, "maybe_gc") as maybe_gc:
+            worker_cache = StatsCache(self.path, worker=True)
+            maybe_gc.assert_not_called()
+        self.assertEqual(cache.generation, worker_cache.generation)
+        self.assertEqual(b"value", worker_cache.get(b"key"))
+        worker_cache.put(b"worker-key", b"worker-value")
+        worker_cache.close()
+
+        cache = StatsCache(self.path)
+        self.assertEqual(worker_cache.generation + 1, cache.generation)
+        self.assertEqual(b"worker-value", cache.get(b"worker-key"))
+        cache.close()
+
+    def test_threads_share_the_cache(self):
+        cache = StatsCache(self.path)
+
+        def put_and_flush(thread_idx: int):
+            for i in range(1000):
+                cache.put(f"key-{thread_idx}-{i}".encode(), b"value")
+                self.assertEqual(b"value", cache.get(f"key-{thread_idx}-{i // 2}".encode()))
+                if i % 10 == 0:
+                    cache.flush()
+
+        threads = [threading.Thread(target=put_and_flush, args=(thread_idx,)) for thread_idx in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        cache.flush()
+        self.assertEqual(4 * 1000, committed_count(cache))
+        cache.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,114 @@
+import hashlib
+import unittest
+from tempfile import TemporaryDirectory
+from unittest.mock import patch
+
+from lmdb_storage.file_object import FileObject
+from lmdb_storage.lookup_tables import LookupTableObjToPaths, CompressedPath
+from lmdb_storage.lookup_tables_paths import compute_obj_id_to_path_lookup_table, decode_bytes_to_intpath
+from lmdb_storage.object_store import ObjectStorage, BACKUP_ROTATION
+from lmdb_storage.tree_bloom_filters import blob_bits, may_contain
+from lmdb_storage.tree_iteration import dfs
+from lmdb_storage.tree_object import ObjectType
+
+
+def stored_filters_count(env: ObjectStorage) -> int:
+    with env.objects(write=False) as objects:
+        return objects.txn.stat(env.db("blooms"))["entries"]
+
+
+class TestTreeBloomFilters(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = TemporaryDirectory(delete=True)
+        self.path = self.tmpdir.name + "/test-objects.lmdb"
+
+    def tearDown(self):
+        BACKUP_ROTATION.wait()
+        self.tmpdir.cleanup()
+
+    def test_filters_contain_all_blobs_below(self):
+        with ObjectStorage(self.path, map_size=1 << 24) as env:
+            with env.objects(write=True) as objects:
+                root_id = objects.mktree_from_tuples(
+                    (f"/folder-{i % 5}/sub-{i % 3}/file-{i}.txt", FileObject.create(f"hash-{i}", i))
+                    for i in range(300))
+
+            with env.objects(write=False) as objects:
+                filters = env.bloom_filters(objects)
+                for _, obj_type, obj_id, obj, _ in dfs(objects, "", root_id):
+                    if obj_type == ObjectType.TREE:
+                        bloom_filter = filters[obj_id]
+                        for _, _, blob_id, _, _ in dfs(objects, "", obj_id):
+                            if objects[blob_id].object_type == ObjectType.BLOB:
+                                self.assertTrue(may_contain(bloom_filter, blob_bits(blob_id)))
+
+                missing = [hashlib.sha1(f"missing-{i}".encode()).digest() for i in range(1000)]
+                false_positives = sum(may_contain(filters[root_id], blob_bits(blob_id)) for blob_id in missing)
+                self.assertLess(false_positives, 100)
+
+    def test_find_paths_as_lookup_tables_do(self):
+        with ObjectStorage(self.path, map_size=1 << 24) as env:
+            with env.objects(write=True) as objects:
+                root_id = objects.mktree_from_tuples(
+                    (f"/folder-{i % 7}/file-{i}.txt", FileObject.create(f"hash-{i % 40}", i % 40))
+                    for i in range(200))
+
+            with env.objects(write=False) as objects:
+                lookup_table = LookupTableObjToPaths[CompressedPath](
+                    compute_obj_id_to_path_lookup_table(objects, root_id), decode_bytes_to_intpath, root_id)
+                filters = env.bloom_filters(objects)
+                for blob_id in lookup_table.keys():
+                    self.assertEqual(lookup_table[blob_id], list(filters.find_paths(root_id, blob_id)))
+
+                missing_id = hashlib.sha1(b"missing").digest()
+                self.assertEqual([], list(filters.find_paths(root_id, missing_id)))
+                self.assertEqual([], list(filters.find_paths(None, missing_id)))
+
+    def test_filters_are_stored_while_their_trees_live(self):
+        with ObjectStorage(self.path, map_size=1 << 24) as env:
+            def make_tree(prefix: str) -> bytes:
+                with env.objects(write=True) as objects:
+                    return objects.mktree_from_tuples(
+                        (f"/{prefix}/file-{i}.txt", FileObject.create(f"{prefix}-{i}", i)) for i in range(3))
+
+            def compute_filter(root_id: bytes) -> int:
+                with env.objects(write=False) as objects:
+                    return env.bloom_filters(objects)[root_id]
+
+            live_id, garbage_id = make_tree("live"), make_tree("garbage")
+            env.roots(write=True)["HOARD"].current = live_id
+            compute_filter(live_id)
+            compute_filter(garbage_id)
+            self.assertEqual(0, stored_filters_count(env))  # computed in read-only transactions
+
+            env.collect()
+            self.assertEqual(2, stored_filters_count(env))  # of the live tree and its folder
+
+            with env.objects(write=True) as objects:
+                other_id = objects.mktree_from_tuples([("/other.txt", FileObject.create("other", 1))])
+                env.bloom_filters(objects)[other_id]
+            self.assertEqual(3, stored_filters_count(env))
+
+            env.collect()
+            self.assertEqual(2, stored_filters_count(env))
+
+    def test_filters_computed_while_reading_are_capped(self):
+        with ObjectStorage(self.path, map_size=1 << 24) as env:
+            with env.objects(write=True) as objects:
+                root_id = objects.mktree_from_tuples(
+                    (f"/folder-{i % 5}/file-{i}.txt", FileObject.create(f"hash-{i}", i)) for i in range(20))
+            env.roots(write=True)["HOARD"].current = root_id
+
+            with patch("lmdb_storage.tree_bloom_filters.MAX_UNSTORED_FILTERS", 2):
+                with env.objects(write=False) as objects:
+                    filters = env.bloom_filters(objects)
+                    for i in range(20):
+                        self.assertTrue(may_contain(filters[root_id], blob_bits(FileObject.create(f"hash-{i}", i).id)))
+                    self.assertEqual(2, len(filters.unstored_filters))
+
+            env.collect()
+            self.assertEqual(2, stored_filters_count(env))
+
+
+if __name__ == '__main__':
+    unittest.main()
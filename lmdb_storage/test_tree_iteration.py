@@ -0,0 +1,96 @@
+import unittest
+from tempfile import TemporaryDirectory
+
+from command.fast_path import FastPosixPath
+from lmdb_storage.file_object import FileObject
+from lmdb_storage.object_store import ObjectStorage
+from lmdb_storage.tree_iteration import dfs, zip_dfs, DiffType, dfs_at, zip_dfs_at, TreePath, zip_trees_dfs
+from lmdb_storage.tree_object import ObjectType
+
+
+class TestTreeIteration(unittest.TestCase):
+    def test_walking_trees_deeper_than_the_recursion_limit(self):
+        tmpdir = TemporaryDirectory(delete=True)
+        deep_folder = "/d" * 1500
+        with ObjectStorage(tmpdir.name + "/test-objects.lmdb", map_size=1 << 26) as env:
+            with env.objects(write=True) as objects:
+                root_id = objects.mktree_from_tuples([
+                    (deep_folder + "/deep.txt", FileObject.create("deep", 1)),
+                    ("/skipped/file.txt", FileObject.create("skipped", 2)),
+                    ("/z.txt", FileObject.create("z", 3))])
+
+            with env.objects(write=False) as objects:
+                visited = []
+                for path, obj_type, _, _, skip_children in dfs(objects, "", root_id):
+                    visited.append(path)
+                    if path == "/skipped":
+                        skip_children()
+
+                self.assertEqual(1 + 1500 + 1 + 1 + 1, len(visited))
+                self.assertEqual([deep_folder + "/deep.txt", "/skipped", "/z.txt"], visited[-3:])
+
+                self.assertEqual(
+                    [deep_folder + "/deep.txt", "/skipped/file.txt", "/z.txt"],
+                    [path for path, diff_type, _, _, _ in zip_dfs(objects, "", None, root_id)
+                     if diff_type == DiffType.LEFT_MISSING and path.endswith(".txt")])
+
+    def test_walking_only_a_subtree(self):
+        tmpdir = TemporaryDirectory(delete=True)
+        with ObjectStorage(tmpdir.name + "/test-objects.lmdb", map_size=1 << 24) as env:
+            with env.objects(write=True) as objects:
+                left_id = objects.mktree_from_tuples([
+                    ("/backups/set/a.txt", FileObject.create("a", 1)),
+                    ("/backups/set/b.txt", FileObject.create("b", 2)),
+                    ("/other/c.txt", FileObject.create("c", 3))])
+                right_id = objects.mktree_from_tuples([
+                    ("/backups/set/a.txt", FileObject.create("a", 1)),
+                    ("/backups/set/d.txt", FileObject.create("d", 4))])
+
+            with env.objects(write=False) as objects:
+                self.assertEqual(
+                    [path for path, _, _, _, _ in dfs(objects, "", left_id) if path.startswith("/backups/set")],
+                    [path for path, _, _, _, _ in dfs_at(objects, ["backups", "set"], left_id)])
+                self.assertEqual(
+                    ["/backups/set", "/backups/set/a.txt", "/backups/set/b.txt"],
+                    [path for path, _, _, _, _ in dfs_at(objects, ["backups", "set"], left_id)])
+                self.assertEqual([], list(dfs_at(objects, ["missing"], left_id)))
+                self.assertEqual([], list(dfs_at(objects, ["other", "c.txt", "deeper"], left_id)))
+
+                self.assertEqual([
+                    ("/backups/set", DiffType.DIFFERENT),
+                    ("/backups/set/a.txt", DiffType.SAME),
+                    ("/backups/set/b.txt", DiffType.RIGHT_MISSING),
+                    ("/backups/set/d.txt", DiffType.LEFT_MISSING)],
+                    [(path, diff_type) for path, diff_type, _, _, _ in zip_dfs_at(
+                        objects, ["backups", "set"], left_id, right_id, drilldown_same=True)])
+                self.assertEqual(
+                    [(path, diff_type) for path, diff_type, _, _, _ in zip_dfs(objects, "", left_id, right_id)],
+                    [(path, diff_type) for path, diff_type, _, _, _ in zip_dfs_at(objects, [], left_id, right_id)])
+
+    def test_walking_with_path_handles(self):
+        tmpdir = TemporaryDirectory(delete=True)
+        with ObjectStorage(tmpdir.name + "/test-objects.lmdb", map_size=1 << 24) as env:
+            with env.objects(write=True) as objects:
+                left_id = objects.mktree_from_tuples([
+                    ("/folder/sub/a.txt", FileObject.create("a", 1)),
+                    ("/folder/b.txt", FileObject.create("b", 2))])
+                right_id = objects.mktree_from_tuples([
+                    ("/folder/b.txt", FileObject.create("b", 3)),
+                    ("/c.txt", FileObject.create("c", 4))])
+
+            with env.objects(write=False) as objects:
+                self.assertEqual(
+                    [path for path, _, _, _, _ in dfs(objects, "", left_id)],
+                    [str(path) for path, _, _, _, _ in dfs(objects, TreePath.root(), left_id)])
+                self.assertEqual(
+                    [path for path, _, _ in zip_trees_dfs(objects, "/mnt", [left_id, right_id])],
+                    [str(path) for path, _, _ in zip_trees_dfs(objects, TreePath.root("/mnt"), [left_id, right_id])])
+
+                file_paths = [
+                    path for path, obj_type, _, _, _ in dfs(objects, TreePath.root("/mnt"), left_id)
+                    if obj_type == ObjectType.BLOB]
+                self.assertEqual(["/mnt/folder/b.txt", "/mnt/folder/sub/a.txt"], [str(p) for p in file_paths])
+                self.assertEqual(
+                    [FastPosixPath("/mnt/folder/b.txt"), FastPosixPath("/mnt/folder/sub/a.txt")],
+                    [p.as_fast_path() for p in file_paths])
+                self.assertEqual(["mnt", "folder", "sub", "a.txt"], file_paths[1].as_fast_path()._rem)
@@ -0,0 +1,103 @@
+import struct
+from typing import Dict, Iterator, List, Tuple
+
+from lmdb import _Database
+
+from lmdb_storage.lookup_tables import CompressedPath
+from lmdb_storage.tree_object import ObjectID, MaybeObjectID
+from lmdb_storage.tree_structure import StoredObjects
+
+## Tree Bloom filters
+#  db "blooms": tree id -> Bloom filter of the ids of all blobs below the tree, as a little-endian int of up to
+#  BLOOM_FILTER_BITS bits
+#
+# A filter only depends on the id of its tree, so it is computed once and kept for as long as the tree is stored. Blob
+# ids are already hashes, so the bits of an id are taken from its first 32-bit words, as in BloomFilterM. All filters
+# have the same size, so the filter of a tree is the union of the filters of its subtrees and the bits of its blobs,
+# and filters of new trees only need the filters of the subtrees that changed. Filters of trees with many blobs are
+# mostly set, so a search walks the top of big trees and skips the subtrees below that don't contain the blob.
+
+BLOOM_FILTER_BITS = 1 << 12
+MAX_UNSTORED_FILTERS = 1 << 14  # about 8MB of filters computed in read-only transactions
+BLOOM_FILTER_HASH = struct.Struct("<4I")
+
+
+def blob_bits(blob_id: ObjectID) -> int:
+    bits = 0
+    for word in BLOOM_FILTER_HASH.unpack_from(blob_id):
+        bits |= 1 << (word & (BLOOM_FILTER_BITS - 1))
+    return bits
+
+
+def may_contain(bloom_filter: int, bits: int) -> bool:
+    return bits & ~bloom_filter == 0
+
+
+class TreeBloomFilters:
+    """Reads the filters of trees from the transaction of the objects, computing those that are not stored.
+
+    Computed filters are stored if the transaction is writable, otherwise up to MAX_UNSTORED_FILTERS of them are kept
+    in unstored_filters to be stored later, and the rest are computed again when needed."""
+
+    def __init__(self, objects: StoredObjects, blooms_db: _Database, unstored_filters: Dict[ObjectID, int]):
+        self.objects = objects
+        self.txn = objects.txn
+        self.blooms_db = blooms_db
+        self.unstored_filters = unstored_filters
+
+    def __getitem__(self, tree_id: ObjectID) -> int:
+        bloom_filter = self.unstored_filters.get(tree_id)
+        if bloom_filter is not None:
+            return bloom_filter
+
+        data = self.txn.get(tree_id, db=self.blooms_db)
+        if data is not None:
+            return int.from_bytes(data, "little")
+
+        bloom_filter = 0
+        for _, child_id in self.objects[tree_id].children:
+            bloom_filter |= self[child_id] if self.objects.is_tree(child_id) else blob_bits(child_id)
+
+        if self.objects.write:
+            self.txn.put(tree_id, _packed(bloom_filter), db=self.blooms_db)
+        elif len(self.unstored_filters) < MAX_UNSTORED_FILTERS:
+            self.unstored_filters[tree_id] = bloom_filter
+        return bloom_filter
+
+    def store_unstored(self) -> int:
+        """Stores the filters computed in read-only transactions, of the trees that are still stored."""
+        assert self.objects.write
+        stored = 0
+        for tree_id, bloom_filter in self.unstored_filters.items():
+            if tree_id in self.objects:
+                self.txn.put(tree_id, _packed(bloom_filter), db=self.blooms_db)
+                stored += 1
+        self.unstored_filters.clear()
+        return stored
+
+    def find_paths(self, root_id: MaybeObjectID, blob_id: ObjectID) -> Iterator[CompressedPath]:
+        """Yields the paths of the blob below the root in depth-first order, as the lookup tables of paths do."""
+        if root_id is None or not self.objects.is_tree(root_id):
+            return
+
+        bits = blob_bits(blob_id)
+        stack: List[Tuple[CompressedPath, Iterator[Tuple[int, Tuple[str, ObjectID]]]]] = [
+            ([], enumerate(self.objects[root_id].children))]
+        while len(stack) > 0:
+            path, children = stack[-1]
+            current = next(children, None)
+            if current is None:
+                stack.pop()
+                continue
+
+            child_idx, (_, child_id) = current
+            if child_id == blob_id:
+                yield path + [child_idx]
+                continue
+
+            if self.objects.is_tree(child_id) and may_contain(self[child_id], bits):
+                stack.append((path + [child_idx], enumerate(self.objects[child_id].children)))
+
+
+def _packed(bloom_filter: int) -> bytes:
+    return bloom_filter.to_bytes((bloom_filter.bit_length() + 7) // 8, "little")
@@ -1,39 +1,116 @@
 import enum
-from typing import Iterable, Callable, Tuple, List
+import sys
+from typing import Iterable, Callable, Tuple, List, Iterator
 
+from command.fast_path import FastPosixPath
 from lmdb_storage.tree_structure import ObjectID, Objects
-from lmdb_storage.tree_object import ObjectType, StoredObject, TreeObject
+from lmdb_storage.tree_object import ObjectType, StoredObject, TreeObject, zip_children
+from lmdb_storage.tree_operations import get_child
 
 type SkipFun = Callable[[], None]
 
 
-def dfs(
-        objects: Objects, path: str,
-        obj_id: bytes) -> Iterable[Tuple[str, ObjectType, ObjectID, StoredObject, SkipFun]]:
+class SkipFlag:
+    """Skips the children of the last yielded tree when called. A walk reuses one flag for all the trees it yields, so
+    it has to be called before advancing the walk."""
+    __slots__ = ("skip",)
+
+    def __init__(self):
+        self.skip = False
+
+    def __call__(self) -> None:
+        self.skip = True
+
+
+class TreePath:
+    """Path of a walked node, kept as its parent's path and its interned name. Walks started from a TreePath yield
+    those instead of strings, so the path is only joined for the nodes that are asked for it."""
+    __slots__ = ("parent", "name", "_joined")
+
+    def __init__(self, parent: "TreePath | None", name: str):
+        self.parent = parent
+        self.name = name
+        self._joined: str | None = None
+
+    @staticmethod
+    def root(path: str = "") -> "TreePath":
+        return TreePath(None, path)
+
+    def child(self, child_name: str) -> "TreePath":
+        return TreePath(self, sys.intern(child_name))
+
+    def __str__(self) -> str:
+        if self._joined is None:
+            self._joined = self.name if self.parent is None else str(self.parent) + "/" + self.name
+        return self._joined
+
+    def __repr__(self) -> str:
+        return f"TreePath({str(self)!r})"
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, TreePath) and str(self) == str(other)
+
+    def __hash__(self) -> int:
+        return hash(str(self))
+
+    def parts(self) -> List[str]:
+        names = []
+        current = self
+        while current.parent is not None:
+            names.append(current.name)
+            current = current.parent
+        names.extend(reversed([name for name in current.name.split("/") if name != ""]))
+        return names[::-1]
+
+    def as_fast_path(self) -> FastPosixPath:
+        """Builds the absolute path from the names, without joining and splitting them again."""
+        return FastPosixPath(True, "", self.parts())
+
+
+type WalkPath = str | TreePath
+
+
+def dfs[P: WalkPath](
+        objects: Objects, path: P,
+        obj_id: bytes) -> Iterable[Tuple[P, ObjectType, ObjectID, StoredObject, SkipFun]]:
     if obj_id is None:
         return
     assert type(obj_id) is bytes
 
-    obj = objects[obj_id]
-    if obj is None:
-        raise ValueError(f"{obj_id} is missing!")
+    skip_children = SkipFlag()
+    stack: List[Iterator[Tuple[P, ObjectID]]] = [iter([(path, obj_id)])]
+    while len(stack) > 0:
+        current = next(stack[-1], None)
+        if current is None:
+            stack.pop()
+            continue
 
-    if not isinstance(obj, TreeObject):
-        yield path, ObjectType.BLOB, obj_id, obj, CANT_SKIP
-        return
+        path, obj_id = current
+        obj = objects[obj_id]
+        if obj is None:
+            raise ValueError(f"{obj_id} is missing!")
 
-    should_skip = False
+        if not isinstance(obj, TreeObject):
+            yield path, ObjectType.BLOB, obj_id, obj, CANT_SKIP
+            continue
 
-    def skip_children() -> None:
-        nonlocal should_skip
-        should_skip = True
+        skip_children.skip = False
+        yield path, ObjectType.TREE, obj_id, obj, skip_children
+        if not skip_children.skip:
+            stack.append(_child_paths(path, obj))
+
+
+def dfs_at(
+        objects: Objects, path_in_tree: List[str],
+        root_id: ObjectID | None) -> Iterable[Tuple[str, ObjectType, ObjectID, StoredObject, SkipFun]]:
+    """Walks only the subtree at path_in_tree, yielding the same paths as walking from the root would."""
+    return dfs(objects, _joined_path(path_in_tree), get_child(objects, path_in_tree, root_id))
 
-    yield path, ObjectType.TREE, obj_id, obj, skip_children
-    if should_skip:
-        return
 
-    for child_name, child_id in obj.children:
-        yield from dfs(objects, path + "/" + child_name, child_id)
+def _child_paths[P: WalkPath](path: P, tree: TreeObject) -> Iterator[Tuple[P, ObjectID]]:
+    if isinstance(path, TreePath):
+        return ((path.child(child_name), child_id) for child_name, child_id in tree.children)
+    return ((path + "/" + child_name, child_id) for child_name, child_id in tree.children)
 
 
 class DiffType(enum.Enum):
@@ -46,10 +123,10 @@ class DiffType(enum.Enum):
 CANT_SKIP = lambda: None
 
 
-def zip_dfs(
-        objects: Objects, path: str,
+def zip_dfs[P: WalkPath](
+        objects: Objects, path: P,
         left_id: bytes | None, right_id: bytes | None,
-        drilldown_same: bool = False) -> Iterable[Tuple[str, DiffType, ObjectID | None, ObjectID | None, SkipFun]]:
+        drilldown_same: bool = False) -> Iterable[Tuple[P, DiffType, ObjectID | None, ObjectID | None, SkipFun]]:
     for sub_path, sub_obj_ids, skip_children in zip_trees_dfs(objects, path, [left_id, right_id], drilldown_same):
         sub_left_id, sub_right_id = sub_obj_ids
         if sub_left_id is None:
@@ -61,40 +138,61 @@ def zip_dfs(
         else:
             yield sub_path, DiffType.DIFFERENT, sub_left_id, sub_right_id, skip_children
 
-type ObjectIDs = List[ObjectID | None]
 
-def zip_trees_dfs(
-        objects: Objects, path: str, obj_ids: ObjectIDs,
-        drilldown_same: bool = True) -> Iterable[Tuple[str, ObjectIDs, SkipFun]]:
+def zip_dfs_at(
+        objects: Objects, path_in_tree: List[str],
+        left_root_id: bytes | None, right_root_id: bytes | None,
+        drilldown_same: bool = False) -> Iterable[Tuple[str, DiffType, ObjectID | None, ObjectID | None, SkipFun]]:
+    """Compares only the subtrees at path_in_tree, yielding the same paths as comparing from the roots would."""
+    return zip_dfs(
+        objects, _joined_path(path_in_tree),
+        get_child(objects, path_in_tree, left_root_id), get_child(objects, path_in_tree, right_root_id),
+        drilldown_same)
 
-    if not any(obj_id is not None for obj_id in obj_ids):
-        return  # nothing more to yield
 
-    if len(set(obj_ids)) <= 1 and not drilldown_same:  # we got same value for all
-        yield path, obj_ids, CANT_SKIP
-        return
+def _joined_path(path_in_tree: List[str]) -> str:
+    return "".join("/" + child_name for child_name in path_in_tree)  # the root is at ""
 
-    all_objs = [objects[obj_id] if obj_id else None for obj_id in obj_ids]
-    if any(isinstance(obj, TreeObject) for obj in all_objs):
-        # has tree
-        should_skip = False
 
-        def skip_children() -> None:
-            nonlocal should_skip
-            should_skip = True
+type ObjectIDs = List[ObjectID | None]
 
-        yield path, obj_ids, skip_children
 
-        if should_skip:
-            return
+def zip_trees_dfs[P: WalkPath](
+        objects: Objects, path: P, obj_ids: ObjectIDs,
+        drilldown_same: bool = True) -> Iterable[Tuple[P, ObjectIDs, SkipFun]]:
+    skip_children = SkipFlag()
+    stack: List[Iterator[Tuple[P, ObjectIDs]]] = [iter([(path, obj_ids)])]
+    while len(stack) > 0:
+        current = next(stack[-1], None)
+        if current is None:
+            stack.pop()
+            continue
+
+        path, obj_ids = current
+        if not any(obj_id is not None for obj_id in obj_ids):
+            continue  # nothing more to yield
+
+        if len(set(obj_ids)) <= 1 and not drilldown_same:  # we got same value for all
+            yield path, obj_ids, CANT_SKIP
+            continue
+
+        all_objs = [objects[obj_id] if obj_id else None for obj_id in obj_ids]
+        if any(isinstance(obj, TreeObject) for obj in all_objs):
+            # has tree
+            skip_children.skip = False
+            yield path, obj_ids, skip_children
+            if not skip_children.skip:
+                stack.append(_zipped_child_paths(path, all_objs))
+        else:
+            # only one or more files
+            yield path, obj_ids, CANT_SKIP
 
-        child_names = set(sum([[key for key, _ in obj.children] for obj in all_objs if isinstance(obj, TreeObject)], []))
 
-        for child_name in sorted(child_names):
-            yield from zip_trees_dfs(
-                objects, path + "/" + child_name,
-                [obj.get(child_name) if isinstance(obj, TreeObject) else None for obj in all_objs],
-                drilldown_same)
+def _zipped_child_paths[P: WalkPath](path: P, all_objs: List[StoredObject | None]) -> Iterator[Tuple[P, ObjectIDs]]:
+    trees = [obj if isinstance(obj, TreeObject) else None for obj in all_objs]
+    if isinstance(path, TreePath):
+        for child_name, child_ids in zip_children(trees):
+            yield path.child(child_name), child_ids
     else:
-        # only one or more filesfiles
-        yield path, obj_ids, CANT_SKIP
+        for child_name, child_ids in zip_children(trees):
+            yield path + "/" + child_name, child_ids
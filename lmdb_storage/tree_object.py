@@ -1,8 +1,11 @@
+import bisect
 import enum
+import heapq
 import logging
 import sys
 from functools import cached_property
-from typing import Dict, Iterable, Tuple, Union, List
+from operator import itemgetter
+from typing import Dict, Iterable, Tuple, Union, List, Iterator
 
 type ObjectID = bytes
 type MaybeObjectID = Union[ObjectID, None]
@@ -20,12 +23,12 @@ class StoredObject:
 type TreeObjectBuilder = Dict[str, ObjectID]
 
 class TreeObject(StoredObject):
+    """Tree with children sorted by name, looked up with binary search instead of an eagerly built dict."""
     object_type: ObjectType = ObjectType.TREE
 
     def __init__(self, id: ObjectID, sorted_children_pairs: List[Tuple[str, ObjectID]]):
         self._id = id
         self._sorted_children = sorted_children_pairs
-        self._children = dict(self._sorted_children)
 
     @property
     def id(self) -> bytes:
@@ -36,14 +39,58 @@ class TreeObject(StoredObject):
         return self._sorted_children
 
     def get(self, child_name: str) -> MaybeObjectID:
-        return self._children.get(child_name)
+        children = self.children
+        idx = bisect.bisect_left(children, child_name, key=_child_name)
+        if idx < len(children) and children[idx][0] == child_name:
+            return children[idx][1]
+        return None
 
     def __contains__(self, child_name: str) -> bool:
-        return child_name in self._children
+        return self.get(child_name) is not None
 
     def __eq__(self, other):
-        return isinstance(other, TreeObject) and self._children == other._children
+        if not isinstance(other, TreeObject) or len(self.children) != len(other.children):
+            return False
+        # compares pairwise, as V0-decoded children are lists instead of tuples
+        return all(
+            left_name == right_name and left_id == right_id
+            for (left_name, left_id), (right_name, right_id) in zip(self.children, other.children))
 
     def __hash__(self):
         # fixme it is not well defined, what about self._id?
         return sum(hash(name) + hash(child) for name, child in self.children)
+
+
+_child_name = itemgetter(0)
+
+
+def zip_children(trees: List[Union[TreeObject, None]]) -> Iterator[Tuple[str, List[MaybeObjectID]]]:
+    """Merges the sorted children of the trees in one pass, yielding each child name once in order, together with the
+    child ids in each of the trees, None where the tree is missing or does not have that child."""
+    merged = heapq.merge(*(_indexed_children(idx, tree) for idx, tree in enumerate(trees) if tree is not None))
+
+    current_name: str | None = None
+    current_ids: List[MaybeObjectID] = []
+    for child_name, idx, child_id in merged:
+        if child_name != current_name:
+            if current_name is not None:
+                yield current_name, current_ids
+            current_name, current_ids = child_name, [None] * len(trees)
+        current_ids[idx] = child_id
+
+    if current_name is not None:
+        yield current_name, current_ids
+
+
+def merged_child_names(trees: Iterable[TreeObject]) -> Iterator[str]:
+    """Merges the sorted children of the trees in one pass, yielding each child name once in order."""
+    last_name: str | None = None
+    for child_name in heapq.merge(*((child_name for child_name, _ in tree.children) for tree in trees)):
+        if child_name != last_name:
+            yield child_name
+            last_name = child_name
+
+
+def _indexed_children(idx: int, tree: TreeObject) -> Iterator[Tuple[str, int, ObjectID]]:
+    for child_name, child_id in tree.children:
+        yield child_name, idx, child_id
@@ -1,9 +1,10 @@
 import abc
-from typing import Iterable, Tuple, List, Callable, Union
+from typing import Iterable, Tuple, List, Callable, Union, Set
 
-from lmdb import Transaction
+from lmdb import Transaction, _Database
 
-from lmdb_storage.object_serialization import construct_tree_object
+from lmdb_storage.object_cache import DecodedObjectCache, estimate_decoded_size
+from lmdb_storage.object_serialization import construct_tree_object, read_object_type
 from lmdb_storage.tree_object import StoredObject, TreeObject, ObjectType, TreeObjectBuilder, ObjectID, MaybeObjectID
 
 
@@ -37,18 +38,25 @@ class Objects:
     def __delitem__(self, obj_id: bytes) -> None:
         pass
 
+    def put_many(self, items: Iterable[Tuple[ObjectID, StoredObject]]) -> None:
+        """Stores objects that are not yet stored."""
+        for obj_id, obj in items:
+            self[obj_id] = obj
+
     def mktree_from_tuples(self, all_data: Iterable[Tuple[str, StoredObject]], alive_it=do_nothing) -> bytes:
         all_data = sorted(all_data, key=lambda t: t[0])
 
         # every element is a partially-constructed object
         # (name, partial TreeObject)
 
+        batch = ObjectsBatch(self)
+
         stack: List[Tuple[ObjPath, TreeObjectBuilder]] = [([], dict())]
         for fullpath, file in alive_it(all_data, title="adding all data..."):
             assert fullpath == "" or fullpath[0] == "/", f"[{fullpath}] is not absolute path!"
             fullpath = fullpath.split("/")[1:]
 
-            pop_and_write_nonparents(self, stack, fullpath)
+            pop_and_write_nonparents(batch, stack, fullpath)
 
             top_obj_path, children = stack[-1]
 
@@ -63,39 +71,82 @@ class Objects:
                 stack.append((current_path, dict()))
 
             # add file to current's children
-            self[file.id] = file
+            batch[file.id] = file
 
             top_obj_path, tree_obj_builder = stack[-1]
             assert ASSERTS_DISABLED or is_child_of(fullpath, top_obj_path) and len(top_obj_path) + 1 == len(fullpath)
             tree_obj_builder[file_name] = file.id
 
-        pop_and_write_nonparents(self, stack, [])  # commits the stack
+        pop_and_write_nonparents(batch, stack, [])  # commits the stack
         assert len(stack) == 1
 
-        obj_id, _ = pop_and_write_obj(stack, self)
+        obj_id, _ = pop_and_write_obj(stack, batch)
+        batch.flush()
         return obj_id
 
 
+DEFAULT_BATCH_SIZE = 1 << 14
+
+
+class ObjectsBatch:
+    """Collects objects to write, and stores them together when enough are collected or when flushed."""
+
+    def __init__(self, objects: Objects, batch_size: int = DEFAULT_BATCH_SIZE):
+        self._objects = objects
+        self._batch_size = batch_size
+        self._pending: List[Tuple[ObjectID, StoredObject]] = []
+
+    def __setitem__(self, obj_id: bytes, obj: StoredObject):
+        self._pending.append((obj_id, obj))
+        if len(self._pending) >= self._batch_size:
+            self.flush()
+
+    def flush(self) -> None:
+        if len(self._pending) > 0:
+            self._objects.put_many(self._pending)
+            self._pending = []
+
+
 class TransactionCreator:
     @abc.abstractmethod
-    def begin(self, db_name: str, write: bool) -> Transaction: pass
+    def begin(self, db_name: str, write: bool, buffers: bool = False) -> Transaction: pass
+
+    @abc.abstractmethod
+    def db(self, db_name: str) -> _Database: pass
+
+
+# keys in the nursery db for objects that were written since the last collection
+BORN_KEY_PREFIX = b"n"  # objects that were added
+TOUCHED_KEY_PREFIX = b"t"  # trees that were written again while already stored
 
 
 class StoredObjects(Objects):
+    """Objects stored in a db of the transaction, or with trees stored apart from blobs if a trees db is provided."""
+
     def __init__(
             self, storage: TransactionCreator, db_name: str, write: bool,
             object_reader: Callable[[ObjectID, bytes], StoredObject],
-            object_writer: Callable[[StoredObject], bytes]):
+            object_writer: Callable[[StoredObject], bytes],
+            object_cache: DecodedObjectCache | None = None, cache_namespace: str = "", use_cache: bool = True,
+            nursery_db: _Database | None = None, trees_db: _Database | None = None,
+            blooms_db: _Database | None = None):
         self._storage = storage
         self.db_name = db_name
         self.write = write
         self._object_reader = object_reader
         self._object_writer = object_writer
 
-        self._cache = dict()
+        self._object_cache = object_cache
+        self._cache_namespace = cache_namespace
+        self._use_cache = use_cache  # deleted objects are still evicted from the cache if it is not used for reads
+
+        self._nursery_db = nursery_db
+        self._trees_db = trees_db
+        self._blooms_db = blooms_db
 
     def __enter__(self):
-        self.txn = self._storage.begin(db_name=self.db_name, write=self.write)
+        # buffers are only valid until the next write, so the object reader needs to decode or copy them
+        self.txn = self._storage.begin(db_name=self.db_name, write=self.write, buffers=True)
         self.txn.__enter__()
         return self
 
@@ -104,30 +155,166 @@ class StoredObjects(Objects):
         self.txn = None
         return None
 
+    @property
+    def _all_dbs(self) -> List[_Database | None]:
+        return [None] if self._trees_db is None else [self._trees_db, None]
+
+    def _db_of(self, object_type: ObjectType) -> _Database | None:
+        return self._trees_db if object_type == ObjectType.TREE else None
+
+    def _get_packed(self, obj_id: ObjectID) -> bytes | memoryview | None:
+        if self._trees_db is not None:
+            obj_packed = self.txn.get(obj_id, db=self._trees_db)
+            if obj_packed is not None:
+                return obj_packed
+        return self.txn.get(obj_id)
+
+    def __len__(self) -> int:
+        return sum(self.txn.stat(db if db is not None else self._storage.db(self.db_name))["entries"]
+                   for db in self._all_dbs)
+
     def __contains__(self, obj_id: bytes) -> bool:
         assert type(obj_id) is bytes, type(obj_id)
-        return self.txn.get(obj_id) is not None
+        return self._get_packed(obj_id) is not None
+
+    def is_tree(self, obj_id: ObjectID) -> bool:
+        """Checks if the object is a stored tree, without decoding it."""
+        if self._trees_db is not None:
+            return self.txn.get(obj_id, db=self._trees_db) is not None
+        obj_packed = self.txn.get(obj_id)
+        return obj_packed is not None and read_object_type(obj_packed) == ObjectType.TREE
 
     def __getitem__(self, obj_id: bytes) -> StoredObject | None:
         assert type(obj_id) is bytes, f"{obj_id} -> {type(obj_id)}"
-        obj_packed = self.txn.get(obj_id)  # todo use streaming op
+        if self._object_cache is not None and self._use_cache:
+            obj = self._object_cache.get(self._cache_namespace, obj_id)
+            if obj is not None:
+                return obj
+        return self.load(obj_id)
+
+    def load(self, obj_id: bytes) -> StoredObject | None:
+        """Reads and decodes the object from the transaction, skipping the lookup in the decoded objects cache."""
+        obj_packed = self._get_packed(obj_id)
         if obj_packed is None:
             return None
-        return self._object_reader(obj_id, obj_packed)
+
+        obj = self._object_reader(obj_id, obj_packed)
+        if self._object_cache is not None and self._use_cache:
+            self._object_cache.put(self._cache_namespace, obj_id, obj, estimate_decoded_size(len(obj_packed)))
+        return obj
+
+    def get_packed_many(self, obj_ids: Iterable[ObjectID]) -> List[Tuple[ObjectID, bytes | memoryview]]:
+        """Reads serialized objects in key order, skipping those that are not stored.
+
+        The data is only valid until the transaction ends or writes."""
+        missing = sorted(obj_ids)
+        result = []
+        for db in self._all_dbs:
+            with self.txn.cursor(db=db) as cursor:
+                result.extend((bytes(obj_id), obj_packed) for obj_id, obj_packed in cursor.getmulti(missing))
+            if len(result) == len(missing):
+                break
+
+            found = set(obj_id for obj_id, _ in result)
+            missing = [obj_id for obj_id in missing if obj_id not in found]
+
+        return sorted(result, key=_obj_id)
+
+    def stored_ids(self, obj_ids: Iterable[ObjectID]) -> Set[ObjectID]:
+        """Returns which of the objects are stored, looking them all up in key order."""
+        return set(obj_id for obj_id, _ in self.get_packed_many(obj_ids))
+
+    def ids_after(self, after: ObjectID | None, limit: int) -> List[ObjectID]:
+        """Returns up to limit stored object ids in key order, starting after the provided one."""
+        result = []
+        for db in self._all_dbs:
+            with self.txn.cursor(db=db) as cursor:
+                found = cursor.set_range(after) if after is not None else cursor.first()
+                read = 0
+                while found and read < limit:
+                    obj_id = bytes(cursor.key())
+                    if obj_id != after:
+                        result.append(obj_id)
+                        read += 1
+                    found = cursor.next()
+        return sorted(result)[:limit]
+
+    def ids(self, batch_size: int = DEFAULT_BATCH_SIZE) -> Iterable[ObjectID]:
+        """Iterates over all stored object ids in key order, reading them in batches."""
+        batch = self.ids_after(None, batch_size)
+        while len(batch) > 0:
+            yield from batch
+            batch = self.ids_after(batch[-1], batch_size)
 
     def __setitem__(self, obj_id: bytes, obj: StoredObject):
-        if self[obj_id] is None:
-            self.txn.put(obj_id, self._object_writer(obj))
+        added = self.txn.put(obj_id, self._object_writer(obj), overwrite=False, db=self._db_of(obj.object_type))
+        if self._nursery_db is not None:
+            self._record_written(obj_id, added, obj.object_type)
+
+    def put_many(self, items: Iterable[Tuple[ObjectID, StoredObject]]) -> None:
+        self.put_packed_many((obj_id, self._object_writer(obj)) for obj_id, obj in items)
+
+    def put_packed_many(self, items: Iterable[Tuple[ObjectID, bytes]]) -> Tuple[int, int]:
+        """Stores already serialized objects in key order, skipping those that are already stored.
+
+        Returns the number of consumed and added objects."""
+        trees, blobs = [], []
+        for obj_id, obj_packed in items:
+            (trees if read_object_type(obj_packed) == ObjectType.TREE else blobs).append((obj_id, obj_packed))
+
+        consumed, added = 0, 0
+        for db, db_items in ((self._trees_db, trees), (None, blobs)):
+            db_consumed, db_added = self._put_packed_sorted(db, sorted(db_items, key=_obj_id))
+            consumed += db_consumed
+            added += db_added
+        return consumed, added
+
+    def _put_packed_sorted(self, db: _Database | None, items: List[Tuple[ObjectID, bytes]]) -> Tuple[int, int]:
+        if self._nursery_db is None:
+            with self.txn.cursor(db=db) as cursor:
+                return cursor.putmulti(items, overwrite=False)
+
+        # the nursery needs to know which objects were added, so stored ones are found first to put the rest at once
+        with self.txn.cursor(db=db) as cursor:
+            stored = set(bytes(obj_id) for obj_id, _ in cursor.getmulti([obj_id for obj_id, _ in items]))
+        added_items = [(obj_id, obj_packed) for obj_id, obj_packed in items if obj_id not in stored]
+        with self.txn.cursor(db=db) as cursor:
+            _, added = cursor.putmulti(added_items, overwrite=False)
+
+        touched_ids = sorted(set(
+            obj_id for obj_id, obj_packed in items
+            if obj_id in stored and read_object_type(obj_packed) == ObjectType.TREE))
+        with self.txn.cursor(db=self._nursery_db) as cursor:
+            cursor.putmulti([(BORN_KEY_PREFIX + obj_id, b"") for obj_id, _ in added_items])
+            cursor.putmulti([(TOUCHED_KEY_PREFIX + obj_id, b"") for obj_id in touched_ids])
+        return len(items), added
+
+    def _record_written(self, obj_id: ObjectID, added: bool, object_type: ObjectType) -> None:
+        if added:
+            self.txn.put(BORN_KEY_PREFIX + obj_id, b"", db=self._nursery_db)
+        elif object_type == ObjectType.TREE:
+            self.txn.put(TOUCHED_KEY_PREFIX + obj_id, b"", db=self._nursery_db)
 
     def __delitem__(self, obj_id: bytes) -> None:
-        self.txn.delete(obj_id)
+        for db in self._all_dbs:
+            self.txn.delete(obj_id, db=db)
+        if self._nursery_db is not None:
+            self.txn.delete(BORN_KEY_PREFIX + obj_id, db=self._nursery_db)
+        if self._blooms_db is not None:
+            self.txn.delete(obj_id, db=self._blooms_db)
+        if self._object_cache is not None:
+            self._object_cache.evict(self._cache_namespace, obj_id)
+
+
+def _obj_id(item: Tuple[ObjectID, bytes]) -> ObjectID:
+    return item[0]
 
 
 type ObjPath = List[str]
 ASSERTS_DISABLED = True
 
 
-def pop_and_write_nonparents(objects: Objects, stack: List[Tuple[ObjPath, TreeObjectBuilder]], fullpath: ObjPath):
+def pop_and_write_nonparents(objects: Objects | ObjectsBatch, stack: List[Tuple[ObjPath, TreeObjectBuilder]], fullpath: ObjPath):
     while not is_child_of(fullpath, stack[-1][0]):  # this is not a common ancestor
         child_id, child_path = pop_and_write_obj(stack, objects)
 
@@ -147,7 +334,7 @@ def is_child_of(fullpath: ObjPath, parent: ObjPath) -> bool:
     return True
 
 
-def pop_and_write_obj(stack: List[Tuple[ObjPath, TreeObjectBuilder]], objects: Objects) -> Tuple[ObjectID, ObjPath]:
+def pop_and_write_obj(stack: List[Tuple[ObjPath, TreeObjectBuilder]], objects: Objects | ObjectsBatch) -> Tuple[ObjectID, ObjPath]:
     top_obj_path, tree_obj_builder = stack.pop()
 
     # store currently constructed object in tree